@@ -0,0 +1,213 @@
+"""
+Benchmarks van de stappen van veg2hab op synthetische karteringen van oplopende grootte.
+
+Gebruik:
+    python -m benchmarks --aantal 1000 --aantal 10000 --output benchmark_resultaat
+
+Per grootte wordt er een synthetische kartering gemaakt (zie benchmarks.synthetisch),
+waarna iedere stap herhalingen keer gemeten wordt met veg2hab.profiel.Profiel.
+Het resultaat wordt weggeschreven als CSV en JSON, met per stap de schaalexponent:
+de helling van log(tijd) tegen log(aantal vlakken). Een exponent van 1 is lineair,
+2 is kwadratisch.
+"""
+
+import json
+import logging
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import click
+import numpy as np
+import pandas as pd
+
+import veg2hab
+from benchmarks.synthetisch import (
+    SynthetischeParameters,
+    run_stappen,
+    schrijf_synthetische_kartering,
+)
+from veg2hab import constants
+from veg2hab.definitietabel import DefinitieTabel
+from veg2hab.io.cli import CLIInterface
+from veg2hab.profiel import Profiel
+from veg2hab.waswordtlijst import WasWordtLijst
+
+STANDAARD_AANTALLEN = [1_000, 5_000, 10_000, 50_000, 100_000, 500_000]
+
+
+def schaalexponenten(samenvatting: pd.DataFrame) -> pd.DataFrame:
+    """
+    Helling van log(mediane wandtijd) tegen log(aantal vlakken) per stap, tussen
+    iedere twee opeenvolgende groottes en gefit over alle groottes
+    """
+    rijen = []
+    for stap, groep in samenvatting.groupby("stap", sort=False):
+        groep = groep[groep.wandtijd_mediaan_s > 0].sort_values("aantal_vlakken")
+        if len(groep) < 2:
+            continue
+        log_n = np.log(groep.aantal_vlakken.to_numpy(dtype=float))
+        log_t = np.log(groep.wandtijd_mediaan_s.to_numpy())
+        rij = {"stap": stap, "exponent": np.polyfit(log_n, log_t, 1)[0]}
+        for i in range(1, len(groep)):
+            van, tot = groep.aantal_vlakken.iloc[i - 1], groep.aantal_vlakken.iloc[i]
+            rij[f"{van}-{tot}"] = (log_t[i] - log_t[i - 1]) / (log_n[i] - log_n[i - 1])
+        rijen.append(rij)
+    return pd.DataFrame(rijen)
+
+
+def _plot(samenvatting: pd.DataFrame, path: Path) -> None:
+    try:
+        import matplotlib
+
+        matplotlib.use("Agg")
+        import matplotlib.pyplot as plt
+    except ImportError:
+        logging.warning("matplotlib is niet geinstalleerd, er wordt geen plot gemaakt")
+        return
+
+    fig, ax = plt.subplots(figsize=(8, 6))
+    for stap, groep in samenvatting.groupby("stap", sort=False):
+        ax.plot(groep.aantal_vlakken, groep.wandtijd_mediaan_s, marker="o", label=stap)
+    ax.set_xscale("log")
+    ax.set_yscale("log")
+    ax.set_xlabel("Aantal vlakken")
+    ax.set_ylabel("Mediane wandtijd (s)")
+    ax.legend(fontsize="small")
+    ax.grid(True, which="both", alpha=0.3)
+    fig.savefig(path, dpi=120, bbox_inches="tight")
+    plt.close(fig)
+
+
+@click.command(
+    name="benchmarks",
+    help="Meet de stappen van veg2hab op synthetische karteringen van oplopende grootte",
+)
+@click.option(
+    "--aantal",
+    "aantallen",
+    type=int,
+    multiple=True,
+    default=STANDAARD_AANTALLEN,
+    show_default=True,
+    help="Aantal vlakken; kan meerdere keren opgegeven worden",
+)
+@click.option("--herhalingen", type=int, default=3, show_default=True)
+@click.option(
+    "--max-seconden",
+    type=float,
+    default=None,
+    help="Stop met grotere karteringen als een grootte (alle herhalingen samen) langer duurde dan dit",
+)
+@click.option("--max-complexdelen", type=int, default=3, show_default=True)
+@click.option("--aandeel-complex", type=float, default=0.3, show_default=True)
+@click.option("--aandeel-rvvn", type=float, default=0.2, show_default=True)
+@click.option("--aandeel-mozaiek", type=float, default=0.2, show_default=True)
+@click.option("--aandeel-bron-mitsen", type=float, default=0.3, show_default=True)
+@click.option("--vertices-per-vlak", type=int, default=4, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--definitietabel",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=constants.DEFTABEL_PATH,
+)
+@click.option(
+    "--waswordtlijst",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=constants.WWL_PATH,
+)
+@click.option(
+    "--output",
+    type=click.Path(path_type=Path),
+    default=Path("benchmark_resultaat"),
+    show_default=True,
+    help="Pad zonder extensie; er worden een .csv, een _samenvatting.csv en een .json weggeschreven",
+)
+@click.option("--plot", is_flag=True, help="Maak een plot van de schaalcurves")
+def benchmarks(
+    aantallen: List[int],
+    herhalingen: int,
+    max_seconden: Optional[float],
+    definitietabel: Path,
+    waswordtlijst: Path,
+    output: Path,
+    plot: bool,
+    **kwargs,
+):
+    CLIInterface.get_instance()
+
+    metingen: List[Dict] = []
+    for aantal in sorted(aantallen):
+        params = SynthetischeParameters(aantal_vlakken=aantal, **kwargs)
+        start = time.perf_counter()
+
+        for herhaling in range(herhalingen):
+            # Steeds opnieuw inladen, zodat caches van een vorige herhaling niet meetellen
+            dt = DefinitieTabel.from_excel(definitietabel)
+            wwl = WasWordtLijst.from_excel(waswordtlijst)
+
+            with tempfile.TemporaryDirectory() as map:
+                synthetisch = schrijf_synthetische_kartering(params, dt, wwl, Path(map))
+                profiel = Profiel()
+                # Net als veg2hab.run, met een vaste config voor de hele run
+                with CLIInterface.get_instance().vaste_config():
+                    run_stappen(synthetisch, dt, wwl, profiel)
+
+            for meting in profiel.metingen:
+                metingen.append(
+                    {"aantal_vlakken": aantal, "herhaling": herhaling}
+                    | meting._asdict()
+                )
+                click.echo(
+                    f"{aantal:>8} vlakken  {meting.stap:<30}{meting.wandtijd_s:>10.3f}s"
+                )
+
+        duur = time.perf_counter() - start
+        if max_seconden is not None and duur > max_seconden:
+            logging.warning(
+                f"{aantal} vlakken duurde {duur:.0f}s, langer dan {max_seconden:.0f}s; grotere karteringen worden overgeslagen"
+            )
+            break
+
+    df = pd.DataFrame(metingen)
+    samenvatting = (
+        df.groupby(["aantal_vlakken", "stap"], sort=False)
+        .agg(
+            wandtijd_min_s=("wandtijd_s", "min"),
+            wandtijd_mediaan_s=("wandtijd_s", "median"),
+            cpu_tijd_mediaan_s=("cpu_tijd_s", "median"),
+            piek_rss_mb=("piek_rss_mb", "max"),
+        )
+        .reset_index()
+    )
+    exponenten = schaalexponenten(samenvatting)
+
+    output.parent.mkdir(parents=True, exist_ok=True)
+    df.to_csv(output.with_name(output.name + ".csv"), index=False)
+    samenvatting.to_csv(
+        output.with_name(output.name + "_samenvatting.csv"), index=False
+    )
+    with open(output.with_name(output.name + ".json"), "w", encoding="utf-8") as f:
+        json.dump(
+            {
+                "versie": veg2hab.__version__,
+                "parameters": {"herhalingen": herhalingen} | kwargs,
+                # Via to_json zodat ontbrekende waarden null worden in plaats van NaN
+                "samenvatting": json.loads(samenvatting.to_json(orient="records")),
+                "schaalexponenten": json.loads(exponenten.to_json(orient="records")),
+            },
+            f,
+            indent=2,
+        )
+    if plot:
+        _plot(samenvatting, output.with_name(output.name + ".png"))
+
+    click.echo()
+    click.echo(samenvatting.to_string(index=False))
+    click.echo()
+    click.echo(exponenten.to_string(index=False))
+
+
+if __name__ == "__main__":
+    benchmarks()
@@ -0,0 +1,142 @@
+"""
+Meet het verrijken van een synthetische kartering met FGR, LBK, Bodemkaart en de Oude
+Bossenkaart (for_geometry, dus sjoin_largest_overlap), en vergelijkt dat met de oude
+implementatie met een groupby.apply per karteringvlak.
+
+Gebruik:
+    python -m benchmarks.bronnen --aantal 1000 --aantal 10000
+
+De methodes:
+    gevectoriseerd: veg2hab.bronnen.sjoin_largest_overlap
+    groupby:        de oude implementatie hieronder (alleen met --vergelijk); de
+                    uitkomst moet precies gelijk zijn aan die van gevectoriseerd
+"""
+
+import tempfile
+import time
+from pathlib import Path
+from typing import List
+
+import click
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+
+from benchmarks.synthetisch import (
+    SynthetischeParameters,
+    maak_bronnen,
+    maak_geometrieen,
+)
+from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart
+
+
+def _sjoin_largest_overlap_groupby(
+    kartering_gdf: gpd.GeoDataFrame, bron_gdf: gpd.GeoDataFrame, bron_col_name: str
+) -> gpd.GeoDataFrame:
+    """
+    De oude sjoin_largest_overlap, als referentie
+    """
+    bron_gdf = bron_gdf.copy()
+    bron_gdf["geometry_bron"] = bron_gdf["geometry"]
+
+    joined = gpd.sjoin(kartering_gdf, bron_gdf, how="left", predicate="intersects")
+    joined["overlap_area"] = joined.geometry.intersection(joined.geometry_bron).area
+
+    def _retain_largest_overlap_area_row(group):
+        if len(group) == 1:
+            return group
+        highest_overlap_area = group["overlap_area"].max()
+        return group[group["overlap_area"] == highest_overlap_area].iloc[[0]]
+
+    grouped = joined.groupby(level=0, group_keys=False)
+    only_largest_overlaps = grouped.apply(_retain_largest_overlap_area_row)
+    only_largest_overlaps[f"{bron_col_name}_percentage"] = (
+        only_largest_overlaps["overlap_area"]
+        / only_largest_overlaps["geometry"].area
+        * 100
+    )
+    return only_largest_overlaps[[bron_col_name, f"{bron_col_name}_percentage"]]
+
+
+def _meet(methode: str, naam: str, bron, kolom: str, vlakken: gpd.GeoDataFrame):
+    start = time.perf_counter()
+    if methode == "gevectoriseerd":
+        resultaat = bron.for_geometry(vlakken)
+    else:
+        resultaat = _sjoin_largest_overlap_groupby(vlakken, bron.gdf, kolom)
+    duur = time.perf_counter() - start
+
+    meting = {
+        "aantal_vlakken": len(vlakken),
+        "bron": naam,
+        "methode": methode,
+        "wandtijd_s": duur,
+        "zonder_overlap": int(resultaat[kolom].isna().sum()),
+    }
+    return meting, resultaat
+
+
+@click.command(
+    name="bronnen",
+    help="Meet het verrijken van een kartering met de bronkaarten",
+)
+@click.option(
+    "--aantal",
+    "aantallen",
+    type=int,
+    multiple=True,
+    default=[1_000, 10_000],
+    show_default=True,
+    help="Aantal vlakken; kan meerdere keren opgegeven worden",
+)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--vergelijk/--niet-vergelijk",
+    default=True,
+    show_default=True,
+    help="Meet ook de oude groupby implementatie en controleer dat de uitkomst gelijk is",
+)
+def bronnen(aantallen: List[int], seed: int, vergelijk: bool):
+    methodes = ["gevectoriseerd"] + (["groupby"] if vergelijk else [])
+
+    metingen = []
+    for aantal in sorted(aantallen):
+        params = SynthetischeParameters(aantal_vlakken=aantal, seed=seed)
+        rng = np.random.default_rng(seed)
+        vlakken = gpd.GeoDataFrame(geometry=maak_geometrieen(params, rng))
+        fgr_gdf, bodemkaart_gdf, lbk_gdf, obk_gdf = maak_bronnen(vlakken.geometry, rng)
+
+        with tempfile.TemporaryDirectory() as map:
+            fgr_gdf.to_file(Path(map) / "fgr.gpkg", driver="GPKG")
+            obk_gdf.to_file(Path(map) / "obk.gpkg", driver="GPKG")
+            kaarten = [
+                ("fgr", FGR(Path(map) / "fgr.gpkg"), "fgr"),
+                ("lbk", LBK(lbk_gdf), "lbk"),
+                ("bodemkaart", Bodemkaart(bodemkaart_gdf), "bodem"),
+                ("obk", OudeBossenkaart(Path(map) / "obk.gpkg"), "obk"),
+            ]
+
+        for naam, bron, kolom in kaarten:
+            resultaten = []
+            for methode in methodes:
+                meting, resultaat = _meet(methode, naam, bron, kolom, vlakken)
+                metingen.append(meting)
+                resultaten.append(resultaat)
+                click.echo(
+                    f"{aantal:>8} vlakken  {naam:<12}{methode:<16}{meting['wandtijd_s']:>10.3f}s"
+                )
+            if vergelijk:
+                pd.testing.assert_frame_equal(resultaten[0], resultaten[1])
+
+    df = pd.DataFrame(metingen)
+    if vergelijk:
+        df = df.pivot_table(
+            index=["aantal_vlakken", "bron"], columns="methode", values="wandtijd_s"
+        ).reset_index()
+        df["versnelling"] = df["groupby"] / df["gevectoriseerd"]
+    click.echo()
+    click.echo(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    bronnen()
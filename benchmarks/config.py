@@ -0,0 +1,114 @@
+"""
+Telt hoe vaak Veg2HabConfig wordt opgebouwd tijdens het omzetten van een synthetische
+kartering, met en zonder de config snapshot op de Interface.
+
+Gebruik:
+    python -m benchmarks.config --aantal 10000
+
+De modi:
+    iedere_keer: zoals voorheen, iedere get_config bouwt een nieuwe Veg2HabConfig
+    snapshot:    de config wordt alleen opnieuw opgebouwd als de environment verandert
+    vast:        de config staat vast voor de hele run (zoals in veg2hab.run)
+"""
+
+import tempfile
+import time
+from contextlib import ExitStack
+from pathlib import Path
+from unittest import mock
+
+import click
+import pandas as pd
+
+from benchmarks.synthetisch import (
+    SynthetischeParameters,
+    run_stappen,
+    schrijf_synthetische_kartering,
+)
+from veg2hab import constants
+from veg2hab.definitietabel import DefinitieTabel
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import Interface, Veg2HabConfig
+from veg2hab.profiel import Profiel
+from veg2hab.waswordtlijst import WasWordtLijst
+
+MODI = ["iedere_keer", "snapshot", "vast"]
+
+
+def _meet(modus: str, synthetisch, dt, wwl) -> dict:
+    interface = CLIInterface.get_instance()
+    interface.reload_config()
+    opgebouwd = 0
+    opgevraagd = 0
+
+    originele_init = Veg2HabConfig.__init__
+    originele_get_config = Interface.get_config
+
+    def tellende_init(self, *args, **kwargs):
+        nonlocal opgebouwd
+        opgebouwd += 1
+        originele_init(self, *args, **kwargs)
+
+    def tellende_get_config(self):
+        nonlocal opgevraagd
+        opgevraagd += 1
+        if modus == "iedere_keer":
+            return Veg2HabConfig()
+        return originele_get_config(self)
+
+    with ExitStack() as stack:
+        stack.enter_context(mock.patch.object(Veg2HabConfig, "__init__", tellende_init))
+        stack.enter_context(
+            mock.patch.object(Interface, "get_config", tellende_get_config)
+        )
+        if modus == "vast":
+            stack.enter_context(interface.vaste_config())
+
+        start = time.perf_counter()
+        run_stappen(synthetisch, dt, wwl, Profiel())
+        duur = time.perf_counter() - start
+
+    return {
+        "modus": modus,
+        "config_opgebouwd": opgebouwd,
+        "get_config_aanroepen": opgevraagd,
+        "wandtijd_s": duur,
+    }
+
+
+@click.command(
+    name="config",
+    help="Telt hoe vaak de config wordt opgebouwd tijdens een omzetting",
+)
+@click.option("--aantal", type=int, default=10_000, show_default=True)
+@click.option("--seed", type=int, default=0, show_default=True)
+@click.option(
+    "--definitietabel",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=constants.DEFTABEL_PATH,
+)
+@click.option(
+    "--waswordtlijst",
+    type=click.Path(exists=True, dir_okay=False, path_type=Path),
+    default=constants.WWL_PATH,
+)
+def config(aantal: int, seed: int, definitietabel: Path, waswordtlijst: Path):
+    CLIInterface.get_instance()
+    params = SynthetischeParameters(aantal_vlakken=aantal, seed=seed)
+
+    resultaten = []
+    for modus in MODI:
+        # Steeds opnieuw inladen, zodat iedere modus met lege caches begint
+        dt = DefinitieTabel.from_excel(definitietabel)
+        wwl = WasWordtLijst.from_excel(waswordtlijst)
+        with tempfile.TemporaryDirectory() as map:
+            synthetisch = schrijf_synthetische_kartering(params, dt, wwl, Path(map))
+            resultaten.append(_meet(modus, synthetisch, dt, wwl))
+
+    df = pd.DataFrame(resultaten)
+    df["config_opgebouwd_per_10k_vlakken"] = df.config_opgebouwd * 10_000 / aantal
+    click.echo(df.to_string(index=False))
+
+
+if __name__ == "__main__":
+    config()
@@ -0,0 +1,406 @@
+import math
+from pathlib import Path
+from typing import Dict, List, NamedTuple, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+from pydantic import BaseModel, Field, model_validator
+
+from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart
+from veg2hab.criteria import (
+    BodemCriterium,
+    FGRCriterium,
+    LBKCriterium,
+    OudeBossenCriterium,
+)
+from veg2hab.definitietabel import DefinitieTabel
+from veg2hab.enums import BodemType, FGRType, LBKType, WelkeTypologie
+from veg2hab.mozaiek import StandaardMozaiekregel
+from veg2hab.profiel import Profiel
+from veg2hab.vegkartering import Kartering
+from veg2hab.waswordtlijst import WasWordtLijst
+
+# Ergens midden in Nederland, in RD coordinaten
+_OORSPRONG = (150_000.0, 450_000.0)
+
+_CATEGORIEEN = ["mozaiek", "bron", "overig"]
+_BRON_CRITERIA = (FGRCriterium, BodemCriterium, LBKCriterium, OudeBossenCriterium)
+
+
+class SynthetischeParameters(BaseModel):
+    """
+    Instellingen van een synthetische vegetatiekartering
+    """
+
+    aantal_vlakken: int = Field(default=1000, gt=0)
+    max_complexdelen: int = Field(
+        default=3, ge=1, le=10, description="Maximaal aantal complexdelen per vlak"
+    )
+    aandeel_complex: float = Field(
+        default=0.3, ge=0, le=1, description="Aandeel vlakken dat een complex is"
+    )
+    aandeel_rvvn: float = Field(
+        default=0.0,
+        ge=0,
+        le=1,
+        description="Aandeel vlakken dat in rVvN in plaats van SBB is gekarteerd",
+    )
+    aandeel_mozaiek: float = Field(
+        default=0.2,
+        ge=0,
+        le=1,
+        description="Aandeel complexdelen met een vegtype dat in de definitietabel een mozaiekregel heeft",
+    )
+    aandeel_bron_mitsen: float = Field(
+        default=0.3,
+        ge=0,
+        le=1,
+        description="Aandeel complexdelen met een vegtype dat in de definitietabel een mits op FGR, bodem, LBK of oude bossen heeft",
+    )
+    vertices_per_vlak: int = Field(default=4, ge=4)
+    vlak_grootte: float = Field(default=70.0, gt=0, description="In meters")
+    seed: int = 0
+
+    @model_validator(mode="after")
+    def check_aandelen(self):
+        if self.aandeel_mozaiek + self.aandeel_bron_mitsen > 1:
+            raise ValueError(
+                "aandeel_mozaiek en aandeel_bron_mitsen mogen samen niet meer dan 1 zijn"
+            )
+        return self
+
+
+class SynthetischeKartering(NamedTuple):
+    """
+    Paden van de weggeschreven kartering(en) en de bijbehorende bronnen
+    """
+
+    # None als er geen vlakken met deze typologie zijn
+    SBB: Optional[Path]
+    rVvN: Optional[Path]
+    max_complexdelen: int
+    fgr: Path
+    obk: Path
+    lbk: gpd.GeoDataFrame
+    bodemkaart: gpd.GeoDataFrame
+
+
+def maak_geometrieen(
+    params: SynthetischeParameters, rng: np.random.Generator
+) -> gpd.GeoSeries:
+    """
+    Maakt aaneengesloten vierhoeken op een verschoven grid, zodat aangrenzende vlakken
+    een rand delen (nodig voor mozaiekregels en functionele samenhang).
+    De randen worden opgeknipt tot ieder vlak ongeveer vertices_per_vlak punten heeft.
+    """
+    n = params.aantal_vlakken
+    kolommen = math.ceil(math.sqrt(n))
+    rijen = math.ceil(n / kolommen)
+    grootte = params.vlak_grootte
+
+    # Hoekpunten worden gedeeld door de omliggende vlakken en verschoven
+    x, y = np.meshgrid(
+        np.arange(kolommen + 1, dtype=float), np.arange(rijen + 1, dtype=float)
+    )
+    x = _OORSPRONG[0] + (x + rng.uniform(-0.3, 0.3, x.shape)) * grootte
+    y = _OORSPRONG[1] + (y + rng.uniform(-0.3, 0.3, y.shape)) * grootte
+
+    r, k = np.divmod(np.arange(n), kolommen)
+    hoeken = np.stack(
+        [
+            np.stack([x[r, k], y[r, k]], axis=-1),
+            np.stack([x[r, k + 1], y[r, k + 1]], axis=-1),
+            np.stack([x[r + 1, k + 1], y[r + 1, k + 1]], axis=-1),
+            np.stack([x[r + 1, k], y[r + 1, k]], axis=-1),
+        ],
+        axis=1,
+    )
+    vlakken = shapely.polygons(hoeken)
+
+    if params.vertices_per_vlak > 4:
+        vlakken = shapely.segmentize(vlakken, 4 * grootte / params.vertices_per_vlak)
+
+    return gpd.GeoSeries(vlakken, crs="EPSG:28992")
+
+
+def codes_per_categorie(
+    dt: DefinitieTabel, wwl: WasWordtLijst
+) -> Dict[WelkeTypologie, Dict[str, List[str]]]:
+    """
+    Deelt de SBB en rVvN codes uit de definitietabel en de was-wordt-lijst in naar
+    wat de definitietabel ermee doet: een mozaiekregel, een mits op een van de bronnen,
+    of iets anders. Een code met zowel een mozaiekregel als een bronmits telt als mozaiek.
+    """
+    df = dt.df
+    is_mozaiek = df.Mozaiekregel.apply(
+        lambda regel: isinstance(regel, StandaardMozaiekregel)
+    )
+    is_bron = df.Criteria.apply(
+        lambda criteria: any(
+            criteria.is_criteria_type_present(crit) for crit in _BRON_CRITERIA
+        )
+    )
+    categorie = np.select([is_mozaiek, is_bron], ["mozaiek", "bron"], "overig")
+
+    codes = {WelkeTypologie.SBB: {}, WelkeTypologie.rVvN: {}}
+    for naam in _CATEGORIEEN:
+        rijen = df[categorie == naam]
+        sbb = set(rijen.SBB.dropna())
+        vvn = set(rijen.VvN.dropna())
+        in_categorie = wwl.df.VvN.isin(vvn) | wwl.df.SBB.isin(sbb)
+        sbb |= set(wwl.df.SBB[wwl.df.VvN.isin(vvn)].dropna())
+        rvvn = set(wwl.df.rVvN[in_categorie].dropna())
+
+        codes[WelkeTypologie.SBB][naam] = sorted(str(code) for code in sbb)
+        codes[WelkeTypologie.rVvN][naam] = sorted(str(code) for code in rvvn)
+
+    # Een code kan in meerdere categorieen vallen; dan telt de eerste
+    for typologie in codes:
+        gezien = set()
+        for naam in _CATEGORIEEN:
+            codes[typologie][naam] = [
+                code for code in codes[typologie][naam] if code not in gezien
+            ]
+            gezien.update(codes[typologie][naam])
+
+    return codes
+
+
+def _kies_codes(
+    params: SynthetischeParameters,
+    rng: np.random.Generator,
+    codes: Dict[str, List[str]],
+    shape: Tuple[int, int],
+) -> np.ndarray:
+    kansen = np.array(
+        [
+            params.aandeel_mozaiek,
+            params.aandeel_bron_mitsen,
+            1 - params.aandeel_mozaiek - params.aandeel_bron_mitsen,
+        ]
+    )
+    # Lege categorieen kunnen niet gekozen worden
+    kansen = np.where([len(codes[naam]) > 0 for naam in _CATEGORIEEN], kansen, 0)
+    assert kansen.sum() > 0, "Geen codes gevonden om uit te kiezen"
+
+    categorie = rng.choice(len(_CATEGORIEEN), size=shape, p=kansen / kansen.sum())
+    resultaat = np.empty(shape, dtype=object)
+    for i, naam in enumerate(_CATEGORIEEN):
+        mask = categorie == i
+        if mask.any():
+            keuze = np.array(codes[naam], dtype=object)
+            resultaat[mask] = keuze[rng.integers(0, len(keuze), mask.sum())]
+    return resultaat
+
+
+def maak_vegtypen(
+    params: SynthetischeParameters,
+    rng: np.random.Generator,
+    codes: Dict[WelkeTypologie, Dict[str, List[str]]],
+    is_rvvn: np.ndarray,
+) -> pd.DataFrame:
+    """
+    Kiest per vlak het aantal complexdelen, de vegtypen en de percentages.
+    Vlakken met is_rvvn krijgen rVvN codes, de andere SBB codes.
+    """
+    n = params.aantal_vlakken
+    m = params.max_complexdelen
+
+    aantal_delen = np.ones(n, dtype=int)
+    if m > 1:
+        is_complex = rng.random(n) < params.aandeel_complex
+        aantal_delen[is_complex] = rng.integers(2, m + 1, is_complex.sum())
+    gebruikt = np.arange(m)[None, :] < aantal_delen[:, None]
+
+    # Gewichten van 1 t/m 9 geven percentages van minstens 1; de rest van de
+    # afronding gaat naar het eerste complexdeel zodat het totaal 100 is
+    gewichten = np.where(gebruikt, rng.integers(1, 10, (n, m)), 0)
+    perc = gewichten * 100 // gewichten.sum(axis=1, keepdims=True)
+    perc[:, 0] += 100 - perc.sum(axis=1)
+
+    sbb = _kies_codes(params, rng, codes[WelkeTypologie.SBB], (n, m))
+    rvvn = _kies_codes(params, rng, codes[WelkeTypologie.rVvN], (n, m))
+    vegtypen = np.where(is_rvvn[:, None], rvvn, sbb)
+    vegtypen[~gebruikt] = None
+
+    df = pd.DataFrame({"ElmID": np.arange(n)})
+    for i in range(m):
+        df[f"vegtype{i + 1}"] = vegtypen[:, i]
+        df[f"perc{i + 1}"] = np.where(gebruikt[:, i], perc[:, i], np.nan)
+    return df
+
+
+def maak_bronnen(
+    vlakken: gpd.GeoSeries, rng: np.random.Generator, cel_grootte: float = 700
+) -> Tuple[gpd.GeoDataFrame, gpd.GeoDataFrame, gpd.GeoDataFrame, gpd.GeoDataFrame]:
+    """
+    Maakt een grid van willekeurige FGR, bodem, LBK en oude bossen vlakken over de kartering heen.
+    Geeft (fgr, bodemkaart, lbk, obk) terug als GeoDataFrames.
+    """
+    minx, miny, maxx, maxy = vlakken.total_bounds
+    xs = np.arange(minx - cel_grootte / 2, maxx + cel_grootte / 2, cel_grootte)
+    ys = np.arange(miny - cel_grootte / 2, maxy + cel_grootte / 2, cel_grootte)
+    x, y = (a.ravel() for a in np.meshgrid(xs, ys))
+    cellen = shapely.box(x, y, x + cel_grootte, y + cel_grootte)
+    n = len(cellen)
+
+    # _tuple_dict is een member van de enums, maar geen type
+    lbk_codes = sorted(
+        {code for lbk in LBKType if lbk.name != "_tuple_dict" for code in lbk.codes}
+        | {"XX"}
+    )
+    bodem_codes = sorted(
+        {
+            code
+            for bodem in BodemType
+            if bodem.name != "_tuple_dict"
+            for code in bodem.codes
+        }
+        | {"XX"}
+    )
+    fgr_codes = [fgr.value for fgr in FGRType]
+
+    def kies(keuzes, size=n):
+        return np.array(keuzes, dtype=object)[rng.integers(0, len(keuzes), size)]
+
+    fgr = gpd.GeoDataFrame({"fgr": kies(fgr_codes)}, geometry=cellen, crs=28992)
+    lbk = gpd.GeoDataFrame({"lbk": kies(lbk_codes)}, geometry=cellen, crs=28992)
+    # Een op de tien bodemvlakken heeft twee bodemtypen
+    bodem = [
+        [a, b] if twee else [a]
+        for a, b, twee in zip(kies(bodem_codes), kies(bodem_codes), rng.random(n) < 0.1)
+    ]
+    bodemkaart = gpd.GeoDataFrame({"bodem": bodem}, geometry=cellen, crs=28992)
+    # Oude bossen liggen maar op een deel van het gebied
+    obk_cellen = cellen[rng.random(n) < 0.3]
+    obk = gpd.GeoDataFrame(
+        {
+            "h9120": rng.integers(0, 3, len(obk_cellen)),
+            "h9190": rng.integers(0, 3, len(obk_cellen)),
+        },
+        geometry=obk_cellen,
+        crs=28992,
+    )
+    return fgr, bodemkaart, lbk, obk
+
+
+def schrijf_synthetische_kartering(
+    params: SynthetischeParameters,
+    dt: DefinitieTabel,
+    wwl: WasWordtLijst,
+    map: Path,
+) -> SynthetischeKartering:
+    """
+    Maakt een synthetische kartering met bronnen en schrijft deze weg in map.
+    Het SBB en het rVvN deel van de kartering worden los weggeschreven; deze kunnen
+    na het inladen met Kartering.combineer_karteringen samengevoegd worden.
+    """
+    rng = np.random.default_rng(params.seed)
+    map.mkdir(parents=True, exist_ok=True)
+
+    vlakken = maak_geometrieen(params, rng)
+    is_rvvn = rng.random(params.aantal_vlakken) < params.aandeel_rvvn
+    vegtypen = maak_vegtypen(params, rng, codes_per_categorie(dt, wwl), is_rvvn)
+    gdf = gpd.GeoDataFrame(vegtypen, geometry=vlakken)
+
+    paden = {}
+    for typologie, mask in [("SBB", ~is_rvvn), ("rVvN", is_rvvn)]:
+        if not mask.any():
+            paden[typologie] = None
+            continue
+        paden[typologie] = map / f"kartering_{typologie}.gpkg"
+        gdf[mask].to_file(paden[typologie], driver="GPKG", layer="main")
+
+    fgr, bodemkaart, lbk, obk = maak_bronnen(vlakken, rng)
+    fgr.to_file(map / "fgr.gpkg", driver="GPKG")
+    obk.to_file(map / "obk.gpkg", driver="GPKG")
+
+    return SynthetischeKartering(
+        SBB=paden["SBB"],
+        rVvN=paden["rVvN"],
+        max_complexdelen=params.max_complexdelen,
+        fgr=map / "fgr.gpkg",
+        obk=map / "obk.gpkg",
+        lbk=lbk,
+        bodemkaart=bodemkaart,
+    )
+
+
+def lees_kartering(
+    synthetisch: SynthetischeKartering, typologie: WelkeTypologie
+) -> Kartering:
+    """
+    Leest het SBB of het rVvN deel van een synthetische kartering in met from_shapefile
+    """
+    kolommen = [f"vegtype{i + 1}" for i in range(synthetisch.max_complexdelen)]
+    return Kartering.from_shapefile(
+        getattr(synthetisch, typologie.name),
+        vegtype_col_format="multi",
+        welke_typologie=typologie,
+        ElmID_col="ElmID",
+        SBB_col=kolommen if typologie == WelkeTypologie.SBB else [],
+        VvN_col=[],
+        rVvN_col=kolommen if typologie == WelkeTypologie.rVvN else [],
+        perc_col=[f"perc{i + 1}" for i in range(synthetisch.max_complexdelen)],
+    )
+
+
+def lees_bronnen(
+    synthetisch: SynthetischeKartering,
+) -> Tuple[FGR, Bodemkaart, LBK, OudeBossenkaart]:
+    return (
+        FGR(synthetisch.fgr),
+        Bodemkaart(synthetisch.bodemkaart.copy()),
+        LBK(synthetisch.lbk.copy()),
+        OudeBossenkaart(synthetisch.obk),
+    )
+
+
+def run_stappen(
+    synthetisch: SynthetischeKartering,
+    dt: DefinitieTabel,
+    wwl: WasWordtLijst,
+    profiel: Profiel,
+) -> None:
+    """
+    Doorloopt de hele pipeline op de synthetische kartering en meet iedere stap
+    """
+    typologieen = [
+        typologie
+        for typologie in [WelkeTypologie.SBB, WelkeTypologie.rVvN]
+        if getattr(synthetisch, typologie.name) is not None
+    ]
+
+    with profiel.meet("from_shapefile"):
+        karteringen = [
+            lees_kartering(synthetisch, typologie) for typologie in typologieen
+        ]
+
+    with profiel.meet("apply_wwl"):
+        for kartering in karteringen:
+            kartering.apply_wwl(wwl)
+
+    if len(karteringen) > 1:
+        with profiel.meet("combineer_karteringen"):
+            kartering = Kartering.combineer_karteringen(karteringen)
+    else:
+        kartering = karteringen[0]
+
+    with profiel.meet("apply_deftabel"):
+        kartering.apply_deftabel(dt)
+
+    # Het inladen van de bronnen hoort niet bij de stap zelf
+    bronnen = lees_bronnen(synthetisch)
+    with profiel.meet("bepaal_mits_habitatkeuzes"):
+        kartering.bepaal_mits_habitatkeuzes(*bronnen)
+
+    with profiel.meet("bepaal_mozaiek_habitatkeuzes"):
+        kartering.bepaal_mozaiek_habitatkeuzes()
+
+    with profiel.meet("functionele_samenhang"):
+        kartering.functionele_samenhang()
+
+    with profiel.meet("as_final_format"):
+        kartering.as_final_format()
@@ -2,6 +2,7 @@ import time
 
 import pytest
 
+import veg2hab.cache
 from veg2hab.io.cli import CLIInterface
 
 TIMED = "timed"
@@ -14,6 +15,17 @@ def pytest_sessionstart(session: pytest.Session) -> None:
     CLIInterface.get_instance()
 
 
+@pytest.fixture(scope="session", autouse=True)
+def tijdelijke_cachedir(tmp_path_factory):
+    """
+    Tests schrijven hun geparste referentiedata niet naar de cache van de gebruiker
+    """
+    cache_dir = tmp_path_factory.mktemp("cache")
+    with pytest.MonkeyPatch.context() as monkeypatch:
+        monkeypatch.setattr(veg2hab.cache, "get_cachedir", lambda: cache_dir)
+        yield cache_dir
+
+
 def pytest_configure(config):
     # Expliciet definieren van markers
     config.addinivalue_line(
@@ -0,0 +1,270 @@
+import json
+import multiprocessing
+from pathlib import Path
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+from veg2hab import batch, constants
+from veg2hab.batch import BatchJob, lees_manifest, run_batch, samenvatting
+from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart
+from veg2hab.definitietabel import opschonen_definitietabel
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import PipelineAccessDBInputs, PipelineShapefileInputs
+from veg2hab.mozaiek import StandaardMozaiekregel
+from veg2hab.referentiedata import Referentiedata
+from veg2hab.waswordtlijst import opschonen_waswordtlijst
+
+CLIInterface.get_instance()
+
+SHAPEFILE_PARAMS = {
+    "elmid_col": "ElmID",
+    "vegtype_col_format": "single",
+    "welke_typologie": "SBB",
+    "sbb_col": ["SBB"],
+}
+
+
+@pytest.fixture
+def manifest(tmp_path) -> Path:
+    manifest = {
+        "jobs": [
+            {
+                "stap": "1b_vector_bestand",
+                "params": {
+                    "shapefile": "karteringen/gebied_a.shp",
+                    "output": "output/gebied_a.gpkg",
+                    **SHAPEFILE_PARAMS,
+                },
+            },
+            {
+                "naam": "gebied_b",
+                "stap": "1a_digitale_standaard",
+                "params": {
+                    "shapefile": "/data/gebied_b/vlakken.shp",
+                    "elmid_col": "ElmID",
+                    "access_mdb_path": "gebied_b.mdb",
+                    "welke_typologie": "SBB",
+                },
+            },
+        ]
+    }
+    path = tmp_path / "manifest.json"
+    path.write_text(json.dumps(manifest))
+    return path
+
+
+def test_lees_manifest_json(manifest):
+    jobs = lees_manifest(manifest)
+
+    assert [job.naam for job in jobs] == ["gebied_a", "gebied_b"]
+
+    params_a = jobs[0].as_pipeline_inputs()
+    assert isinstance(params_a, PipelineShapefileInputs)
+    # Relatieve paden zijn relatief ten opzichte van het manifest
+    assert params_a.shapefile == str(manifest.parent / "karteringen/gebied_a.shp")
+    assert params_a.output == manifest.parent / "output/gebied_a.gpkg"
+
+    params_b = jobs[1].as_pipeline_inputs()
+    assert isinstance(params_b, PipelineAccessDBInputs)
+    assert params_b.shapefile == str(Path("/data/gebied_b/vlakken.shp").resolve())
+    assert params_b.access_mdb_path == manifest.parent / "gebied_b.mdb"
+
+
+def test_lees_manifest_yaml(tmp_path):
+    pytest.importorskip("yaml")
+    path = tmp_path / "manifest.yaml"
+    path.write_text(
+        """
+jobs:
+  - stap: 1b_vector_bestand
+    params:
+      shapefile: gebied_a.shp
+      elmid_col: ElmID
+      vegtype_col_format: single
+      welke_typologie: SBB
+      sbb_col: [SBB]
+"""
+    )
+    jobs = lees_manifest(path)
+    assert len(jobs) == 1
+    assert jobs[0].as_pipeline_inputs().sbb_col == ["SBB"]
+
+
+def test_lees_manifest_invalide(tmp_path):
+    path = tmp_path / "manifest.json"
+
+    path.write_text(json.dumps([{"stap": "1b_vector_bestand"}]))
+    with pytest.raises(ValueError):
+        lees_manifest(path)
+
+    path.write_text(
+        json.dumps({"jobs": [{"stap": "3_definitietabel_en_mitsen", "params": {}}]})
+    )
+    with pytest.raises(ValueError):
+        lees_manifest(path)
+
+    # Zonder shapefile
+    job = {"stap": "1b_vector_bestand", "params": SHAPEFILE_PARAMS}
+    path.write_text(json.dumps({"jobs": [job]}))
+    with pytest.raises(ValueError, match="Job 1 in het manifest is ongeldig"):
+        lees_manifest(path)
+
+    job = {"stap": "1b_vector_bestand", "params": {"shapefile": "a.shp"}}
+    path.write_text(json.dumps({"jobs": [{**job, "naam": "a"}]}))
+    with pytest.raises(ValueError, match="Job 1 \\(a\\)"):
+        lees_manifest(path)
+
+    job["params"].update(SHAPEFILE_PARAMS)
+    path.write_text(json.dumps({"jobs": [job, job]}))
+    with pytest.raises(ValueError, match="uniek"):
+        lees_manifest(path)
+
+
+def _fake_run_pipeline(params, referentiedata):
+    if "mislukt" in params.shapefile:
+        raise ValueError("Kartering kon niet worden ingelezen")
+    # De referentiedata uit het parent proces is beschikbaar in de worker
+    assert referentiedata == "referentiedata"
+    return gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1), box(1, 1, 2, 2)])
+
+
+@pytest.mark.parametrize("processen", [1, 2])
+def test_run_batch(monkeypatch, processen):
+    if processen > 1 and "fork" not in multiprocessing.get_all_start_methods():
+        pytest.skip("Gemockte pipeline wordt alleen meegenomen in geforkte workers")
+
+    monkeypatch.setattr(batch.main, "run_pipeline", _fake_run_pipeline)
+
+    jobs = [
+        BatchJob(
+            naam=naam,
+            stap="1b_vector_bestand",
+            params={"shapefile": f"{naam}.shp", **SHAPEFILE_PARAMS},
+        )
+        for naam in ["a", "mislukt", "c"]
+    ]
+
+    resultaten = run_batch(jobs, processen, referentiedata="referentiedata")
+
+    assert [r.naam for r in resultaten] == ["a", "mislukt", "c"]
+    assert [r.gelukt for r in resultaten] == [True, False, True]
+    assert resultaten[0].aantal_vlakken == 2
+    assert "Kartering kon niet worden ingelezen" in resultaten[1].fout
+
+    tekst = samenvatting(resultaten, 10.0)
+    assert "2 van de 3 karteringen zijn gelukt" in tekst
+    assert "0.4 vlakken/s" in tekst
+    assert "Mislukt: mislukt" in tekst
+
+
+class _FakeReferentiedata:
+    def __init__(self, threshold=None):
+        self.threshold = threshold
+
+    def voor_config(self):
+        config = CLIInterface.get_instance().get_config()
+        return _FakeReferentiedata(config.mozaiek_threshold)
+
+
+def test_run_batch_config(monkeypatch):
+    def run_pipeline(params, referentiedata):
+        threshold = CLIInterface.get_instance().get_config().mozaiek_threshold
+        # Jobs met een eigen config krijgen referentiedata die met die config is ingeladen
+        assert referentiedata.threshold in (None, threshold)
+        return gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1)] * int(threshold))
+
+    monkeypatch.setattr(batch.main, "run_pipeline", run_pipeline)
+
+    jobs = [
+        BatchJob(
+            naam=naam,
+            stap="1b_vector_bestand",
+            params={"shapefile": f"{naam}.shp", **SHAPEFILE_PARAMS},
+            config=config,
+        )
+        for naam, config in [
+            ("a", {"mozaiek_threshold": 90.0}),
+            ("b", {}),
+            ("c", {"bestaat_niet": 1}),
+            ("d", {"mozaiek_threshold": 90.0}),
+        ]
+    ]
+    resultaten = run_batch(jobs, 1, referentiedata=_FakeReferentiedata())
+
+    standaard = CLIInterface.get_instance().get_config().mozaiek_threshold
+    assert [r.aantal_vlakken for r in resultaten] == [90, int(standaard), None, 90]
+    assert "bestaat_niet" in resultaten[2].fout
+    # Een keer ingeladen voor de standaard config en een keer voor a en d samen
+    assert len(batch._REFERENTIEDATA) == 2
+
+
+@pytest.fixture(scope="module")
+def tabellen(tmp_path_factory):
+    data = Path(__file__).resolve().parent / "../data"
+    map = tmp_path_factory.mktemp("tabellen")
+    wwl_path = map / "opgeschoonde_waswordt.xlsx"
+    deftabel_path = map / "opgeschoonde_definitietabel.xlsx"
+    opschonen_waswordtlijst(
+        data / "5. Was-wordt-lijst-vegetatietypen-en-habitattypen-09-02-2021.xlsx",
+        wwl_path,
+    )
+    opschonen_definitietabel(
+        data / "definitietabel habitattypen (versie 24 maart 2009)_0.xls",
+        data / "mitsjson.json",
+        data / "mozaiekjson.json",
+        deftabel_path,
+    )
+    return wwl_path, deftabel_path
+
+
+def test_run_batch_config_in_mozaiekregels(monkeypatch, tmp_path, tabellen):
+    wwl_path, deftabel_path = tabellen
+    monkeypatch.setattr(constants, "WWL_PATH", str(wwl_path))
+    monkeypatch.setattr(constants, "DEFTABEL_PATH", str(deftabel_path))
+
+    gpd.GeoDataFrame({"fgr": ["Duinen"]}, geometry=[box(0, 0, 1, 1)]).to_file(
+        tmp_path / "fgr.gpkg"
+    )
+    gpd.GeoDataFrame({"h9120": [0], "h9190": [0]}, geometry=[box(0, 0, 1, 1)]).to_file(
+        tmp_path / "obk.gpkg"
+    )
+    referentiedata = Referentiedata(
+        *Referentiedata._tabellen_inladen(),
+        FGR(tmp_path / "fgr.gpkg"),
+        OudeBossenkaart(tmp_path / "obk.gpkg"),
+        LBK(gpd.GeoDataFrame({"lbk": ["HzHL"]}, geometry=[box(0, 0, 1, 1)])),
+        Bodemkaart(gpd.GeoDataFrame({"bodem": [["Hn21"]]}, geometry=[box(0, 0, 1, 1)])),
+    )
+
+    thresholds = {}
+
+    def run_pipeline(params, referentiedata):
+        regels = [
+            regel
+            for regel in referentiedata.deftabel.df.Mozaiekregel
+            if isinstance(regel, StandaardMozaiekregel)
+        ]
+        assert len(regels) > 0
+        thresholds[Path(params.shapefile).stem] = {
+            regel.mozaiek_threshold for regel in regels
+        }
+        return gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1)])
+
+    monkeypatch.setattr(batch.main, "run_pipeline", run_pipeline)
+
+    jobs = [
+        BatchJob(
+            naam=naam,
+            stap="1b_vector_bestand",
+            params={"shapefile": f"{naam}.shp", **SHAPEFILE_PARAMS},
+            config=config,
+        )
+        for naam, config in [("a", {"mozaiek_threshold": 90.0}), ("b", {})]
+    ]
+    resultaten = run_batch(jobs, 1, referentiedata=referentiedata)
+
+    assert all(r.gelukt for r in resultaten)
+    standaard = CLIInterface.get_instance().get_config().mozaiek_threshold
+    assert thresholds == {"a": {90.0}, "b": {standaard}}
@@ -0,0 +1,52 @@
+import geopandas as gpd
+import numpy as np
+import pytest
+from shapely.geometry import box
+
+from veg2hab.bronnen import sjoin_largest_overlap
+
+
+@pytest.fixture
+def kartering_gdf():
+    return gpd.GeoDataFrame(
+        geometry=[box(0, 0, 2, 2), box(10, 10, 12, 12), box(4, 0, 6, 2)],
+        index=[7, 3, 5],
+    )
+
+
+@pytest.fixture
+def bron_gdf():
+    """
+    Karteringvlak 7 overlapt voor 25% met a en 75% met b,
+    karteringvlak 5 overlapt voor 50% met zowel c als d (de eerste wordt gebruikt),
+    karteringvlak 3 overlapt met niks
+    """
+    return gpd.GeoDataFrame(
+        {"bron": ["a", "b", "c", "d"]},
+        geometry=[
+            box(-1, -1, 0.5, 2),
+            box(0.5, -1, 3, 3),
+            box(3, -1, 5, 3),
+            box(5, -1, 7, 3),
+        ],
+    )
+
+
+def test_sjoin_largest_overlap(kartering_gdf, bron_gdf, caplog):
+    kolommen = list(bron_gdf.columns)
+    resultaat = sjoin_largest_overlap(kartering_gdf, bron_gdf, "bron")
+
+    # bron_gdf wordt niet aangepast
+    assert list(bron_gdf.columns) == kolommen
+
+    assert resultaat.index.tolist() == [3, 5, 7]
+    assert resultaat.loc[7, "bron"] == "b"
+    assert resultaat.loc[7, "bron_percentage"] == pytest.approx(75)
+    assert resultaat.loc[5, "bron"] == "c"
+    assert resultaat.loc[5, "bron_percentage"] == pytest.approx(50)
+    assert np.isnan(resultaat.loc[3, "bron"])
+    assert np.isnan(resultaat.loc[3, "bron_percentage"])
+
+    # Gelijke overlaps worden een keer gemeld, niet per vlak
+    assert len(caplog.records) == 1
+    assert "Voor 1 karteringvlakken" in caplog.records[0].message
@@ -0,0 +1,150 @@
+import geopandas as gpd
+import pandas as pd
+import pytest
+from shapely.geometry import box
+from testutils import set_env
+
+import veg2hab.cache
+from veg2hab.bronnen import LBK
+from veg2hab.cache import load_or_build, load_tiled
+from veg2hab.io.cli import CLIInterface
+
+CLIInterface.get_instance()
+
+
+@pytest.fixture
+def cache_dir(tmp_path, monkeypatch):
+    cache_dir = tmp_path / "cache"
+    monkeypatch.setattr(veg2hab.cache, "get_cachedir", lambda: cache_dir)
+    return cache_dir
+
+
+@pytest.fixture
+def source(tmp_path):
+    source = tmp_path / "bron.txt"
+    source.write_text("versie 1")
+    return source
+
+
+def test_load_or_build_gebruikt_cache(cache_dir, source):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return {"inhoud": source.read_text()}
+
+    assert load_or_build("test", source, build) == {"inhoud": "versie 1"}
+    assert load_or_build("test", source, build) == {"inhoud": "versie 1"}
+    assert len(builds) == 1
+    assert len(list(cache_dir.glob("test_*.pkl"))) == 1
+
+
+def test_load_or_build_bron_veranderd(cache_dir, source):
+    assert load_or_build("test", source, source.read_text) == "versie 1"
+    source.write_text("versie 2")
+    assert load_or_build("test", source, source.read_text) == "versie 2"
+    # De verouderde cache is opgeruimd
+    assert len(list(cache_dir.glob("test_*.pkl"))) == 1
+
+
+def test_load_or_build_ander_bestand(cache_dir, source, tmp_path):
+    ander = tmp_path / "ander.txt"
+    ander.write_text("ander")
+    assert load_or_build("test", source, source.read_text) == "versie 1"
+    assert load_or_build("test", ander, ander.read_text) == "ander"
+
+    # De cache van het ene bestand ruimt die van het andere niet op
+    assert len(list(cache_dir.glob("test_*.pkl"))) == 2
+    assert load_or_build("test", source, lambda: "opnieuw gebouwd") == "versie 1"
+
+
+def test_load_or_build_config_veranderd(cache_dir, source):
+    builds = []
+
+    def build():
+        builds.append(1)
+        return len(builds)
+
+    assert load_or_build("test", source, build) == 1
+    with set_env(VEG2HAB_MOZAIEK_THRESHOLD="90.0"):
+        assert load_or_build("test", source, build) == 2
+
+
+def test_load_or_build_corrupte_cache(cache_dir, source):
+    load_or_build("test", source, source.read_text)
+    cache_path = next(cache_dir.glob("test_*.pkl"))
+    cache_path.write_bytes(b"geen pickle")
+    assert load_or_build("test", source, source.read_text) == "versie 1"
+
+
+def test_load_or_build_uitgeschakeld(cache_dir, source):
+    with set_env(VEG2HAB_REFERENTIE_CACHE="false"):
+        assert load_or_build("test", source, source.read_text) == "versie 1"
+    assert not cache_dir.exists()
+
+
+@pytest.fixture
+def lbk_path(tmp_path):
+    # Een rij van 20 vlakken van 1km, en een langgerekt vlak over de tegelgrenzen heen
+    geometrie = [box(x * 1000, 0, x * 1000 + 900, 900) for x in range(20)]
+    geometrie.append(box(0, 2000, 19_000, 2500))
+    path = tmp_path / "lbk.gpkg"
+    gpd.GeoDataFrame(
+        {"Serie": [f"H{i}" for i in range(len(geometrie))]},
+        geometry=geometrie,
+        crs="EPSG:28992",
+    ).to_file(path, driver="GPKG")
+    return path
+
+
+def test_load_tiled_zelfde_als_read_file(cache_dir, lbk_path, monkeypatch):
+    monkeypatch.setattr(veg2hab.cache, "BRON_TEGEL_GROOTTE", 5000)
+    builds = []
+
+    def build(mask):
+        builds.append(mask)
+        return LBK.from_file(lbk_path, mask).gdf
+
+    masks = [
+        None,
+        gpd.GeoDataFrame(geometry=[box(2500, 100, 3500, 200)], crs="EPSG:28992"),
+        gpd.GeoDataFrame(
+            geometry=[box(15_500, 0, 16_500, 2100), box(100, 100, 200, 200)],
+            crs="EPSG:28992",
+        ),
+        gpd.GeoDataFrame(geometry=[box(0, 5000, 100, 5100)], crs="EPSG:28992"),
+    ]
+    for mask in masks:
+        pd.testing.assert_frame_equal(
+            load_tiled("lbk", lbk_path, build, mask),
+            LBK.from_file(lbk_path, mask).gdf,
+        )
+
+    # Alleen de eerste keer wordt het hele bestand ingelezen
+    assert builds == [None]
+    assert len(list(cache_dir.glob("lbk_*/tegel_*.pkl"))) == 4
+
+
+def test_load_tiled_leest_alleen_geraakte_tegels(cache_dir, lbk_path, monkeypatch):
+    monkeypatch.setattr(veg2hab.cache, "BRON_TEGEL_GROOTTE", 5000)
+    builds = []
+
+    def build(mask):
+        builds.append(mask)
+        return LBK.from_file(lbk_path, mask).gdf
+
+    load_tiled("lbk", lbk_path, build)
+
+    # De laatste tegel (x vanaf 15km) is niet nodig voor een mask bij het eerste vlak
+    tegel_map = next(cache_dir.glob("lbk_*"))
+    (tegel_map / "tegel_3.pkl").unlink()
+    mask = gpd.GeoDataFrame(geometry=[box(100, 100, 200, 200)], crs="EPSG:28992")
+    assert load_tiled("lbk", lbk_path, build, mask).lbk.tolist() == ["H0"]
+    assert len(builds) == 1
+
+
+def test_load_tiled_uitgeschakeld(cache_dir, lbk_path):
+    with set_env(VEG2HAB_REFERENTIE_CACHE="false"):
+        gdf = load_tiled("lbk", lbk_path, lambda mask: LBK.from_file(lbk_path).gdf)
+    assert len(gdf) == 21
+    assert not cache_dir.exists()
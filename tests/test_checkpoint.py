@@ -0,0 +1,163 @@
+import pickle
+from collections import Counter
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+from testutils import set_env
+
+from veg2hab import main
+from veg2hab.checkpoint import bestand_hash, bewaar_checkpoint, pipeline_sleutels
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import PipelineShapefileInputs
+
+CLIInterface.get_instance()
+
+# Hoe vaak iedere stap echt is uitgevoerd
+AANROEPEN = Counter()
+
+
+class FakeKartering:
+    def bepaal_mozaiek_habitatkeuzes(self):
+        AANROEPEN["4"] += 1
+
+    def functionele_samenhang(self):
+        AANROEPEN["5"] += 1
+
+    def to_editable_vegtypes(self):
+        return gpd.GeoDataFrame(geometry=[box(0, 0, 1, 1)], crs="EPSG:28992")
+
+    to_editable_habtypes = to_editable_vegtypes
+    as_final_format = to_editable_vegtypes
+
+
+def _inladen_vegkartering(params, referentiedata):
+    AANROEPEN["1"] += 1
+    return FakeKartering()
+
+
+def _definitietabel_en_mitsen(kartering, override_dict, referentiedata):
+    AANROEPEN["3"] += 1
+
+
+@pytest.fixture
+def checkpoints(tmp_path, monkeypatch):
+    AANROEPEN.clear()
+    monkeypatch.setattr(main, "_inladen_vegkartering", _inladen_vegkartering)
+    monkeypatch.setattr(main, "_definitietabel_en_mitsen", _definitietabel_en_mitsen)
+    monkeypatch.setattr(
+        main.Kartering, "to_editable_vegtypes", lambda k: k.to_editable_vegtypes()
+    )
+    monkeypatch.setattr(
+        main.Kartering, "to_editable_habtypes", lambda k: k.to_editable_habtypes()
+    )
+    with set_env(
+        VEG2HAB_CHECKPOINTS="true", VEG2HAB_CHECKPOINTS_MAP=str(tmp_path / "cp")
+    ):
+        yield tmp_path / "cp"
+
+
+@pytest.fixture
+def params(tmp_path):
+    shapefile = tmp_path / "kartering.gpkg"
+    shapefile.write_text("versie 1")
+    return PipelineShapefileInputs(
+        shapefile=str(shapefile),
+        elmid_col="ElmID",
+        vegtype_col_format="single",
+        welke_typologie="SBB",
+        sbb_col=["SBB"],
+        output=tmp_path / "output.gpkg",
+    )
+
+
+def test_pipeline_hervatten(checkpoints, params):
+    main.run_pipeline(params)
+    assert AANROEPEN == {"1": 1, "3": 1, "4": 1, "5": 1}
+    assert len(list(checkpoints.glob("veg2hab_checkpoint_*.pkl"))) == 4
+
+    # Alles komt uit de checkpoints
+    AANROEPEN.clear()
+    main.run_pipeline(params)
+    assert AANROEPEN == {}
+
+    # Alleen stap 5 gebruikt het minimum oppervlak
+    with set_env(VEG2HAB_MINIMUM_OPPERVLAK_DEFAULT="50"):
+        main.run_pipeline(params)
+    assert AANROEPEN == {"5": 1}
+
+    # De mozaiekregels worden bij het inladen van de definitietabel gemaakt
+    AANROEPEN.clear()
+    with set_env(VEG2HAB_MOZAIEK_THRESHOLD="90"):
+        main.run_pipeline(params)
+    assert AANROEPEN == {"3": 1, "4": 1, "5": 1}
+
+    # Een andere input betekent alles opnieuw
+    AANROEPEN.clear()
+    params.shapefile = params.shapefile.replace("kartering", "kopie")
+    with open(params.shapefile, "w") as f:
+        f.write("versie 2")
+    main.run_pipeline(params)
+    assert AANROEPEN == {"1": 1, "3": 1, "4": 1, "5": 1}
+
+
+def test_pipeline_sleutels(checkpoints, params, tmp_path):
+    sleutels = pipeline_sleutels(params)
+    assert len(set(sleutels)) == 4
+
+    # Instellingen die de uitkomst niet veranderen tellen niet mee
+    with set_env(VEG2HAB_TEGEL_GROOTTE="500", VEG2HAB_PROFIEL="true"):
+        assert pipeline_sleutels(params) == sleutels
+
+    # De locatie van de input en output telt niet mee, de inhoud wel
+    kopie = tmp_path / "kopie.gpkg"
+    kopie.write_text("versie 1")
+    params_kopie = params.model_copy(
+        update={"shapefile": str(kopie), "output": tmp_path / "ander.gpkg"}
+    )
+    assert pipeline_sleutels(params_kopie) == sleutels
+
+    params_kopie.sbb_col = ["SBB_anders"]
+    assert pipeline_sleutels(params_kopie)[0] != sleutels[0]
+
+    # Geen bestand (zoals een laag in ArcGIS Pro)
+    params_kopie.shapefile = "laag"
+    assert pipeline_sleutels(params_kopie) is None
+
+
+def test_bestand_hash_shapefile(tmp_path):
+    for ext in ["shp", "dbf", "shx"]:
+        (tmp_path / f"vlakken.{ext}").write_text(ext)
+
+    voor = bestand_hash(tmp_path / "vlakken.shp")
+    (tmp_path / "vlakken.dbf").write_text("andere attributen")
+    assert bestand_hash(tmp_path / "vlakken.shp") != voor
+
+
+def test_checkpoints_opruimen(checkpoints):
+    # Een ander bestand in de checkpoints_map wordt nooit opgeruimd
+    checkpoints.mkdir(parents=True, exist_ok=True)
+    (checkpoints / "eigen_bestand.pkl").write_bytes(bytes(4096))
+
+    with set_env(VEG2HAB_CHECKPOINTS_MAX_MB=str(2.5 / 1024)):
+        for i in range(5):
+            bewaar_checkpoint(f"sleutel{i}", bytes(1024))
+
+    # Alleen de meest recente checkpoints passen
+    assert sorted(p.stem for p in checkpoints.glob("*.pkl")) == [
+        "eigen_bestand",
+        "veg2hab_checkpoint_sleutel3",
+        "veg2hab_checkpoint_sleutel4",
+    ]
+
+
+class _NietTePicklen:
+    def __reduce__(self):
+        raise pickle.PicklingError("niet te picklen")
+
+
+def test_bewaar_checkpoint_niet_te_picklen(checkpoints):
+    with pytest.raises(pickle.PicklingError):
+        bewaar_checkpoint("sleutel", _NietTePicklen())
+    # Het tijdelijke bestand is opgeruimd
+    assert list(checkpoints.iterdir()) == []
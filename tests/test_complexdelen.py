@@ -0,0 +1,95 @@
+import pandas as pd
+import pytest
+
+from veg2hab.complexdelen import (
+    complexdelen_tabel,
+    inklappen,
+    samenvatting_per_vlak,
+    sorteer_complexdelen,
+    uitklappen,
+)
+from veg2hab.enums import KeuzeStatus, Kwaliteit
+from veg2hab.habitat import HabitatKeuze, HabitatVoorstel
+from veg2hab.vegkartering import (
+    build_aggregate_habtype_field,
+    sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen,
+)
+from veg2hab.vegtypeinfo import VegTypeInfo
+
+
+def _keuze(habtype: str, kwaliteit: Kwaliteit = Kwaliteit.GOED) -> HabitatKeuze:
+    return HabitatKeuze(
+        status=(
+            KeuzeStatus.VOLDOET_NIET_AAN_HABTYPEVOORWAARDEN
+            if habtype == "H0000"
+            else KeuzeStatus.HABITATTYPE_TOEGEKEND
+        ),
+        habtype=habtype,
+        kwaliteit=kwaliteit,
+        habitatvoorstellen=[HabitatVoorstel.H0000_no_vegtype_present()],
+    )
+
+
+@pytest.fixture
+def gdf():
+    return pd.DataFrame(
+        {
+            "ElmID": [10, 20, 30],
+            "VegTypeInfo": [
+                [
+                    VegTypeInfo.from_str_vegtypes(20, SBB_strings=["9b1"]),
+                    VegTypeInfo.from_str_vegtypes(50, SBB_strings=["14e1a"]),
+                    VegTypeInfo.from_str_vegtypes(30, SBB_strings=["16b/a"]),
+                ],
+                [VegTypeInfo.from_str_vegtypes(100, SBB_strings=["9b1"])],
+                [],
+            ],
+            "HabitatVoorstel": [
+                [["a"], ["b"], ["c"]],
+                [["d"]],
+                [[HabitatVoorstel.H0000_no_vegtype_present()]],
+            ],
+            "HabitatKeuze": [
+                [
+                    _keuze("H0000", Kwaliteit.NVT),
+                    _keuze("H1234"),
+                    _keuze("H1234", Kwaliteit.MATIG),
+                ],
+                [_keuze("H4321")],
+                [_keuze("H0000", Kwaliteit.NVT)],
+            ],
+        },
+        index=[5, 6, 7],
+    )
+
+
+def test_uitklappen_en_inklappen(gdf):
+    lang = uitklappen(gdf, ["VegTypeInfo", "HabitatKeuze"])
+    assert lang.vlak.tolist() == [0, 0, 0, 1, 2]
+    assert lang.complexdeel.tolist() == [0, 1, 2, 0, 0]
+    # Het vlak zonder VegTypeInfo wordt aangevuld met None
+    assert lang.VegTypeInfo.iloc[-1] is None
+
+    for kolom in ["VegTypeInfo", "HabitatKeuze"]:
+        ingeklapt = inklappen(lang, kolom, gdf.index, overslaan_als_none=True)
+        assert ingeklapt.equals(gdf[kolom])
+
+    tabel = complexdelen_tabel(gdf)
+    assert tabel.ElmID.tolist() == [10, 10, 10, 20, 30]
+    assert tabel.percentage.tolist()[:4] == [20, 50, 30, 100]
+    assert pd.isna(tabel.percentage.iloc[-1])
+    assert tabel.habtype.tolist() == ["H0000", "H1234", "H1234", "H4321", "H0000"]
+
+
+def test_zelfde_als_per_vlak(gdf):
+    verwacht = gdf.apply(sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen, axis=1)
+    gesorteerd = sorteer_complexdelen(gdf)
+    for kolom in ["VegTypeInfo", "HabitatVoorstel", "HabitatKeuze"]:
+        assert gesorteerd[kolom].tolist() == verwacht[kolom].tolist()
+    assert gesorteerd.HabitatVoorstel.iloc[0] == [["b"], ["c"], ["a"]]
+
+    met_vegtypen = gesorteerd.iloc[:2]
+    assert (
+        samenvatting_per_vlak(complexdelen_tabel(met_vegtypen), len(met_vegtypen))
+        == met_vegtypen.apply(build_aggregate_habtype_field, axis=1).tolist()
+    )
@@ -0,0 +1,69 @@
+import pytest
+from pydantic import ValidationError
+from testutils import set_env
+
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import Veg2HabConfig
+
+
+@pytest.fixture
+def interface():
+    interface = CLIInterface.get_instance()
+    interface.reload_config()
+    return interface
+
+
+def test_config_wordt_hergebruikt(interface, monkeypatch):
+    config = interface.get_config()
+
+    opgebouwd = []
+    originele_init = Veg2HabConfig.__init__
+
+    def tellende_init(self, *args, **kwargs):
+        opgebouwd.append(1)
+        originele_init(self, *args, **kwargs)
+
+    monkeypatch.setattr(Veg2HabConfig, "__init__", tellende_init)
+
+    for _ in range(100):
+        assert interface.get_config() is config
+    assert opgebouwd == []
+
+    # Een gewijzigde environment variable geeft een nieuwe config
+    with set_env(VEG2HAB_MOZAIEK_THRESHOLD="91.0"):
+        assert interface.get_config().mozaiek_threshold == 91.0
+        assert interface.get_config().mozaiek_threshold == 91.0
+    assert len(opgebouwd) == 1
+
+    assert interface.reload_config() is not config
+    assert len(opgebouwd) == 2
+
+
+def test_config_is_onveranderlijk(interface):
+    with pytest.raises(ValidationError):
+        interface.get_config().mozaiek_threshold = 50.0
+
+
+def test_vaste_config(interface):
+    standaard = interface.get_config()
+
+    with interface.vaste_config() as config:
+        # Binnen een run doen de environment variables niet meer mee
+        with set_env(VEG2HAB_MOZAIEK_THRESHOLD="91.0"):
+            assert interface.get_config() is config
+        assert config.mozaiek_threshold == standaard.mozaiek_threshold
+
+    with interface.vaste_config(mozaiek_threshold=90.0) as config:
+        assert interface.get_config().mozaiek_threshold == 90.0
+
+        with interface.vaste_config(minimum_oppervlak_default=50.0):
+            assert interface.get_config().mozaiek_threshold == 90.0
+            assert interface.get_config().minimum_oppervlak_default == 50.0
+
+        assert interface.get_config() is config
+
+    assert interface.get_config().mozaiek_threshold == standaard.mozaiek_threshold
+
+    with pytest.raises(ValidationError):
+        with interface.vaste_config(bestaat_niet=1):
+            pass
@@ -1,5 +1,8 @@
+import geopandas as gpd
+import numpy as np
 import pandas as pd
 import pytest
+from shapely.geometry import Point
 
 from veg2hab.criteria import (
     BeperkendCriterium,
@@ -12,9 +15,17 @@ from veg2hab.criteria import (
     NietGeautomatiseerdCriterium,
     OfCriteria,
     OudeBossenCriterium,
+    OverrideCriterium,
     criteria_from_json,
 )
-from veg2hab.enums import BodemType, FGRType, LBKType, MaybeBoolean, OBKWaarden
+from veg2hab.enums import (
+    BodemType,
+    FGRType,
+    LBKType,
+    MaybeBoolean,
+    MitsBron,
+    OBKWaarden,
+)
 
 # For "tests" of criteria.get_opm, please see demo_criteria_infos.py
 
@@ -180,3 +191,83 @@ def test_NietGeautomatiseerdCriterium():
     crit = NietGeautomatiseerdCriterium(toelichting="test")
     crit.check(pd.Series())
     assert crit.evaluation == MaybeBoolean.CANNOT_BE_AUTOMATED
+
+
+def test_benodigde_bronnen():
+    assert GeenCriterium().benodigde_bronnen() == MitsBron(0)
+    assert NietGeautomatiseerdCriterium(toelichting="test").benodigde_bronnen() == (
+        MitsBron(0)
+    )
+    crit = EnCriteria(
+        sub_criteria=[
+            FGRCriterium(wanted_fgrtype=FGRType.DU),
+            NietCriterium(
+                sub_criterium=OfCriteria(
+                    sub_criteria=[
+                        BodemCriterium(
+                            wanted_bodemtype=BodemType.LEEMARME_VAAGGRONDEN_H9190
+                        ),
+                        OudeBossenCriterium(for_habtype="H9120"),
+                    ]
+                )
+            ),
+        ]
+    )
+    assert crit.benodigde_bronnen() == MitsBron.FGR | MitsBron.BODEM | MitsBron.OBK
+
+
+def test_gecompileerd_zelfde_als_check():
+    geen_obk = OBKWaarden(H9120=0, H9190=0)
+    mogelijk_obk = OBKWaarden(H9120=2, H9190=1)
+    rijen = pd.DataFrame(
+        {
+            "fgr": [FGRType.DU, FGRType.LV, np.nan, FGRType.DU, FGRType.LV, np.nan],
+            "fgr_percentage": [100, 60.5, np.nan, 80, 95, np.nan],
+            "lbk": ["HzHL", "Abcd", np.nan, "HzHL", "HzSD", "Abcd"],
+            "lbk_percentage": [100, 70, np.nan, 55, 100, 90],
+            "bodem": [["Hn21"], ["Hn21", "Zn21"], np.nan, ["Zn21"], [], ["Hd30"]],
+            "bodem_percentage": [100, 90, np.nan, 80, 100, 65],
+            "obk": [mogelijk_obk, np.nan, geen_obk, mogelijk_obk, geen_obk, np.nan],
+            "obk_percentage": [100, np.nan, 50, 75, 100, np.nan],
+            "geometry": [Point(x, 0).buffer(0.4) for x in range(6)],
+        }
+    )
+    crit = OfCriteria(
+        sub_criteria=[
+            EnCriteria(
+                sub_criteria=[
+                    FGRCriterium(wanted_fgrtype=FGRType.DU),
+                    LBKCriterium(wanted_lbktype=LBKType.HOOGVEEN),
+                    NietCriterium(
+                        sub_criterium=BodemCriterium(
+                            wanted_bodemtype=BodemType.LEEMARME_HUMUSPODZOLGRONDEN
+                        )
+                    ),
+                ]
+            ),
+            LBKCriterium(wanted_lbktype=LBKType.HOOGVEENLANDSCHAP),
+            OudeBossenCriterium(for_habtype="H9120"),
+            NietCriterium(sub_criterium=OudeBossenCriterium(for_habtype="H9190")),
+            OverrideCriterium(
+                mits="test",
+                truth_value=MaybeBoolean.TRUE,
+                override_geometry=gpd.GeoSeries([Point(2, 0), Point(4, 0)]),
+                truth_value_outside=MaybeBoolean.FALSE,
+            ),
+            NietGeautomatiseerdCriterium(toelichting="test"),
+        ]
+    )
+
+    plan = crit.compileer()
+    bladeren = plan.evalueer_bladeren(rijen)
+    evaluaties = plan.evalueer(rijen)
+    for i, row in rijen.iterrows():
+        gecheckt = crit.evaluatie_kopie()
+        gecheckt.check(row)
+        assert tuple(bladeren[i]) == tuple(e.value for e in gecheckt.evaluaties())
+        assert evaluaties[i] == gecheckt.evaluation.value
+
+        ingevuld = crit.ingevuld(row.to_dict(), map(MaybeBoolean, bladeren[i]))
+        assert ingevuld == gecheckt
+        assert str(ingevuld) == str(gecheckt)
+        assert ingevuld.get_info() == gecheckt.get_info()
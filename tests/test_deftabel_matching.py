@@ -1,5 +1,6 @@
 from pathlib import Path
 
+import pandas as pd
 import pytest
 
 from veg2hab.criteria import (
@@ -9,12 +10,17 @@ from veg2hab.criteria import (
     LBKCriterium,
     NietGeautomatiseerdCriterium,
     OfCriteria,
+    criteria_from_json,
 )
 from veg2hab.definitietabel import DefinitieTabel, opschonen_definitietabel
-from veg2hab.enums import FGRType, Kwaliteit, LBKType
+from veg2hab.enums import FGRType, Kwaliteit, LBKType, MaybeBoolean
 from veg2hab.habitat import HabitatVoorstel
 from veg2hab.io.cli import CLIInterface
-from veg2hab.mozaiek import GeenMozaiekregel, StandaardMozaiekregel
+from veg2hab.mozaiek import (
+    GeenMozaiekregel,
+    StandaardMozaiekregel,
+    mozaiekregel_from_json,
+)
 from veg2hab.vegetatietypen import SBB, MatchLevel, VvN
 from veg2hab.vegtypeinfo import VegTypeInfo
 
@@ -282,3 +288,81 @@ def test_niet_geautomatiseerde_codes(dt):
         )
     ]
     assert dt.find_habtypes(pre) == post
+
+
+def test_index_geeft_dezelfde_matches_als_match_up_to(dt):
+    # Alle codes uit de definitietabel, plus een specifiekere variant die via de
+    # minder specifieke codes in de definitietabel moet matchen
+    codes = set()
+    for column in ["SBB", "VvN"]:
+        for code in dt.df[column].dropna():
+            codes.add(code)
+            if not (code.derivaatgemeenschap or code.rompgemeenschap):
+                codes.add(code.model_copy(update={"subassociatie": "z"}))
+    codes.add(VvN.from_code("99aa3a"))
+    codes.add(SBB.from_code("99a"))
+
+    for code in codes:
+        column = "VvN" if isinstance(code, VvN) else "SBB"
+        verwacht = [
+            (positie, level)
+            for positie, level in enumerate(dt.df[column].apply(code.match_up_to))
+            if level > 0
+        ]
+        voorstellen = dt._find_habtypes_for_code(code)
+        assert dt._index[column].kandidaten(code) == [p for p, _ in verwacht]
+        assert [v.match_level for v in voorstellen] == [l for _, l in verwacht]
+
+
+def test_voorstellen_delen_mitsen_tot_ze_gecheckt_worden(dt):
+    info = VegTypeInfo.from_str_vegtypes(100, VvN_strings=["36aa2a"])
+    eerste, tweede = dt.find_habtypes(info), dt.find_habtypes(info)
+
+    # De definitietabel onderdelen worden gedeeld, de voorstellen zelf niet
+    assert eerste[0] is not tweede[0]
+    assert eerste[0].mits is tweede[0].mits
+    assert eerste[1].mozaiek is tweede[1].mozaiek
+
+    mits = eerste[0].mits.evaluatie_kopie()
+    assert mits.sub_criteria[0] is not tweede[0].mits.sub_criteria[0]
+    mits.check(pd.Series({"fgr": FGRType.DU, "fgr_percentage": 100.0}))
+    assert mits.sub_criteria[0].cached_evaluation == MaybeBoolean.TRUE
+    assert tweede[0].mits.sub_criteria[0].cached_evaluation is None
+    assert dt.find_habtypes(info) == tweede
+
+
+def test_voorstellen_per_code(dt):
+    infos = [
+        VegTypeInfo.from_str_vegtypes(100, VvN_strings=["36aa2a"], SBB_strings=["9b1"]),
+        VegTypeInfo.from_str_vegtypes(50, SBB_strings=["9b1"]),
+        VegTypeInfo.from_str_vegtypes(50, SBB_strings=["99a"]),
+    ]
+    per_code = dt.voorstellen_per_code(
+        code for info in infos for code in info.VvN + info.SBB
+    )
+    assert set(per_code) == {
+        VvN.from_code("36aa2a"),
+        SBB.from_code("9b1"),
+        SBB.from_code("99a"),
+    }
+    for info in infos:
+        assert dt.find_habtypes(info, per_code) == dt.find_habtypes(info)
+
+
+def test_unieke_json_wordt_een_keer_geparst(dt):
+    for json_kolom, kolom, parse in [
+        ("mitsjson", "Criteria", criteria_from_json),
+        ("mozaiekjson", "Mozaiekregel", mozaiekregel_from_json),
+    ]:
+        for json_str, groep in dt.df.groupby(json_kolom)[kolom]:
+            # Rijen met dezelfde json delen het object, dat gelijk is aan los parsen
+            assert len({id(obj) for obj in groep}) == 1
+            # De mozaiekregels zijn daarna aangevuld met de kwalificerende vegtypen
+            if kolom == "Criteria":
+                assert groep.iloc[0] == parse(json_str)
+
+    for regel in dt.df["Mozaiekregel"]:
+        if isinstance(regel, StandaardMozaiekregel) and regel.ook_mozaiekvegetaties:
+            rijen = dt.df[dt.df.Habitattype == regel.kwalificerend_habtype]
+            assert set(regel.kwalificerende_SBB) == set(rijen.SBB.dropna())
+            assert set(regel.kwalificerende_VvN) == set(rijen.VvN.dropna())
@@ -0,0 +1,73 @@
+import ast
+import subprocess
+import sys
+import time
+
+import pytest
+
+# Modules die pas ingeladen mogen worden als er echt een stap gedraaid wordt
+ZWARE_MODULES = ["pandas", "geopandas", "shapely", "pyogrio", "fiona", "veg2hab.main"]
+
+
+def _ingeladen_zware_modules(code: str) -> list:
+    """
+    Draait code in een nieuw python proces en geeft de zware modules die daarna zijn ingeladen
+    """
+    check = (
+        f"import sys\n{code}\nprint([m for m in {ZWARE_MODULES!r} if m in sys.modules])"
+    )
+    resultaat = subprocess.run(
+        [sys.executable, "-c", check], capture_output=True, text=True, check=True
+    )
+    return ast.literal_eval(resultaat.stdout.strip().splitlines()[-1])
+
+
+def test_cli_laadt_geen_zware_modules():
+    assert _ingeladen_zware_modules("import veg2hab.__main__") == []
+
+
+def test_cli_help_laadt_geen_zware_modules():
+    code = """
+from veg2hab.__main__ import veg2hab
+for args in (["--help"], ["run-all", "1b_vector_bestand", "--help"]):
+    try:
+        veg2hab(args)
+    except SystemExit:
+        pass
+"""
+    assert _ingeladen_zware_modules(code) == []
+
+
+def test_arcgis_toolbox_laadt_geen_zware_modules():
+    # Dit is wat veg2hab.pyt inlaadt, en wat updateParameters gebruikt
+    code = """
+import veg2hab.constants
+import veg2hab.io.arcgis
+veg2hab.io.arcgis.ArcGISShapefileInputs.model_json_schema()
+"""
+    assert _ingeladen_zware_modules(code) == []
+
+
+def test_veg2hab_run_laadt_main_pas_bij_gebruik():
+    assert "veg2hab.main" not in _ingeladen_zware_modules("import veg2hab")
+    assert "veg2hab.main" in _ingeladen_zware_modules("import veg2hab\nveg2hab.run")
+
+
+# Vergelijkt wandtijden van twee processen, dus alleen met --run-slow; de checks
+# hierboven op de ingeladen modules dekken hetzelfde af
+@pytest.mark.slow
+@pytest.mark.timed
+def test_opstarttijd_cli():
+    start = time.perf_counter()
+    subprocess.run(
+        [sys.executable, "-m", "veg2hab", "--help"], capture_output=True, check=True
+    )
+    cli = time.perf_counter() - start
+
+    start = time.perf_counter()
+    subprocess.run([sys.executable, "-c", "import geopandas"], check=True)
+    geopandas = time.perf_counter() - start
+
+    print(f"\nveg2hab --help: {cli:.2f}s, import geopandas: {geopandas:.2f}s")
+    # Als --help (via veg2hab.main) geopandas zou inladen, is het altijd trager dan alleen geopandas
+    assert cli < geopandas
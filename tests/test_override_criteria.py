@@ -195,3 +195,27 @@ def test_with_multipolygon(split_override_geometry, kartering_geometry):
     assert crit1.cached_evaluation == MaybeBoolean.TRUE
     assert crit2.cached_evaluation == MaybeBoolean.TRUE
     assert crit3.cached_evaluation == MaybeBoolean.FALSE
+
+
+def test_override_index_gedeeld_en_gevectoriseerd(
+    split_override_geometry, kartering_geometry
+):
+    crit = OverrideCriterium(
+        mits="mitsemits",
+        truth_value=MaybeBoolean.TRUE,
+        override_geometry=split_override_geometry,
+        truth_value_outside=MaybeBoolean.FALSE,
+    )
+    index = crit.override_index()
+    assert crit.override_index() is index
+
+    # Kopieen gebruiken dezelfde geparste geometrieen, en zijn gelijk aan het origineel
+    kopie = crit.evaluatie_kopie()
+    assert kopie.override_index() is index
+    assert kopie == crit
+
+    evaluaties = crit.compileer().evalueer(kartering_geometry)
+    for i in range(len(kartering_geometry)):
+        kopie = copy.copy(crit)
+        kopie.check(kartering_geometry.iloc[i])
+        assert evaluaties[i] == kopie.evaluation.value
@@ -0,0 +1,84 @@
+import json
+
+import pandas as pd
+
+from veg2hab import main
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import ApplyMozaiekInputs
+from veg2hab.profiel import Profiel, gemeten, meet, profiel_pad, profileren
+
+CLIInterface.get_instance()
+
+
+def test_profiel_geneste_stappen():
+    profiel = Profiel()
+    with profiel.meet("stap"):
+        with profiel.meet("sub_a"):
+            geheugen = bytearray(50 * 1024**2)
+            del geheugen
+        with profiel.meet("sub_b"):
+            pass
+
+    df = profiel.as_dataframe()
+    assert df.stap.tolist() == ["stap", "stap/sub_a", "stap/sub_b"]
+    assert df.niveau.tolist() == [0, 1, 1]
+    assert (df.wandtijd_s >= 0).all() and (df.cpu_tijd_s >= 0).all()
+    # De piek van een substap telt mee in de piek van de omliggende stap
+    if df.piek_rss_mb.notna().all():
+        assert df.piek_rss_mb[0] >= df.piek_rss_mb[1] >= 50
+
+
+def test_meet_zonder_profiel():
+    @gemeten
+    def functie():
+        with meet("sub"):
+            return 42
+
+    assert functie() == 42
+
+
+def test_profileren(tmp_path):
+    @gemeten
+    def functie():
+        with meet("sub"):
+            pass
+
+    path = tmp_path / "profiel"
+    with profileren(path):
+        functie()
+        functie()
+
+    csv = pd.read_csv(tmp_path / "profiel.csv")
+    assert csv.stap.tolist() == [
+        "totaal",
+        "totaal/functie",
+        "totaal/functie/sub",
+        "totaal/functie",
+        "totaal/functie/sub",
+    ]
+    with open(tmp_path / "profiel.json") as f:
+        assert len(json.load(f)["metingen"]) == 5
+
+    # Buiten profileren wordt er niks meer gemeten
+    functie()
+    assert len(pd.read_csv(tmp_path / "profiel.csv")) == 5
+
+
+def test_run_met_profiel(tmp_path, monkeypatch):
+    def run_4_mozaiekregels(params):
+        with meet("bepaal_mozaiek_habitatkeuzes"):
+            pass
+
+    monkeypatch.setattr(main, "run_4_mozaiekregels", run_4_mozaiekregels)
+
+    output = tmp_path / "stap4.gpkg"
+    params = ApplyMozaiekInputs(shapefile="stap3.gpkg", output=output)
+    main.run(params, profiel=True)
+
+    assert profiel_pad(output) == tmp_path / "stap4_profiel"
+    csv = pd.read_csv(tmp_path / "stap4_profiel.csv")
+    assert csv.stap.tolist() == [
+        "totaal",
+        "totaal/4_mozaiekregels",
+        "totaal/4_mozaiekregels/bepaal_mozaiek_habitatkeuzes",
+    ]
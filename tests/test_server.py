@@ -0,0 +1,134 @@
+import json
+import threading
+import urllib.request
+from pathlib import Path
+
+import geopandas as gpd
+import pytest
+from shapely.geometry import box
+
+import veg2hab
+from veg2hab import server as veg2hab_server
+from veg2hab.bronnen import LBK
+from veg2hab.io.cli import CLIApplyMozaiekInputs, CLIInterface
+from veg2hab.io.common import ApplyMozaiekInputs, PipelineShapefileInputs
+from veg2hab.referentiedata import Referentiedata
+
+CLIInterface.get_instance()
+
+
+@pytest.fixture
+def server():
+    server = veg2hab_server.Veg2HabServer(None, "127.0.0.1", 0)
+    thread = threading.Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+
+
+def _url(server) -> str:
+    host, port = server.server_address
+    return f"http://{host}:{port}"
+
+
+def test_status(server):
+    with urllib.request.urlopen(_url(server) + "/status") as response:
+        status = json.loads(response.read())
+    assert status == {"versie": veg2hab.__version__, "aantal_jobs": 0}
+
+
+def test_submit_job(server, monkeypatch):
+    ontvangen = []
+    monkeypatch.setattr(
+        veg2hab_server.main,
+        "run",
+        lambda params, referentiedata: ontvangen.append((params, referentiedata)),
+    )
+
+    params = CLIApplyMozaiekInputs(shapefile="stap3.gpkg", output="stap4.gpkg")
+    result = veg2hab_server.submit(_url(server), params)
+
+    assert result["duur"] >= 0
+    assert server.aantal_jobs == 1
+    assert len(ontvangen) == 1
+    ontvangen_params, referentiedata = ontvangen[0]
+    # De server ontvangt de basis input class, met absolute paden
+    assert type(ontvangen_params) is ApplyMozaiekInputs
+    assert ontvangen_params.shapefile == str(Path("stap3.gpkg").resolve())
+    assert ontvangen_params.output == Path("stap4.gpkg").resolve()
+    assert referentiedata is None
+
+
+def test_submit_pipeline_zonder_output(server, monkeypatch):
+    ontvangen = []
+    monkeypatch.setattr(
+        veg2hab_server.main,
+        "run",
+        lambda params, referentiedata: ontvangen.append(params),
+    )
+
+    params = PipelineShapefileInputs(
+        shapefile="kartering.shp",
+        elmid_col="ElmID",
+        vegtype_col_format="single",
+        welke_typologie="SBB",
+        sbb_col=["SBB"],
+    )
+    veg2hab_server.submit(_url(server), params)
+
+    assert type(ontvangen[0]) is PipelineShapefileInputs
+    # Er wordt door de client een output naam gegenereerd in de eigen working directory
+    assert ontvangen[0].output.parent == Path.cwd()
+
+
+def test_submit_job_fout(server, monkeypatch):
+    def run(params, referentiedata):
+        raise ValueError("Er ging iets mis")
+
+    monkeypatch.setattr(veg2hab_server.main, "run", run)
+
+    params = ApplyMozaiekInputs(shapefile="stap3.gpkg")
+    with pytest.raises(RuntimeError, match="Er ging iets mis"):
+        veg2hab_server.submit(_url(server), params)
+
+
+def test_lbk_for_mask():
+    cells = [
+        box(x, y, x + 10, y + 10) for x in range(0, 100, 10) for y in range(0, 100, 10)
+    ]
+    lbk = LBK(
+        gpd.GeoDataFrame(
+            {"lbk": [f"code{i}" for i in range(len(cells))]}, geometry=cells
+        )
+    )
+    referentiedata = Referentiedata.__new__(Referentiedata)
+    referentiedata.lbk = lbk
+
+    mask = gpd.GeoDataFrame(geometry=[box(12, 12, 18, 18), box(45, 45, 55, 55)])
+    subset = referentiedata.lbk_for_mask(mask).gdf
+
+    expected = lbk.gdf[lbk.gdf.intersects(mask.union_all())].reset_index(drop=True)
+    assert list(subset.columns) == ["geometry", "lbk"]
+    assert subset.lbk.tolist() == expected.lbk.tolist()
+
+
+def test_lbk_for_mask_andere_crs():
+    cells = [
+        box(150_000 + x, 450_000, 150_000 + x + 10, 450_010) for x in range(0, 100, 10)
+    ]
+    lbk = LBK(
+        gpd.GeoDataFrame(
+            {"lbk": [f"code{i}" for i in range(len(cells))]},
+            geometry=cells,
+            crs="EPSG:28992",
+        )
+    )
+    referentiedata = Referentiedata.__new__(Referentiedata)
+    referentiedata.lbk = lbk
+
+    # Een kartering in WGS84 wordt eerst naar de CRS van de LBK omgezet
+    mask = gpd.GeoDataFrame(
+        geometry=[box(150_012, 450_002, 150_018, 450_008)], crs="EPSG:28992"
+    ).to_crs("EPSG:4326")
+    assert referentiedata.lbk_for_mask(mask).gdf.lbk.tolist() == ["code1"]
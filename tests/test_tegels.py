@@ -0,0 +1,115 @@
+import random
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import pytest
+from shapely.geometry import box
+from testutils import set_env
+
+from veg2hab.criteria import GeenCriterium
+from veg2hab.enums import FuncSamenhangID, Kwaliteit, MatchLevel
+from veg2hab.functionele_samenhang import _cluster_vlakken, _cluster_vlakken_per_tegel
+from veg2hab.habitat import HabitatVoorstel
+from veg2hab.io.cli import CLIInterface
+from veg2hab.mozaiek import (
+    GeenMozaiekregel,
+    StandaardMozaiekregel,
+    make_buffered_boundary_overlay_gdf,
+)
+from veg2hab.tegels import deel_in_tegels, halo_posities
+
+CLIInterface.get_instance()
+
+
+def _grid(n: int = 12, grootte: float = 10, gat: float = 0) -> gpd.GeoDataFrame:
+    """
+    n bij n vierkanten van grootte meter, met gat meter tussenruimte
+    """
+    stap = grootte + gat
+    cellen = [
+        box(x * stap, y * stap, x * stap + grootte, y * stap + grootte)
+        for x in range(n)
+        for y in range(n)
+    ]
+    return gpd.GeoDataFrame({"ElmID": np.arange(len(cellen))}, geometry=cellen)
+
+
+def test_deel_in_tegels():
+    gdf = _grid()
+    tegels = deel_in_tegels(gdf, 35)
+
+    # 12 vlakken van 10m per 35m tegel -> 4 bij 4 tegels
+    assert len(tegels) == 16
+    # Ieder vlak zit in precies een tegel
+    assert sorted(np.concatenate(tegels).tolist()) == list(range(len(gdf)))
+    assert all((np.diff(posities) > 0).all() for posities in tegels)
+
+    with pytest.raises(ValueError):
+        deel_in_tegels(gdf, 0)
+
+
+def test_halo_posities():
+    gdf = _grid(n=5, gat=2)
+    kern = gdf[gdf.ElmID == 12]  # Middelste vlak
+
+    assert halo_posities(kern, gdf, 0).tolist() == [12]
+    # Met een halo van 2m zijn de vlakken die er direct naast en schuin naast liggen erbij
+    assert halo_posities(kern, gdf, 2).tolist() == [6, 7, 8, 11, 12, 13, 16, 17, 18]
+
+
+def _voorstel(mozaiek) -> HabitatVoorstel:
+    return HabitatVoorstel(
+        onderbouwend_vegtype=None,
+        vegtype_in_dt=None,
+        habtype="H1",
+        kwaliteit=Kwaliteit.GOED,
+        mits=GeenCriterium(),
+        mozaiek=mozaiek,
+        match_level=MatchLevel.NO_MATCH,
+    )
+
+
+@pytest.mark.parametrize("processen", ["1", "2"])
+def test_buffered_boundary_overlay_per_tegel(processen):
+    gdf = _grid()
+    mozaiekregel = StandaardMozaiekregel(
+        kwalificerend_habtype="H1",
+        ook_mozaiekvegetaties=False,
+        alleen_goede_kwaliteit=True,
+        ook_als_rand_langs=False,
+    )
+    gdf["HabitatVoorstel"] = [
+        [[_voorstel(mozaiekregel if i % 3 == 0 else GeenMozaiekregel())]]
+        for i in range(len(gdf))
+    ]
+
+    verwacht = make_buffered_boundary_overlay_gdf(gdf)
+    with set_env(VEG2HAB_TEGEL_GROOTTE="25", VEG2HAB_TEGEL_PROCESSEN=processen):
+        resultaat = make_buffered_boundary_overlay_gdf(gdf)
+
+    pd.testing.assert_frame_equal(
+        resultaat.reset_index(drop=True), verwacht.reset_index(drop=True)
+    )
+
+
+@pytest.mark.parametrize("processen", [1, 2])
+def test_cluster_vlakken_per_tegel(processen):
+    # Vlakken met 6m tussenruimte: alleen bij 100% (10.01m buffer) worden deze geclusterd,
+    # waardoor er clusters ontstaan die over meerdere tegels heen lopen
+    gdf = _grid(gat=6).rename(columns={"ElmID": "identifier"})
+    rng = random.Random(1)
+    gdf["identifier"] = [FuncSamenhangID(elmid, (0,)) for elmid in gdf.identifier]
+    gdf["percentage"] = [rng.choice([100, 100, 90, 50, 10]) for _ in range(len(gdf))]
+    gdf["habtype"] = [rng.choice(["H1", "H2"]) for _ in range(len(gdf))]
+
+    resultaat = _cluster_vlakken_per_tegel(gdf, 30, processen)
+
+    assert set(resultaat.keys()) == {"H1", "H2"}
+    for habtype in ["H1", "H2"]:
+        verwacht = _cluster_vlakken(gdf[gdf.habtype == habtype])
+        assert {frozenset(c) for c in resultaat[habtype]} == {
+            frozenset(c) for c in verwacht
+        }
+    # Er zijn clusters die meerdere tegels beslaan
+    assert max(len(c) for clusters in resultaat.values() for c in clusters) > 4
@@ -14,6 +14,7 @@ from veg2hab.io.common import (
     ApplyFunctioneleSamenhangInputs,
     ApplyMozaiekInputs,
     OverrideCriteriumIO,
+    PipelineAccessDBInputs,
 )
 from veg2hab.main import run
 
@@ -215,3 +216,35 @@ def test_mits_override(steps):
 
     assert gdf.Habtype1.iloc[4] == "H2190_D"
     assert gdf.Habtype1.iloc[8] == "H0000"
+
+
+@pytest.mark.slow
+@pytest.mark.skipif(
+    IS_WINDOWS, reason="Skip on windows because of (absence of) microsoft access driver"
+)
+def test_run_pipeline_gelijk_aan_losse_stappen(steps):
+    step_1, step_3, step_4, step_5 = steps
+    run(step_1)
+    run(step_3)
+    run(step_4)
+    run(step_5)
+
+    with tempfile.TemporaryDirectory() as tempdir:
+        params = PipelineAccessDBInputs(
+            **step_1.model_dump(exclude={"output"}),
+            output=tempdir + "/pipeline.gpkg",
+            tussenresultaten=tempdir + "/tussenresultaten",
+        )
+        run(params)
+
+        assert os.path.exists(tempdir + "/tussenresultaten/1a_digitale_standaard.gpkg")
+        assert os.path.exists(
+            tempdir + "/tussenresultaten/3_definitietabel_en_mitsen.gpkg"
+        )
+        assert os.path.exists(tempdir + "/tussenresultaten/4_mozaiekregels.gpkg")
+
+        pipeline = gpd.read_file(params.output)
+
+    stappen = gpd.read_file(step_5.output)
+    for i in range(1, 6):
+        assert pipeline[f"Habtype{i}"].equals(stappen[f"Habtype{i}"])
@@ -1,9 +1,18 @@
 import geopandas as gpd
 import pandas as pd
 
-from veg2hab.criteria import GeenCriterium, NietCriterium, NietGeautomatiseerdCriterium
-from veg2hab.enums import KeuzeStatus, Kwaliteit, MatchLevel
-from veg2hab.habitat import HabitatVoorstel, try_to_determine_habkeuze
+from veg2hab.criteria import (
+    FGRCriterium,
+    GeenCriterium,
+    NietCriterium,
+    NietGeautomatiseerdCriterium,
+)
+from veg2hab.enums import FGRType, KeuzeStatus, Kwaliteit, MatchLevel
+from veg2hab.habitat import (
+    HabitatKeuzeMemo,
+    HabitatVoorstel,
+    try_to_determine_habkeuze,
+)
 from veg2hab.io.cli import CLIInterface
 from veg2hab.mozaiek import (
     GeenMozaiekregel,
@@ -257,3 +266,49 @@ def test_wachten_op_mozaiek():
     assert keuze.status == KeuzeStatus.WACHTEN_OP_MOZAIEK
     assert keuze.habtype == "HXXXX"
     assert keuze.kwaliteit == Kwaliteit.NVT
+
+
+def test_memo_geeft_zelfde_keuzes():
+    templates = [
+        HabitatVoorstel(
+            onderbouwend_vegtype=SBB.from_code("25a1a"),
+            vegtype_in_dt=SBB.from_code("25a1a"),
+            habtype=habtype,
+            kwaliteit=Kwaliteit.GOED,
+            mits=NietCriterium(sub_criterium=FGRCriterium(wanted_fgrtype=fgrtype)),
+            mozaiek=GeenMozaiekregel(),
+            match_level=MatchLevel.SUBASSOCIATIE_SBB,
+        )
+        for habtype, fgrtype in [("H1234", FGRType.DU), ("H4321", FGRType.GG)]
+    ]
+
+    def complexdeel(fgr: FGRType, kopie=True):
+        voorstellen = []
+        for template in templates:
+            voorstel = template.model_copy()
+            if kopie:
+                voorstel._template = template
+            voorstel.mits = voorstel.mits.evaluatie_kopie()
+            voorstel.mits.check(pd.Series({"fgr": fgr, "fgr_percentage": 100.0}))
+            voorstellen.append(voorstel)
+        return voorstellen
+
+    memo = HabitatKeuzeMemo()
+    complexdelen = [
+        complexdeel(FGRType.DU),
+        complexdeel(FGRType.GG),
+        complexdeel(FGRType.DU),
+        complexdeel(FGRType.DU, kopie=False),
+    ]
+    for voorstellen in complexdelen:
+        keuze = memo.try_to_determine_habkeuze(voorstellen)
+        verwacht = try_to_determine_habkeuze(voorstellen)
+        assert keuze.model_dump() == verwacht.model_dump()
+        # Met de eigen voorstellen van het complexdeel
+        assert all(
+            any(voorstel is gekozen for voorstel in voorstellen)
+            for gekozen in keuze.habitatvoorstellen
+        )
+
+    assert (memo.hits, memo.misses, memo.niet_memoiseerbaar) == (1, 2, 1)
+    assert memo.hit_rate == 0.25
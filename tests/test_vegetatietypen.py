@@ -1,6 +1,10 @@
+import pickle
+
+import pandas as pd
 import pytest
+from pydantic import ValidationError
 
-from veg2hab.vegetatietypen import SBB, MatchLevel, VvN
+from veg2hab.vegetatietypen import SBB, MatchLevel, VvN, rVvN
 from veg2hab.vegtypeinfo import VegTypeInfo
 
 
@@ -221,3 +225,90 @@ def test_vegtype_info():
         100, SBB_strings=["42a1e"], VvN_strings=["42aa1e"]
     )
     assert vegtypeinfo.SBB == [SBB.from_code("42a1e")]
+
+
+def test_vegtypen_zijn_geinterneerd():
+    sbb = SBB.from_code("14e1a")
+    assert SBB.from_string("14e1a") is sbb
+    assert VegTypeInfo.from_str_vegtypes(100, SBB_strings=["14e1a"]).SBB[0] is sbb
+
+    # Ook na (de)serializen en pickle
+    info = VegTypeInfo.from_str_vegtypes(100, VvN_strings=["42aa1e"])
+    assert (
+        VegTypeInfo.deserialize_list(VegTypeInfo.serialize_list([info]))[0].VvN[0]
+        is info.VvN[0]
+    )
+    assert pickle.loads(pickle.dumps(sbb)) is sbb
+
+    # Los aangemaakt is gelijk, maar niet hetzelfde object tot het geinterneerd is
+    los = SBB(klasse="14", verbond="e", associatie="1", subassociatie="a")
+    assert los == sbb and hash(los) == hash(sbb)
+    assert los.intern() is sbb
+
+    # SBB en VvN met dezelfde velden zijn niet gelijk
+    assert SBB(klasse="1") != VvN(klasse="1")
+
+    with pytest.raises(ValidationError):
+        sbb.klasse = "15"
+
+
+@pytest.mark.parametrize(
+    "vegtype_class, codes",
+    [
+        (SBB, ["14e1a", "16b/a", "16-b", "9b1", "100", "5", "x1", "14e1aa", ""]),
+        (VvN, ["42aa1e", "37rg2", "42dg2", "5ca2a", "1aa", "1a1", "42dg", "rg2"]),
+        (rVvN, ["r42aa1e", "r37rg2", "r42dg2", "r5ca2", "42aa1e", "r1a1", "r"]),
+    ],
+)
+def test_series_zelfde_als_per_code(vegtype_class, codes):
+    series = pd.Series(codes + [None] + codes)
+
+    valide = vegtype_class.valide_codes(series)
+    assert valide.tolist() == [
+        code is None or bool(vegtype_class.validate_code(code))
+        for code in series.tolist()
+    ]
+
+    # Zonder de niet valide codes geeft from_series dezelfde (geinterneerde) objecten
+    series = series[valide]
+    vegtypen = vegtype_class.from_series(series)
+    assert vegtypen.index.equals(series.index)
+    for code, vegtype in zip(series, vegtypen):
+        assert vegtype is vegtype_class.from_string(code)
+
+    with pytest.raises(ValueError):
+        vegtype_class.from_series(pd.Series(codes))
+
+
+def test_opschonen_series_geeft_none():
+    series = pd.Series(["SBB-14E01A", " - ", "x", "", None, pd.NA])
+    assert SBB.opschonen_series(series).tolist() == [
+        "14e1a",
+        None,
+        None,
+        None,
+        None,
+        None,
+    ]
+
+
+@pytest.mark.parametrize(
+    "vegtype_class, codes",
+    [
+        (SBB, ["14e1a", "14e1", "14e", "14", "14f", "16b/a", "16b/b", "16-b", "100"]),
+        (VvN, ["42aa1e", "42aa1", "42aa", "42a", "42", "42ab", "37rg2", "37dg2"]),
+    ],
+)
+def test_match_levels_zelfde_als_match_up_to(vegtype_class, codes):
+    codes = [vegtype_class.from_code(code) for code in codes] + [None]
+    codering = vegtype_class.codeer(codes)
+    levels = vegtype_class.match_levels(codering, codering[:-1])
+
+    assert levels.shape == (len(codes), len(codes) - 1)
+    for i, code in enumerate(codes):
+        for j, andere in enumerate(codes[:-1]):
+            verwacht = MatchLevel.NO_MATCH if code is None else code.match_up_to(andere)
+            assert levels[i, j] == verwacht, (code, andere)
+
+    # Ook na pickelen dezelfde codering
+    assert (vegtype_class.codeer(pickle.loads(pickle.dumps(codes))) == codering).all()
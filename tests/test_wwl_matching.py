@@ -164,3 +164,36 @@ def test_vervangen_rVvN_in_pandas_series(wwl):
         ]
     )
     assert (pre.apply(wwl.toevoegen_VvN_aan_List_VegTypeInfo) == post).all()
+
+
+def test_toevoegen_VvN_uitgeklapt(wwl):
+    pre = pd.Series(
+        [
+            [VegTypeInfo.from_str_vegtypes(100, SBB_strings=["5b2b"])],
+            [],
+            [
+                VegTypeInfo(percentage=50),
+                VegTypeInfo.from_str_vegtypes(50, SBB_strings=["5d-b"]),
+            ],
+        ],
+        index=[10, 3, 7],
+    )
+    post = wwl.toevoegen_VvN(pre)
+
+    assert post.index.to_list() == [10, 3, 7]
+    assert post.to_list() == [
+        [
+            VegTypeInfo.from_str_vegtypes(
+                100, SBB_strings=["5b2b"], VvN_strings=["5ba2"]
+            )
+        ],
+        [],
+        [
+            VegTypeInfo(percentage=50),
+            VegTypeInfo.from_str_vegtypes(
+                50, SBB_strings=["5d-b"], VvN_strings=["5rg7"]
+            ),
+        ],
+    ]
+    # Zonder SBB code blijft de VegTypeInfo hetzelfde object
+    assert post[7][0] is pre[7][0]
@@ -2,4 +2,14 @@ import warnings
 
 __version__ = "1.1.2"
 
-from .main import bronbestanden, installatie_instructies, run
+__all__ = ["bronbestanden", "installatie_instructies", "run"]
+
+
+def __getattr__(name: str):
+    # veg2hab.main (en daarmee pandas en geopandas) pas inladen als deze nodig is,
+    # zodat de CLI en de ArcGIS toolbox snel opstarten
+    if name in __all__:
+        from . import main
+
+        return getattr(main, name)
+    raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
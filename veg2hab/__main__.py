@@ -1,30 +1,48 @@
 import logging
-from typing import Dict, List, Sequence, Tuple
+import sys
+import time
+from pathlib import Path
+from typing import Optional
 
 import click
 
 import veg2hab
-from veg2hab import main
-from veg2hab.criteria import OverrideCriterium
-from veg2hab.enums import MaybeBoolean
 from veg2hab.io.cli import (
     CLIAccessDBInputs,
     CLIApplyDefTabelInputs,
     CLIApplyFunctioneleSamenhangInputs,
     CLIApplyMozaiekInputs,
     CLIInterface,
+    CLIPipelineAccessDBInputs,
+    CLIPipelineShapefileInputs,
     CLIShapefileInputs,
     CLIStackVegKarteringInputs,
 )
 from veg2hab.io.common import OverrideCriteriumIO
 
+# NOTE: veg2hab.main, batch en server (en daarmee pandas en geopandas) worden pas in de
+#       commands ingeladen, zodat --help en het controleren van de argumenten snel zijn
+
 
 @click.group()
 @click.version_option(veg2hab.__version__)
 @click.option(
     "-v", "--verbose", count=True, help="Increase verbosity, use -vv for debug info"
 )
-def veg2hab(verbose: int):
+@click.option(
+    "--server",
+    envvar="VEG2HAB_SERVER",
+    default=None,
+    help="URL van een draaiende veg2hab server (zie veg2hab serve), bijvoorbeeld http://127.0.0.1:8765. Indien gegeven wordt de stap door de server uitgevoerd.",
+)
+@click.option(
+    "--profile",
+    is_flag=True,
+    default=False,
+    help="Schrijf per (sub)stap de wandtijd, cpu tijd en het piek geheugengebruik weg als JSON en CSV naast de output",
+)
+@click.pass_context
+def veg2hab(ctx: click.Context, verbose: int, server: Optional[str], profile: bool):
     """Veg2Hab: een toolbox voor het omzetten van vegetatiekarteringen naar habitatkaarten.
 
     De toolbox bestaat uit de volgende stappen:
@@ -40,6 +58,8 @@ def veg2hab(verbose: int):
         5. Functionele samenhang en minimum oppervlak
 
     Tussentijds kunnen handmatig aanpassingen worden gedaan.
+
+    Met run-all worden stap 1, 3, 4 en 5 in een keer doorlopen.
     """
     if verbose == 0:
         log_level = logging.WARNING
@@ -50,6 +70,27 @@ def veg2hab(verbose: int):
 
     CLIInterface.get_instance().instantiate_loggers(log_level)
 
+    ctx.obj = {"server": server, "profile": profile}
+
+
+def _run(params) -> None:
+    """
+    Voert de stap lokaal uit, of via de veg2hab server als die is opgegeven
+    """
+    obj = click.get_current_context().find_root().obj
+    if obj["server"] is None:
+        from veg2hab import main
+
+        main.run(params, profiel=obj["profile"])
+    else:
+        from veg2hab.server import submit
+
+        if obj["profile"]:
+            logging.warning(
+                "--profile wordt niet ondersteund in combinatie met --server"
+            )
+        submit(obj["server"], params)
+
 
 @veg2hab.command(
     name=CLIAccessDBInputs.label,
@@ -58,7 +99,7 @@ def veg2hab(verbose: int):
 @CLIAccessDBInputs.click_decorator
 def _1a_digitale_standaard(**kwargs):
     params = CLIAccessDBInputs(**kwargs)
-    main.run(params)
+    _run(params)
 
 
 @veg2hab.command(
@@ -68,7 +109,7 @@ def _1a_digitale_standaard(**kwargs):
 @CLIShapefileInputs.click_decorator
 def _1b_vector_bestand(**kwargs):
     params = CLIShapefileInputs(**kwargs)
-    main.run(params)
+    _run(params)
 
 
 @veg2hab.command(
@@ -78,7 +119,7 @@ def _1b_vector_bestand(**kwargs):
 @CLIStackVegKarteringInputs.click_decorator
 def _2_optioneel_stapel_veg_kart(**kwargs):
     params = CLIStackVegKarteringInputs(**kwargs)
-    main.run(params)
+    _run(params)
 
 
 @veg2hab.command(
@@ -91,7 +132,7 @@ def _3_definitie_tabel_en_mitsen(**kwargs):
         kwargs["override_dict"]
     )
     params = CLIApplyDefTabelInputs(**kwargs)
-    main.run(params)
+    _run(params)
 
 
 @veg2hab.command(
@@ -101,7 +142,7 @@ def _3_definitie_tabel_en_mitsen(**kwargs):
 @CLIApplyMozaiekInputs.click_decorator
 def _4_mozaiekregels(**kwargs):
     params = CLIApplyMozaiekInputs(**kwargs)
-    main.run(params)
+    _run(params)
 
 
 @veg2hab.command(
@@ -111,7 +152,93 @@ def _4_mozaiekregels(**kwargs):
 @CLIApplyFunctioneleSamenhangInputs.click_decorator
 def _5_functionele_samenhang(**kwargs):
     params = CLIApplyFunctioneleSamenhangInputs(**kwargs)
-    main.run(params)
+    _run(params)
+
+
+@veg2hab.group(name="run-all")
+def run_all():
+    """Doorloop stap 1, 3, 4 en 5 in een keer, zonder tussentijdse bestanden.
+
+    Gebruik --tussenresultaten om de output van stap 1, 3 en 4 toch weg te schrijven.
+    """
+
+
+@run_all.command(
+    name=CLIPipelineAccessDBInputs.label,
+    help=CLIPipelineAccessDBInputs.get_argument_description(),
+)
+@CLIPipelineAccessDBInputs.click_decorator
+def _run_all_digitale_standaard(**kwargs):
+    kwargs["override_dict"] = OverrideCriteriumIO.parse_list_of_strings(
+        kwargs["override_dict"]
+    )
+    params = CLIPipelineAccessDBInputs(**kwargs)
+    _run(params)
+
+
+@run_all.command(
+    name=CLIPipelineShapefileInputs.label,
+    help=CLIPipelineShapefileInputs.get_argument_description(),
+)
+@CLIPipelineShapefileInputs.click_decorator
+def _run_all_vector_bestand(**kwargs):
+    kwargs["override_dict"] = OverrideCriteriumIO.parse_list_of_strings(
+        kwargs["override_dict"]
+    )
+    params = CLIPipelineShapefileInputs(**kwargs)
+    _run(params)
+
+
+@veg2hab.command(name="batch")
+@click.argument("manifest", type=click.Path(exists=True, dir_okay=False))
+@click.option(
+    "--processen",
+    type=int,
+    default=None,
+    help="Aantal processen dat tegelijk karteringen omzet (standaard het aantal cpu's)",
+)
+@click.option(
+    "--rapport",
+    type=click.Path(dir_okay=False, writable=True),
+    default=None,
+    help="CSV bestand waarin per kartering het resultaat wordt weggeschreven (optioneel)",
+)
+def _batch(manifest: str, processen: Optional[int], rapport: Optional[str]):
+    """Zet alle karteringen uit een YAML/JSON manifest om met de volledige pipeline.
+
+    Het manifest bevat onder "jobs" een lijst met per kartering een "stap"
+    (1a_digitale_standaard of 1b_vector_bestand), de "params" van die stap (eventueel
+    aangevuld met override_dict en tussenresultaten, zoals bij run-all) en optioneel
+    een "naam". Relatieve paden zijn relatief ten opzichte van het manifest.
+    """
+    from veg2hab.batch import lees_manifest, run_batch, samenvatting, schrijf_rapport
+
+    jobs = lees_manifest(Path(manifest))
+
+    start = time.perf_counter()
+    resultaten = run_batch(jobs, processen)
+    totale_duur = time.perf_counter() - start
+
+    if rapport is not None:
+        schrijf_rapport(resultaten, Path(rapport))
+
+    click.echo(samenvatting(resultaten, totale_duur))
+
+    if not all(r.gelukt for r in resultaten):
+        sys.exit(1)
+
+
+@veg2hab.command(name="serve")
+@click.option("--host", default="127.0.0.1", help="Adres waarop de server luistert")
+@click.option("--port", default=8765, type=int, help="Poort waarop de server luistert")
+def _serve(host: str, port: int):
+    """Start een veg2hab server die de referentiedata in het geheugen houdt.
+
+    Stappen kunnen naar de server gestuurd worden met veg2hab --server http://HOST:PORT <stap> ...
+    """
+    from veg2hab.server import serve
+
+    serve(host, port)
 
 
 if __name__ == "__main__":
@@ -0,0 +1,272 @@
+import gc
+import json
+import logging
+import multiprocessing
+import time
+import traceback
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from pathlib import Path
+from typing import Any, Dict, List, Literal, NamedTuple, Optional, Union
+
+import pandas as pd
+from pydantic import Field
+
+from veg2hab import main
+from veg2hab.io.cli import CLIInterface
+from veg2hab.io.common import (
+    AccessDBInputs,
+    BaseModel,
+    Interface,
+    PipelineAccessDBInputs,
+    PipelineShapefileInputs,
+    paden_absoluut_maken,
+)
+from veg2hab.referentiedata import Referentiedata
+from veg2hab.tegels import aantal_processen
+
+# Referentiedata per config van de jobs (zie _config_sleutel). Wordt in het parent
+# proces gevuld voordat de workers worden geforkt, zodat de workers de referentiedata
+# copy-on-write delen
+_REFERENTIEDATA: Dict[str, Referentiedata] = {}
+
+
+class BatchJob(BaseModel):
+    naam: Optional[str] = Field(
+        default=None,
+        description="Naam van de job in de rapportage, standaard de naam van de shapefile",
+    )
+    stap: Literal["1a_digitale_standaard", "1b_vector_bestand"] = Field(
+        description="Op welke manier de vegetatiekartering wordt ingeladen",
+    )
+    params: Dict[str, Any] = Field(
+        description="Input parameters van stap 1a/1b, eventueel aangevuld met override_dict en tussenresultaten",
+    )
+    config: Dict[str, Any] = Field(
+        default_factory=dict,
+        description="Config instellingen die voor deze kartering afwijken, bijvoorbeeld {'mozaiek_threshold': 90.0}",
+    )
+
+    def as_pipeline_inputs(
+        self,
+    ) -> Union[PipelineAccessDBInputs, PipelineShapefileInputs]:
+        if self.stap == AccessDBInputs.label:
+            return PipelineAccessDBInputs(**self.params)
+        return PipelineShapefileInputs(**self.params)
+
+
+class BatchResultaat(NamedTuple):
+    naam: str
+    gelukt: bool
+    duur: float
+    aantal_vlakken: Optional[int]
+    output: Optional[str]
+    fout: Optional[str]
+
+
+def lees_manifest(path: Path) -> List[BatchJob]:
+    """
+    Leest een YAML of JSON manifest met een lijst jobs onder de key "jobs".
+    Relatieve paden in de parameters zijn relatief ten opzichte van het manifest.
+    """
+    path = Path(path)
+    with path.open("r", encoding="utf-8") as f:
+        if path.suffix.lower() in (".yaml", ".yml"):
+            try:
+                import yaml
+            except ImportError as e:
+                raise ImportError(
+                    "Voor YAML manifesten moet PyYAML geinstalleerd zijn (pip install pyyaml), of gebruik een JSON manifest"
+                ) from e
+            manifest = yaml.safe_load(f)
+        else:
+            manifest = json.load(f)
+
+    if not isinstance(manifest, dict) or not isinstance(manifest.get("jobs"), list):
+        raise ValueError("Het manifest moet een lijst met jobs bevatten onder 'jobs'")
+
+    jobs = []
+    for nr, job in enumerate(manifest["jobs"], start=1):
+        naam = job.get("naam") if isinstance(job, dict) else None
+        omschrijving = f"Job {nr}" + ("" if naam is None else f" ({naam})")
+        try:
+            job = BatchJob(**job)
+            job.params = paden_absoluut_maken(job.params, path.parent)
+            job.as_pipeline_inputs()
+        except (TypeError, ValueError) as e:
+            raise ValueError(f"{omschrijving} in het manifest is ongeldig: {e}") from e
+        if job.naam is None:
+            job.naam = Path(job.params["shapefile"]).stem
+        jobs.append(job)
+
+    namen = [job.naam for job in jobs]
+    if len(namen) != len(set(namen)):
+        raise ValueError("Namen van de jobs in het manifest moeten uniek zijn")
+
+    return jobs
+
+
+def _config_sleutel(config: Dict[str, Any]) -> str:
+    return json.dumps(config, sort_keys=True, default=str)
+
+
+def _referentiedata_voor(config: Dict[str, Any]) -> Referentiedata:
+    """
+    Referentiedata voor jobs met deze config. De waswordtlijst en definitietabel
+    gebruiken de config al bij het parsen (bv de thresholds van de mozaiekregels),
+    dus die worden per afwijkende config een keer opnieuw ingeladen.
+    """
+    sleutel = _config_sleutel(config)
+    if sleutel not in _REFERENTIEDATA:
+        standaard = _REFERENTIEDATA[_config_sleutel({})]
+        with Interface.get_instance().vaste_config(**config):
+            _REFERENTIEDATA[sleutel] = standaard.voor_config()
+    return _REFERENTIEDATA[sleutel]
+
+
+def _run_job(job: BatchJob) -> BatchResultaat:
+    """
+    Voert een enkele job uit; fouten worden afgevangen zodat de rest van de batch doorgaat
+    """
+    start = time.perf_counter()
+    try:
+        params = job.as_pipeline_inputs()
+        with Interface.get_instance().vaste_config(**job.config):
+            final_format = main.run_pipeline(params, _referentiedata_voor(job.config))
+        return BatchResultaat(
+            naam=job.naam,
+            gelukt=True,
+            duur=time.perf_counter() - start,
+            aantal_vlakken=len(final_format),
+            output=None if params.output is None else str(params.output),
+            fout=None,
+        )
+    except Exception as e:
+        logging.debug(traceback.format_exc())
+        return BatchResultaat(
+            naam=job.naam,
+            gelukt=False,
+            duur=time.perf_counter() - start,
+            aantal_vlakken=None,
+            output=None,
+            fout=f"{type(e).__name__}: {e}",
+        )
+
+
+def _init_worker(log_level: int) -> None:
+    """
+    Initialisatie van workers die niet geforkt zijn (bv op Windows);
+    deze moeten zelf de Interface en referentiedata opzetten.
+    """
+    CLIInterface.get_instance().instantiate_loggers(log_level)
+    if _config_sleutel({}) not in _REFERENTIEDATA:
+        _REFERENTIEDATA[_config_sleutel({})] = Referentiedata.inladen()
+
+
+def _log_resultaat(resultaat: BatchResultaat, nr: int, totaal: int) -> None:
+    if resultaat.gelukt:
+        logging.warning(
+            f"[{nr}/{totaal}] {resultaat.naam} gelukt in {resultaat.duur:.1f}s ({resultaat.aantal_vlakken} vlakken)"
+        )
+    else:
+        logging.error(
+            f"[{nr}/{totaal}] {resultaat.naam} mislukt na {resultaat.duur:.1f}s: {resultaat.fout}"
+        )
+
+
+def run_batch(
+    jobs: List[BatchJob],
+    processen: Optional[int] = None,
+    referentiedata: Optional[Referentiedata] = None,
+) -> List[BatchResultaat]:
+    """
+    Draait de volledige pipeline voor alle jobs op een pool van processen.
+
+    De referentiedata wordt eenmalig in dit proces ingeladen, en daarnaast een keer per
+    afwijkende config van de jobs. Waar mogelijk (linux) worden de workers geforkt,
+    zodat ze de referentiedata copy-on-write delen in plaats van deze ieder zelf in te
+    laden.
+    """
+    if processen is None:
+        processen = aantal_processen()
+    processen = max(1, min(processen, len(jobs)))
+
+    if referentiedata is None:
+        referentiedata = Referentiedata.inladen()
+    _REFERENTIEDATA.clear()
+    _REFERENTIEDATA[_config_sleutel({})] = referentiedata
+    for job in jobs:
+        try:
+            _referentiedata_voor(job.config)
+        except Exception:
+            # Bv een ongeldige config; de jobs met deze config melden de fout zelf
+            continue
+
+    resultaten = []
+
+    if processen == 1:
+        for nr, job in enumerate(jobs, start=1):
+            resultaat = _run_job(job)
+            _log_resultaat(resultaat, nr, len(jobs))
+            resultaten.append(resultaat)
+        return resultaten
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context = multiprocessing.get_context("fork")
+        # Voorkomt dat de garbage collector in de workers alle referentiedata aanraakt
+        # en daarmee de gedeelde geheugenpagina's alsnog kopieert
+        gc.freeze()
+    else:
+        context = multiprocessing.get_context("spawn")
+
+    try:
+        with ProcessPoolExecutor(
+            max_workers=processen,
+            mp_context=context,
+            initializer=_init_worker,
+            initargs=(logging.getLogger().getEffectiveLevel(),),
+        ) as executor:
+            futures = {executor.submit(_run_job, job): job for job in jobs}
+            for nr, future in enumerate(as_completed(futures), start=1):
+                job = futures[future]
+                try:
+                    resultaat = future.result()
+                except Exception as e:
+                    # Bijvoorbeeld een worker die crasht door geheugengebrek
+                    resultaat = BatchResultaat(
+                        naam=job.naam,
+                        gelukt=False,
+                        duur=0.0,
+                        aantal_vlakken=None,
+                        output=None,
+                        fout=f"{type(e).__name__}: {e}",
+                    )
+                _log_resultaat(resultaat, nr, len(jobs))
+                resultaten.append(resultaat)
+    finally:
+        gc.unfreeze()
+
+    # Zelfde volgorde als in het manifest
+    volgorde = {job.naam: i for i, job in enumerate(jobs)}
+    return sorted(resultaten, key=lambda r: volgorde[r.naam])
+
+
+def samenvatting(resultaten: List[BatchResultaat], totale_duur: float) -> str:
+    """
+    Samenvatting van een batch, inclusief doorvoersnelheid
+    """
+    gelukt = [r for r in resultaten if r.gelukt]
+    mislukt = [r for r in resultaten if not r.gelukt]
+    aantal_vlakken = sum(r.aantal_vlakken for r in gelukt)
+    totale_duur = max(totale_duur, 1e-6)
+
+    regels = [
+        f"{len(gelukt)} van de {len(resultaten)} karteringen zijn gelukt in {totale_duur:.1f}s",
+        f"Doorvoer: {len(gelukt) / totale_duur * 3600:.1f} karteringen/uur, {aantal_vlakken / totale_duur:.1f} vlakken/s",
+    ]
+    if mislukt:
+        regels.append("Mislukt: " + ", ".join(r.naam for r in mislukt))
+    return "\n".join(regels)
+
+
+def schrijf_rapport(resultaten: List[BatchResultaat], path: Path) -> None:
+    pd.DataFrame(resultaten, columns=BatchResultaat._fields).to_csv(path, index=False)
@@ -6,7 +6,9 @@ from pathlib import Path
 from typing import Optional
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import shapely
 from typing_extensions import Self
 
 import veg2hab.constants
@@ -62,6 +64,11 @@ def sjoin_largest_overlap(
     Geeft een geodataframe terug met daarin voor ieder vlak in kartering_gdf
     de info uit bron_gdf waar het het meeste mee overlapt (in kolom bron_col_name)
     en het percentage van het karteringvlak dat overlapt met het bronvlak.
+
+    Alle paren (karteringvlak, bronvlak) die elkaar raken worden in een keer met de
+    STRtree van bron_gdf gevonden, in dezelfde volgorde als gpd.sjoin. Bij meerdere
+    bronvlakken met dezelfde grootste overlap wordt (net als voorheen) de eerste
+    gebruikt.
     """
     assert (
         bron_col_name in bron_gdf.columns
@@ -70,46 +77,57 @@ def sjoin_largest_overlap(
     assert len(kartering_gdf.index) == len(
         kartering_gdf.index.unique()
     ), "Index moet uniek zijn"
-    if bron_col_name in kartering_gdf.columns:
-        kartering_gdf = kartering_gdf.drop(columns=[bron_col_name])
-
-    # Extra kolom met de geometry zodat deze blijft bestaan na de sjoin
-    bron_gdf["geometry_bron"] = bron_gdf["geometry"]
 
-    joined = gpd.sjoin(kartering_gdf, bron_gdf, how="left", predicate="intersects")
-    joined["overlap_area"] = joined.geometry.intersection(joined.geometry_bron).area
+    kartering_geometrie = kartering_gdf.geometry.to_numpy()
+    links, rechts = bron_gdf.sindex.query(
+        kartering_geometrie, predicate="intersects", sort=False
+    )
+    overlap_area = shapely.area(
+        shapely.intersection(
+            kartering_geometrie[links], bron_gdf.geometry.to_numpy()[rechts]
+        )
+    )
 
-    def _retain_largest_overlap_area_row(group):
-        assert len(group) > 0, "Group mag niet leeg zijn"
+    # Per karteringvlak het paar met de grootste overlap; lexsort is stabiel, dus bij
+    # gelijke overlap komt het eerste paar (in de volgorde van de query) voorop
+    volgorde = np.lexsort((-overlap_area, links))
+    links, rechts, overlap_area = (
+        links[volgorde],
+        rechts[volgorde],
+        overlap_area[volgorde],
+    )
+    eerste = np.ones(len(links), dtype=bool)
+    eerste[1:] = links[1:] != links[:-1]
 
-        # Als er maar 1 is hoeven we niks te doen
-        if len(group) == 1:
-            return group
+    grootste = np.full(len(kartering_gdf), np.nan)
+    grootste[links[eerste]] = overlap_area[eerste]
+    bronvlak = np.full(len(kartering_gdf), -1)
+    bronvlak[links[eerste]] = rechts[eerste]
 
-        highest_overlap_area = group["overlap_area"].max()
-        # Enkel de eerste teruggeven voor het geval er meerdere met dezelfde area zijn
-        if len(group[group["overlap_area"] == highest_overlap_area]) > 1:
-            logging.warning(
-                f"Meerdere bronvlakken met dezelfde overlap area gevonden; alleen de eerste wordt gebruikt"
-            )
-        return group[group["overlap_area"] == highest_overlap_area].iloc[[0]]
-
-    # Groupby index, zodat we groepen maken per karteringvlak
-    grouped = joined.groupby(level=0, group_keys=False)
-    only_largest_overlaps = grouped.apply(_retain_largest_overlap_area_row)
-    only_largest_overlaps[f"{bron_col_name}_percentage"] = (
-        only_largest_overlaps["overlap_area"]
-        / only_largest_overlaps["geometry"].area
-        * 100
+    aantal_gelijk = np.bincount(
+        links, weights=overlap_area == grootste[links], minlength=len(kartering_gdf)
     )
+    aantal_met_gelijke = int((aantal_gelijk > 1).sum())
+    if aantal_met_gelijke > 0:
+        logging.warning(
+            f"Voor {aantal_met_gelijke} karteringvlakken zijn er meerdere bronvlakken ({bron_col_name}) met dezelfde overlap area gevonden; alleen de eerste wordt gebruikt"
+        )
 
-    bron_gdf = bron_gdf.drop(columns=["geometry_bron"])
-
-    assert len(only_largest_overlaps) == len(
-        kartering_gdf
-    ), "DF met bronvlakcodes moet even lang zijn als de kartering_gdf"
+    only_largest_overlaps = pd.DataFrame(
+        {
+            # Met -1 (geen overlappend bronvlak) wordt het NaN
+            bron_col_name: pd.api.extensions.take(
+                bron_gdf[bron_col_name].to_numpy(), bronvlak, allow_fill=True
+            ),
+            f"{bron_col_name}_percentage": grootste
+            / shapely.area(kartering_geometrie)
+            * 100,
+        },
+        index=kartering_gdf.index,
+    )
 
-    return only_largest_overlaps[[bron_col_name, f"{bron_col_name}_percentage"]]
+    # Net als een groupby op de index gesorteerd
+    return only_largest_overlaps.sort_index()
 
 
 class LBK:
@@ -144,7 +162,17 @@ class LBK:
             local_path.parent.mkdir(parents=True, exist_ok=True)
             urllib.request.urlretrieve(remote_path, local_path)
 
-        return cls.from_file(local_path, mask)
+        # Niet bovenaan importeren, veg2hab.cache importeert zelf uit veg2hab.bronnen
+        from veg2hab.cache import load_tiled
+
+        return cls(
+            load_tiled(
+                "lbk",
+                local_path,
+                lambda mask: cls.from_file(local_path, mask).gdf,
+                mask,
+            )
+        )
 
     def for_geometry(self, other_gdf: gpd.GeoDataFrame) -> gpd.GeoSeries:
         """
@@ -219,7 +247,17 @@ class Bodemkaart:
             local_path.parent.mkdir(parents=True, exist_ok=True)
             urllib.request.urlretrieve(remote_path, local_path)
 
-        return cls.from_file(local_path, mask)
+        # Niet bovenaan importeren, veg2hab.cache importeert zelf uit veg2hab.bronnen
+        from veg2hab.cache import load_tiled
+
+        return cls(
+            load_tiled(
+                "bodemkaart",
+                local_path,
+                lambda mask: cls.from_file(local_path, mask).gdf,
+                mask,
+            )
+        )
 
     def for_geometry(self, other_gdf: gpd.GeoDataFrame) -> gpd.GeoSeries:
         """
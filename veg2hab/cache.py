@@ -0,0 +1,233 @@
+import hashlib
+import logging
+import os
+import pickle
+import shutil
+from pathlib import Path
+from typing import Callable, Optional, TypeVar
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+import veg2hab
+from veg2hab.bronnen import get_checksum, get_datadir
+from veg2hab.io.common import Interface
+from veg2hab.tegels import deel_in_tegels
+
+T = TypeVar("T")
+
+# Ophogen als de opbouw van gepickelde objecten verandert, zodat caches en checkpoints
+# die met een eerdere ontwikkelversie zijn gemaakt niet meer gebruikt worden
+PICKLE_FORMAAT = 6
+
+# Grootte (in meters) van de tegels waarin de landelijke LBK en Bodemkaart gecached worden
+BRON_TEGEL_GROOTTE = 10_000
+
+
+def get_cachedir() -> Path:
+    """
+    Map waarin veg2hab geparste referentiedata bewaart
+    """
+    return get_datadir("veg2hab", "cache")
+
+
+def _cache_prefix(name: str, source: Path) -> str:
+    """
+    Begin van de bestandsnaam van de cache van een referentiebestand. Hierin zit ook
+    het pad van het bestand, zodat het opruimen van verouderde caches van bv een eigen
+    definitietabel de cache van de meegeleverde definitietabel laat staan.
+    """
+    pad = hashlib.md5(str(Path(source).resolve()).encode()).hexdigest()[:12]
+    return f"{name}_{pad}"
+
+
+def _cache_key(source: Path, met_config: bool = True) -> str:
+    """
+    Sleutel voor de cache van een referentiebestand.
+    Naast de checksum van het bronbestand en de veg2hab versie wordt ook de config
+    meegenomen, omdat o.a. de mozaiekregels en SBB codes bij het parsen de config gebruiken.
+    Voor bronkaarten, die niet van de config afhangen, kan dat met met_config=False uit.
+    """
+    key = hashlib.md5()
+    key.update(get_checksum(source).encode())
+    key.update(veg2hab.__version__.encode())
+    key.update(str(PICKLE_FORMAAT).encode())
+    if met_config:
+        config = Interface.get_instance().get_config().model_dump_json()
+        key.update(config.encode())
+    return key.hexdigest()
+
+
+def load_or_build(name: str, source: Path, build: Callable[[], T]) -> T:
+    """
+    Laadt het geparste object voor een referentiebestand uit de lokale cache.
+    Als er (nog) geen geldige cache is, wordt het object met build() gemaakt en
+    opgeslagen, zodat een volgende aanroep het parsen kan overslaan.
+    """
+    if not Interface.get_instance().get_config().referentie_cache:
+        return build()
+
+    cache_dir = get_cachedir()
+    prefix = _cache_prefix(name, source)
+    cache_path = cache_dir / f"{prefix}_{_cache_key(Path(source))}.pkl"
+
+    if cache_path.is_file():
+        try:
+            with cache_path.open("rb") as f:
+                obj = pickle.load(f)
+            logging.debug(f"{name} is ingeladen uit de cache {cache_path}")
+            return obj
+        except Exception as e:
+            logging.warning(
+                f"Cache van {name} in {cache_path} kon niet worden ingeladen, deze wordt opnieuw aangemaakt: {e}"
+            )
+
+    obj = build()
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        # Eerst naar een tijdelijk bestand, zodat gelijktijdige runs nooit een half geschreven cache inladen
+        tmp_path = cache_path.with_suffix(f".{os.getpid()}.tmp")
+        with tmp_path.open("wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, cache_path)
+
+        # Verouderde caches van hetzelfde bestand opruimen
+        for old_path in cache_dir.glob(f"{prefix}_*.pkl"):
+            if old_path != cache_path:
+                old_path.unlink(missing_ok=True)
+    except OSError as e:
+        logging.warning(f"Cache van {name} kon niet worden weggeschreven: {e}")
+
+    return obj
+
+
+def _binnen_mask(
+    gdf: gpd.GeoDataFrame, mask: Optional[gpd.GeoDataFrame]
+) -> gpd.GeoDataFrame:
+    """
+    De vlakken uit gdf die de mask snijden, in de volgorde van gdf.
+    Dit zijn dezelfde vlakken als bij gpd.read_file(path, mask=mask), alleen geeft GDAL
+    die in de volgorde van de ruimtelijke index van het bestand (zie ook
+    veg2hab.referentiedata._subset_for_mask).
+    """
+    if mask is None:
+        return gdf.reset_index(drop=True)
+    if mask.crs is not None and gdf.crs is not None:
+        mask = mask.to_crs(gdf.crs)
+    _, posities = gdf.sindex.query(mask.geometry, predicate="intersects")
+    return gdf.iloc[np.unique(posities)].reset_index(drop=True)
+
+
+def _schrijf_tegels(gdf: gpd.GeoDataFrame, tegel_map: Path) -> None:
+    """
+    Schrijft gdf per tegel van BRON_TEGEL_GROOTTE weg naar tegel_map, met een index
+    met de bounding box van iedere tegel (de bounding box van alle vlakken erin, dus
+    ook van de vlakken die over de tegelgrens heen liggen).
+    De index van gdf (de positie in het bronbestand) blijft in de tegels bewaard.
+    """
+    tegel_map.mkdir(parents=True)
+    tegels = deel_in_tegels(gdf, BRON_TEGEL_GROOTTE)
+    bounds = gdf.geometry.bounds.to_numpy()
+
+    tegel_bounds = np.empty((len(tegels), 4))
+    for i, posities in enumerate(tegels):
+        tegel_bounds[i, :2] = bounds[posities, :2].min(axis=0)
+        tegel_bounds[i, 2:] = bounds[posities, 2:].max(axis=0)
+        with (tegel_map / f"tegel_{i}.pkl").open("wb") as f:
+            pickle.dump(gdf.iloc[posities], f, protocol=pickle.HIGHEST_PROTOCOL)
+
+    # De index als laatste, een map zonder index wordt nooit ingeladen
+    with (tegel_map / "index.pkl").open("wb") as f:
+        pickle.dump(
+            {"bounds": tegel_bounds, "leeg": gdf.iloc[:0]},
+            f,
+            protocol=pickle.HIGHEST_PROTOCOL,
+        )
+
+
+def _lees_tegels(tegel_map: Path, mask: Optional[gpd.GeoDataFrame]) -> gpd.GeoDataFrame:
+    """
+    Leest alleen de tegels uit tegel_map waarvan de bounding box de mask snijdt
+    (of alle tegels zonder mask) en zet de vlakken terug in de volgorde van het bronbestand.
+    """
+    with (tegel_map / "index.pkl").open("rb") as f:
+        index = pickle.load(f)
+
+    tegel_boxes = shapely.box(*index["bounds"].T)
+    if mask is None:
+        nummers = np.arange(len(tegel_boxes))
+    else:
+        if mask.crs is not None and index["leeg"].crs is not None:
+            mask = mask.to_crs(index["leeg"].crs)
+        _, nummers = shapely.STRtree(tegel_boxes).query(
+            mask.geometry.to_numpy(), predicate="intersects"
+        )
+        nummers = np.unique(nummers)
+
+    delen = [index["leeg"]]
+    for nummer in nummers:
+        with (tegel_map / f"tegel_{nummer}.pkl").open("rb") as f:
+            delen.append(pickle.load(f))
+    gdf = pd.concat(delen).sort_index()
+    logging.debug(
+        f"{len(nummers)} van {len(tegel_boxes)} tegels ingeladen uit {tegel_map}"
+    )
+
+    return _binnen_mask(gdf, mask)
+
+
+def load_tiled(
+    name: str,
+    source: Path,
+    build: Callable[[Optional[gpd.GeoDataFrame]], gpd.GeoDataFrame],
+    mask: Optional[gpd.GeoDataFrame] = None,
+) -> gpd.GeoDataFrame:
+    """
+    Laadt de vlakken van een (landelijke) bronkaart die de mask snijden uit een
+    getegelde lokale cache, met dezelfde vlakken als build(mask), in de volgorde
+    van het bronbestand.
+
+    De eerste keer wordt de hele kaart met build(None) ingelezen en per tegel
+    weggeschreven; daarna worden alleen de tegels ingelezen die de mask raken, in
+    plaats van het hele bronbestand te doorzoeken.
+    """
+    if not Interface.get_instance().get_config().referentie_cache:
+        return build(mask)
+
+    cache_dir = get_cachedir()
+    prefix = _cache_prefix(name, source)
+    tegel_map = cache_dir / f"{prefix}_{_cache_key(Path(source), met_config=False)}"
+
+    if (tegel_map / "index.pkl").is_file():
+        try:
+            gdf = _lees_tegels(tegel_map, mask)
+            logging.debug(f"{name} is ingeladen uit de cache {tegel_map}")
+            return gdf
+        except Exception as e:
+            logging.warning(
+                f"Cache van {name} in {tegel_map} kon niet worden ingeladen, deze wordt opnieuw aangemaakt: {e}"
+            )
+            shutil.rmtree(tegel_map, ignore_errors=True)
+
+    logging.info(f"Eenmalig aanmaken van de getegelde cache van {name}")
+    gdf = build(None).reset_index(drop=True)
+
+    # Eerst naar een tijdelijke map, zodat gelijktijdige runs nooit een half geschreven cache inladen
+    tmp_map = tegel_map.with_name(f"{tegel_map.name}.{os.getpid()}.tmp")
+    try:
+        _schrijf_tegels(gdf, tmp_map)
+        os.replace(tmp_map, tegel_map)
+
+        # Verouderde caches van dezelfde kaart opruimen
+        for old_map in cache_dir.glob(f"{prefix}_*"):
+            if old_map.is_dir() and old_map != tegel_map and old_map.suffix != ".tmp":
+                shutil.rmtree(old_map, ignore_errors=True)
+    except OSError as e:
+        logging.warning(f"Cache van {name} kon niet worden weggeschreven: {e}")
+    finally:
+        shutil.rmtree(tmp_map, ignore_errors=True)
+
+    return _binnen_mask(gdf, mask)
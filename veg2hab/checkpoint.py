@@ -0,0 +1,252 @@
+import hashlib
+import logging
+import os
+import pickle
+from pathlib import Path
+from typing import Any, List, Optional, Union
+
+import veg2hab
+from veg2hab import constants
+from veg2hab.bronnen import get_checksum, get_datadir
+from veg2hab.cache import PICKLE_FORMAAT
+from veg2hab.io.common import (
+    ApplyDefTabelInputs,
+    ApplyFunctioneleSamenhangInputs,
+    ApplyMozaiekInputs,
+    Interface,
+    PipelineAccessDBInputs,
+    PipelineShapefileInputs,
+    Veg2HabConfig,
+)
+
+# Config velden die de uitkomst van de omzetting niet beinvloeden
+_CONFIG_ZONDER_INVLOED = {
+    "referentie_cache",
+    "profiel",
+    "tegel_grootte",
+    "tegel_processen",
+    "checkpoints",
+    "checkpoints_map",
+    "checkpoints_max_mb",
+}
+
+# Config velden per stap van de pipeline. Alle overige velden tellen (voor de zekerheid)
+# mee bij de eerste stap. Omdat iedere sleutel de sleutel van de vorige stap bevat,
+# worden de stappen na een gewijzigd veld ook opnieuw gedaan.
+# NOTE: de mozaiek thresholds worden bij het parsen van de definitietabel in de
+#       mozaiekregels gezet, dus die horen bij stap 3 en niet bij stap 4
+_CONFIG_PER_STAP = {
+    ApplyDefTabelInputs.label: {
+        "mozaiek_threshold",
+        "mozaiek_als_rand_threshold",
+        "mozaiek_minimum_bedekking",
+    },
+    ApplyMozaiekInputs.label: set(),
+    ApplyFunctioneleSamenhangInputs.label: {
+        "functionele_samenhang_vegetatiekundig_identiek",
+        "functionele_samenhang_buffer_distances",
+        "minimum_oppervlak_exceptions",
+        "minimum_oppervlak_default",
+    },
+}
+
+
+# Begin van de bestandsnaam van checkpoints; de checkpoints_map kan ook andere
+# bestanden bevatten, die mogen niet opgeruimd worden
+_CHECKPOINT_PREFIX = "veg2hab_checkpoint_"
+
+
+def get_checkpointdir() -> Path:
+    """
+    Map waarin veg2hab de resultaten van de stappen van de pipeline bewaart
+    """
+    config = Interface.get_instance().get_config()
+    if config.checkpoints_map is not None:
+        return Path(config.checkpoints_map)
+    return get_datadir("veg2hab", "checkpoints")
+
+
+def bestand_hash(path: Path) -> str:
+    """
+    Hash van de inhoud van een bestand. Bij een shapefile worden ook de bijbehorende
+    bestanden (.dbf, .shx, .prj etc.) meegenomen.
+    """
+    path = Path(path)
+    if path.suffix.lower() == ".shp":
+        paden = sorted(p for p in path.parent.glob(f"{path.stem}.*") if p.is_file())
+    else:
+        paden = [path]
+
+    key = hashlib.md5()
+    for p in paden:
+        key.update(p.suffix.lower().encode())
+        key.update(get_checksum(p).encode())
+    return key.hexdigest()
+
+
+def _referentie_checksum(path: str) -> str:
+    # Een ontbrekend bestand geeft verderop in de pipeline een duidelijke foutmelding
+    return get_checksum(Path(path)) if Path(path).is_file() else "ontbreekt"
+
+
+def _config_json(config: Veg2HabConfig, label: str, eerste_stap: bool) -> str:
+    if eerste_stap:
+        overige = set().union(*_CONFIG_PER_STAP.values()) | _CONFIG_ZONDER_INVLOED
+        velden = set(Veg2HabConfig.model_fields) - overige
+    else:
+        velden = _CONFIG_PER_STAP[label]
+    return config.model_dump_json(include=velden)
+
+
+def _sleutel(*delen: str) -> str:
+    key = hashlib.md5()
+    for deel in delen:
+        key.update(deel.encode())
+        # Scheidingsteken, zodat ("ab", "c") en ("a", "bc") verschillende sleutels geven
+        key.update(b"\0")
+    return key.hexdigest()
+
+
+def pipeline_sleutels(
+    params: Union[PipelineAccessDBInputs, PipelineShapefileInputs],
+) -> Optional[List[str]]:
+    """
+    Sleutels van de stappen 1, 3, 4 en 5 van de pipeline.
+
+    De sleutel van een stap is een hash van de sleutel van de vorige stap en alles wat
+    de uitkomst van de stap bepaalt: de inhoud (niet de locatie) van de inputbestanden,
+    de input parameters, de overrides, de relevante config velden en de checksums van
+    de referentiedata. Zolang de sleutel gelijk is, is het resultaat van de stap dat ook.
+
+    Geeft None als de inputbestanden geen bestanden zijn (zoals lagen in ArcGIS Pro).
+    """
+    bestanden = [Path(params.shapefile)]
+    if isinstance(params, PipelineAccessDBInputs):
+        bestanden.append(Path(params.access_mdb_path))
+    overrides = [
+        Path(o.override_geometry)
+        for o in params.override_dict
+        if o.override_geometry is not None
+    ]
+    if not all(p.is_file() for p in bestanden + overrides):
+        logging.info(
+            "Niet alle inputbestanden zijn bestanden, er worden geen checkpoints gebruikt"
+        )
+        return None
+
+    config = Interface.get_instance().get_config()
+
+    stap_1 = _sleutel(
+        veg2hab.__version__,
+        str(PICKLE_FORMAAT),
+        type(params).__name__,
+        params.model_dump_json(
+            exclude={
+                "shapefile",
+                "access_mdb_path",
+                "output",
+                "tussenresultaten",
+                "override_dict",
+            }
+        ),
+        *[bestand_hash(p) for p in bestanden],
+        _config_json(config, params.label, eerste_stap=True),
+        _referentie_checksum(constants.WWL_PATH),
+    )
+    stap_3 = _sleutel(
+        stap_1,
+        # Van de override geometrieen telt de inhoud, niet de locatie
+        *[
+            o.model_dump_json(exclude={"override_geometry"})
+            for o in params.override_dict
+        ],
+        *[bestand_hash(p) for p in overrides],
+        _config_json(config, ApplyDefTabelInputs.label, eerste_stap=False),
+        _referentie_checksum(constants.DEFTABEL_PATH),
+        _referentie_checksum(constants.FGR_PATH),
+        _referentie_checksum(constants.OUDE_BOSSENKAART_PATH),
+        constants.LBK_CHECKSUM,
+        constants.BODEMKAART_CHECKSUM,
+    )
+    stap_4 = _sleutel(
+        stap_3, _config_json(config, ApplyMozaiekInputs.label, eerste_stap=False)
+    )
+    stap_5 = _sleutel(
+        stap_4,
+        _config_json(config, ApplyFunctioneleSamenhangInputs.label, eerste_stap=False),
+    )
+    return [stap_1, stap_3, stap_4, stap_5]
+
+
+def laad_checkpoint(sleutel: str) -> Optional[Any]:
+    """
+    Laadt het resultaat van een stap, of None als er (nog) geen geldig checkpoint is
+    """
+    path = get_checkpointdir() / f"{_CHECKPOINT_PREFIX}{sleutel}.pkl"
+    if not path.is_file():
+        return None
+
+    try:
+        with path.open("rb") as f:
+            obj = pickle.load(f)
+    except Exception as e:
+        logging.warning(f"Checkpoint {path} kon niet worden ingeladen: {e}")
+        return None
+
+    # Recent gebruikte checkpoints worden als laatste opgeruimd
+    try:
+        os.utime(path)
+    except OSError:
+        pass
+    logging.debug(f"Checkpoint is ingeladen uit {path}")
+    return obj
+
+
+def bewaar_checkpoint(sleutel: str, obj: Any) -> None:
+    """
+    Bewaart het resultaat van een stap en ruimt daarna de oudste checkpoints op,
+    totdat de checkpoints samen niet meer dan checkpoints_max_mb innemen
+    """
+    cache_dir = get_checkpointdir()
+    path = cache_dir / f"{_CHECKPOINT_PREFIX}{sleutel}.pkl"
+    # Eerst naar een tijdelijk bestand, zodat gelijktijdige runs nooit een half geschreven checkpoint inladen
+    tmp_path = path.with_suffix(f".{os.getpid()}.tmp")
+
+    try:
+        cache_dir.mkdir(parents=True, exist_ok=True)
+        with tmp_path.open("wb") as f:
+            pickle.dump(obj, f, protocol=pickle.HIGHEST_PROTOCOL)
+        os.replace(tmp_path, path)
+    except OSError as e:
+        logging.warning(f"Checkpoint kon niet worden weggeschreven: {e}")
+        return
+    finally:
+        # Bv na een PicklingError
+        tmp_path.unlink(missing_ok=True)
+
+    max_mb = Interface.get_instance().get_config().checkpoints_max_mb
+    _opruimen(cache_dir, int(max_mb * 1024**2), behouden=path)
+
+
+def _opruimen(cache_dir: Path, max_bytes: int, behouden: Path) -> None:
+    """
+    Verwijdert de minst recent gebruikte checkpoints totdat alle checkpoints samen
+    niet meer dan max_bytes zijn. Het checkpoint behouden wordt nooit verwijderd.
+    """
+    checkpoints = []
+    for path in cache_dir.glob(f"{_CHECKPOINT_PREFIX}*.pkl"):
+        try:
+            stat = path.stat()
+        except OSError:
+            continue
+        checkpoints.append((stat.st_mtime, stat.st_size, path))
+
+    totaal = sum(size for _, size, _ in checkpoints)
+    for _, size, path in sorted(checkpoints):
+        if totaal <= max_bytes:
+            break
+        if path == behouden:
+            continue
+        path.unlink(missing_ok=True)
+        totaal -= size
+        logging.debug(f"Checkpoint {path} is opgeruimd")
@@ -0,0 +1,172 @@
+"""
+Lange tabel van de complexdelen van een kartering
+
+In Kartering.gdf staan de complexdelen van een vlak als lijsten in de kolommen
+VegTypeInfo, HabitatVoorstel en HabitatKeuze. Voor stappen die over alle complexdelen
+heen werken is het sneller om die lijsten uit te klappen tot een tabel met een rij per
+complexdeel, daarop groupby/merge operaties te doen, en het resultaat (waar nodig)
+weer in te klappen tot lijsten per vlak.
+
+De uitgeklapte tabel heeft een rij per (vlak, complexdeel), met vlak de positie van de
+rij in de originele dataframe. De geometrie blijft alleen (per vlak) in de originele
+dataframe staan.
+"""
+
+from collections import defaultdict
+from itertools import chain
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+
+from veg2hab.enums import Kwaliteit
+
+
+def uitklappen(df: pd.DataFrame, kolommen: List[str]) -> pd.DataFrame:
+    """
+    Klapt de lijst-kolommen van df uit tot een lange tabel:
+        vlak | complexdeel | <kolommen>
+    Als de lijsten van een vlak niet even lang zijn, worden de kortere aangevuld met None
+    (bv een vlak zonder VegTypeInfo maar met een H0000 HabitatKeuze).
+    """
+    per_kolom = [df[kolom].tolist() for kolom in kolommen]
+    lengtes = np.zeros(len(df), dtype=int)
+    for lijsten in per_kolom:
+        lengtes = np.maximum(lengtes, [len(lijst) for lijst in lijsten])
+
+    vlak = np.repeat(np.arange(len(df)), lengtes)
+    begin_per_vlak = np.repeat(np.cumsum(lengtes) - lengtes, lengtes)
+    lang = pd.DataFrame(
+        {"vlak": vlak, "complexdeel": np.arange(len(vlak)) - begin_per_vlak}
+    )
+
+    for kolom, lijsten in zip(kolommen, per_kolom):
+        if all(len(lijst) == n for lijst, n in zip(lijsten, lengtes)):
+            waarden = list(chain.from_iterable(lijsten))
+        else:
+            waarden = [
+                lijst[deel] if deel < len(lijst) else None
+                for lijst, n in zip(lijsten, lengtes)
+                for deel in range(n)
+            ]
+        lang[kolom] = pd.Series(waarden, dtype="object")
+
+    return lang
+
+
+def inklappen(
+    lang: pd.DataFrame, kolom: str, index: pd.Index, overslaan_als_none: bool = False
+) -> pd.Series:
+    """
+    Zet een kolom van een lange tabel van uitklappen weer om naar een series met
+    een lijst per vlak, met index als index (die van de originele dataframe)
+    """
+    per_vlak = [[] for _ in range(len(index))]
+    for vlak, waarde in zip(lang["vlak"], lang[kolom]):
+        if overslaan_als_none and waarde is None:
+            continue
+        per_vlak[vlak].append(waarde)
+    return pd.Series(per_vlak, index=index, dtype="object")
+
+
+def complexdelen_tabel(gdf: pd.DataFrame, kolommen: Optional[List[str]] = None):
+    """
+    De complexdelen van een kartering gdf als lange tabel:
+        vlak | complexdeel | ElmID | VegTypeInfo | [HabitatVoorstel | HabitatKeuze] |
+            percentage | [habtype | kwaliteit | status]
+
+    De kolommen tussen [] zijn er alleen als de gdf al HabitatKeuzes heeft.
+    percentage is NaN voor complexdelen zonder VegTypeInfo, habtype, kwaliteit en
+    status zijn None voor complexdelen zonder (bepaalde) HabitatKeuze.
+    """
+    if kolommen is None:
+        kolommen = [
+            kolom
+            for kolom in ["VegTypeInfo", "HabitatVoorstel", "HabitatKeuze"]
+            if kolom in gdf.columns
+        ]
+    lang = uitklappen(gdf, kolommen)
+    lang.insert(2, "ElmID", gdf["ElmID"].to_numpy()[lang["vlak"].to_numpy()])
+
+    if "VegTypeInfo" in lang.columns:
+        lang["percentage"] = np.array(
+            [np.nan if info is None else info.percentage for info in lang.VegTypeInfo],
+            dtype=float,
+        )
+
+    if "HabitatKeuze" in lang.columns:
+        keuzes = lang["HabitatKeuze"].tolist()
+        lang["habtype"] = [None if k is None else k.habtype for k in keuzes]
+        lang["kwaliteit"] = [None if k is None else k.kwaliteit for k in keuzes]
+        lang["status"] = [None if k is None else k.status for k in keuzes]
+
+    return lang
+
+
+# Volgorde van de kwaliteiten in de samenvatting
+_KWALITEIT_VOLGORDE = {
+    Kwaliteit.GOED: 0,
+    Kwaliteit.MATIG: 1,
+    Kwaliteit.NVT: 2,
+}
+
+
+def samenvatting_per_vlak(lang: pd.DataFrame, aantal_vlakken: int) -> List[str]:
+    """
+    Maakt per vlak een samenvattende string van de habitattypen, met in een keer de
+    som van de percentages per (vlak, habtype, kwaliteit) over alle complexdelen.
+    Zie ook build_aggregate_habtype_field.
+    Voorbeeld: 70.0% H1234 (G), 20.0% H0000, 10.0% HXXXX
+    """
+    # Optellen in de volgorde van de complexdelen (en niet met groupby.sum, die anders
+    # afrondt), zodat de percentages precies gelijk zijn aan die van de losse vlakken
+    totaal = defaultdict(float)
+    for sleutel, percentage in zip(
+        zip(lang["vlak"], lang["habtype"], lang["kwaliteit"]), lang["percentage"]
+    ):
+        totaal[sleutel] += percentage
+
+    # Sorteren op (percentage, habtype, kwaliteit) zodat de string altijd hetzelfde
+    # is bij dezelfde habtype/kwaliteit/percentage permutaties
+    gesorteerd = sorted(
+        totaal.items(),
+        key=lambda item: (
+            item[0][0],
+            -item[1],
+            item[0][1],
+            _KWALITEIT_VOLGORDE[item[0][2]],
+        ),
+    )
+
+    per_vlak = [[] for _ in range(aantal_vlakken)]
+    for (vlak, habtype, kwaliteit), percentage in gesorteerd:
+        string = f"{float(percentage)}%"
+        if kwaliteit in [Kwaliteit.GOED, Kwaliteit.MATIG]:
+            string += f" ({kwaliteit.value})"
+        per_vlak[vlak].append(f"{string} {habtype}")
+
+    return [", ".join(strings) for strings in per_vlak]
+
+
+def sorteer_complexdelen(gdf: pd.DataFrame) -> pd.DataFrame:
+    """
+    Zet de complexdelen van iedere rij van gdf in de outputvolgorde, met een sortering
+    van de lange tabel: eerst alle niet-H0000, dan op percentage, dan op kwaliteit.
+    Zie ook sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen.
+    """
+    kolommen = ["HabitatKeuze", "VegTypeInfo", "HabitatVoorstel"]
+    lang = complexdelen_tabel(gdf, kolommen)
+
+    # Dezelfde sleutels als rank_habitatkeuzes
+    lang["is_H0000"] = lang["habtype"] == "H0000"
+    lang["rest_percentage"] = 100 - lang["percentage"]
+    lang["is_matig"] = [kwaliteit == [Kwaliteit.MATIG] for kwaliteit in lang.kwaliteit]
+    lang = lang.sort_values(
+        ["vlak", "is_H0000", "rest_percentage", "is_matig"], kind="stable"
+    )
+
+    gdf = gdf.copy()
+    for kolom in kolommen:
+        # Vlakken zonder VegTypeInfos houden een lege lijst
+        gdf[kolom] = inklappen(lang, kolom, gdf.index, overslaan_als_none=True)
+    return gdf
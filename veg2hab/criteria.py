@@ -2,15 +2,104 @@ import logging
 from functools import reduce
 from itertools import chain
 from operator import and_, or_
-from typing import Annotated, List, Optional, Set, Union
+from typing import (
+    Annotated,
+    Callable,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Sequence,
+    Set,
+    Tuple,
+    Union,
+)
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+import shapely
 from pydantic import BaseModel, Field, TypeAdapter, field_validator
 from shapely import wkt
 from typing_extensions import Literal
 
-from veg2hab.enums import BodemType, FGRType, LBKType, MaybeBoolean, OBKWaarden
+from veg2hab.enums import (
+    BodemType,
+    FGRType,
+    LBKType,
+    MaybeBoolean,
+    MitsBron,
+    OBKWaarden,
+)
+
+
+def _maak_tabel(operator: Callable) -> np.ndarray:
+    """
+    De uitkomst van operator voor iedere twee MaybeBooleans, als tabel op hun values,
+    zodat de driewaardige logica op hele arrays met values kan door te indexeren
+    """
+    tabel = np.zeros((6, 6), dtype=np.int8)
+    for a in MaybeBoolean:
+        for b in MaybeBoolean:
+            tabel[a.value, b.value] = operator(a, b).value
+    return tabel
+
+
+_EN_TABEL = _maak_tabel(and_)
+_OF_TABEL = _maak_tabel(or_)
+# ~a hangt niet van b af, dus een willekeurige kolom van de tabel volstaat
+_NIET_TABEL = _maak_tabel(lambda a, _: ~a)[:, MaybeBoolean.TRUE.value]
+
+
+def _vol(kolommen: pd.DataFrame, evaluatie: MaybeBoolean) -> np.ndarray:
+    return np.full(len(kolommen), evaluatie.value, dtype=np.int8)
+
+
+class CriteriumPlan(NamedTuple):
+    """
+    Gecompileerde versie van een (samengesteld) beperkend criterium, die in een keer
+    voor alle rijen van de verrijkte kolommen evalueert.
+
+    Iedere MaybeBoolean is hierin zijn value (int8). bladeren evalueert ieder
+    bladcriterium (in de volgorde van evaluaties), combineer rekent daaruit met de
+    driewaardige logica van MaybeBoolean de evaluation van het hele criterium uit.
+    """
+
+    bladeren: Tuple[Callable[[pd.DataFrame], np.ndarray], ...]
+    combineer: Callable[[Sequence[np.ndarray]], np.ndarray]
+
+    def evalueer_bladeren(self, kolommen: pd.DataFrame) -> np.ndarray:
+        """
+        Array van (rijen, bladeren) met de evaluations van de bladcriteria
+        """
+        return np.column_stack([blad(kolommen) for blad in self.bladeren])
+
+    def evalueer(self, kolommen: pd.DataFrame) -> np.ndarray:
+        return self.combineer(list(self.evalueer_bladeren(kolommen).T))
+
+
+def _samengesteld_plan(
+    sub_criteria: List["BeperkendCriterium"], tabel: np.ndarray, begin: MaybeBoolean
+) -> CriteriumPlan:
+    """
+    Plan van een En- of OfCriteria: de plannen van de subcriteria na elkaar, met hun
+    evaluations gecombineerd met tabel (net als reduce in evaluation)
+    """
+    plannen = [crit.compileer() for crit in sub_criteria]
+    grenzen = np.cumsum([0] + [len(plan.bladeren) for plan in plannen])
+
+    def combineer(bladeren: Sequence[np.ndarray]) -> np.ndarray:
+        uitkomst = np.full_like(bladeren[0], begin.value)
+        for plan, van, tot in zip(plannen, grenzen[:-1], grenzen[1:]):
+            uitkomst = tabel[uitkomst, plan.combineer(bladeren[van:tot])]
+        return uitkomst
+
+    return CriteriumPlan(
+        bladeren=tuple(chain.from_iterable(plan.bladeren for plan in plannen)),
+        combineer=combineer,
+    )
 
 
 class _BeperkendCriteriumBase(BaseModel, extra="forbid", validate_assignment=True):
@@ -26,9 +115,68 @@ class _BeperkendCriteriumBase(BaseModel, extra="forbid", validate_assignment=Tru
     def check(self, row: pd.Series):
         raise NotImplementedError()
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        """
+        Gevectoriseerde check van een bladcriterium: de evaluation (als value) voor
+        iedere rij van kolommen, gelijk aan wat check voor die rij zou geven
+        """
+        raise NotImplementedError()
+
+    def compileer(self) -> CriteriumPlan:
+        return CriteriumPlan(
+            bladeren=(self.evalueer_kolommen,), combineer=lambda bladeren: bladeren[0]
+        )
+
+    def ingevuld(
+        self, row: Dict, evaluaties: Iterator[MaybeBoolean]
+    ) -> "BeperkendCriterium":
+        """
+        Kopie die ingevuld is zoals check dat met row zou doen, maar met de evaluations
+        die al (met compileer) voor die row uitgerekend zijn. evaluaties geeft die in de
+        volgorde van de bladcriteria.
+
+        De waarden komen uit de al gevalideerde verrijkte kolommen, dus de kopie wordt
+        zonder validatie gemaakt (net als evaluatie_kopie).
+        """
+        return self.model_copy(
+            update=self._ingevulde_velden(row) | {"cached_evaluation": next(evaluaties)}
+        )
+
+    def _ingevulde_velden(self, row: Dict) -> Dict:
+        """
+        De velden (naast cached_evaluation) die check invult met row
+        """
+        return {}
+
+    def evaluatie_kopie(self) -> "BeperkendCriterium":
+        """
+        Kopie om voor een enkel vlak te checken.
+
+        De criteria uit de definitietabel worden door alle vlakken gedeeld, maar check
+        slaat de uitkomst op in het criterium zelf. Omdat check velden alleen vervangt
+        (en nooit in place aanpast) is een ondiepe kopie van ieder (sub)criterium genoeg.
+        """
+        return self.model_copy()
+
+    # De informatie die check van dit type criterium gebruikt
+    _bronnen: ClassVar[MitsBron] = MitsBron(0)
+
     def is_criteria_type_present(self, type):
         return isinstance(self, type)
 
+    def benodigde_bronnen(self) -> MitsBron:
+        """
+        De informatie die nodig is om dit criterium (en zijn subcriteria) te checken
+        """
+        return self._bronnen
+
+    def evaluaties(self) -> Tuple[Optional[MaybeBoolean], ...]:
+        """
+        De cached_evaluations van dit criterium en zijn subcriteria. Samen met het
+        criterium uit de definitietabel bepalen die de evaluation en de tekst (str).
+        """
+        return (self.cached_evaluation,)
+
     def get_info(self) -> Set[str]:
         raise NotImplementedError()
 
@@ -54,6 +202,9 @@ class GeenCriterium(_BeperkendCriteriumBase):
     def check(self, row: pd.Series) -> None:
         self.cached_evaluation = MaybeBoolean.TRUE
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        return _vol(kolommen, MaybeBoolean.TRUE)
+
     def __str__(self):
         return "Geen mits (altijd waar)"
 
@@ -69,6 +220,9 @@ class NietGeautomatiseerdCriterium(_BeperkendCriteriumBase):
     def check(self, row: pd.Series) -> None:
         self.cached_evaluation = MaybeBoolean.CANNOT_BE_AUTOMATED
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        return _vol(kolommen, MaybeBoolean.CANNOT_BE_AUTOMATED)
+
     def __str__(self):
         return f"(Niet geautomatiseerd: {self.toelichting})"
 
@@ -84,6 +238,11 @@ class OverrideCriterium(_BeperkendCriteriumBase):
     truth_value_outside: Optional[MaybeBoolean] = None
     cached_evaluation: Optional[MaybeBoolean] = None
 
+    # De geparste override_geometry als STRtree (zie override_index). Een slot in
+    # plaats van een private attribute, zodat het niet meetelt bij == en niet
+    # geserialized wordt; __copy__ neemt het wel mee naar kopieen.
+    __slots__ = ("_override_index",)
+
     # We serializen de override_geometry naar een list van strings
     # zodat we later zonder problemen OverrideCriterium kunnen serializen
     @field_validator("override_geometry", mode="before")
@@ -111,6 +270,32 @@ class OverrideCriterium(_BeperkendCriteriumBase):
     def get_deserialized_override_geometry(self):
         return gpd.GeoSeries([wkt.loads(geom) for geom in self.override_geometry])
 
+    def override_index(self) -> shapely.STRtree:
+        """
+        STRtree met de (voorbereide) override_geometry. Wordt een keer per criterium
+        geparst en opgebouwd, en gedeeld met de kopieen die per vlak gecheckt worden.
+        """
+        index = getattr(self, "_override_index", None)
+        if index is None:
+            geometrie = shapely.from_wkt(self.override_geometry)
+            shapely.prepare(geometrie)
+            index = shapely.STRtree(geometrie)
+            self._override_index = index
+        return index
+
+    def __copy__(self) -> "OverrideCriterium":
+        # Kopieen (zie evaluatie_kopie) worden gecheckt, dus de STRtree wordt hier
+        # al op het origineel opgebouwd zodat alle kopieen hem delen
+        kopie = super().__copy__()
+        if self.override_geometry is not None:
+            kopie._override_index = self.override_index()
+        return kopie
+
+    def benodigde_bronnen(self) -> MitsBron:
+        if self.override_geometry is None:
+            return MitsBron(0)
+        return MitsBron.GEOMETRIE
+
     def check(self, row: pd.Series) -> None:
         assert "geometry" in row, "geometry kolom niet aanwezig"
         assert (self.override_geometry is None) == (
@@ -121,12 +306,31 @@ class OverrideCriterium(_BeperkendCriteriumBase):
             self.cached_evaluation = self.truth_value
             return
 
-        if row.geometry.intersects(self.get_deserialized_override_geometry()).any():
+        if len(self.override_index().query(row["geometry"], predicate="intersects")):
             self.cached_evaluation = self.truth_value
             return
 
         self.cached_evaluation = ~self.truth_value
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        assert "geometry" in kolommen, "geometry kolom niet aanwezig"
+        assert (self.override_geometry is None) == (
+            self.truth_value_outside is None
+        ), "Als er een override_geometry is, moet er ook een truth_value_outside zijn (en andersom)"
+
+        if self.override_geometry is None:
+            return _vol(kolommen, self.truth_value)
+
+        # Alle vlakken in een keer opzoeken in de STRtree
+        raakt = np.zeros(len(kolommen), dtype=bool)
+        vlakken, _ = self.override_index().query(
+            kolommen["geometry"].to_numpy(), predicate="intersects"
+        )
+        raakt[vlakken] = True
+        return np.where(
+            raakt, self.truth_value.value, (~self.truth_value).value
+        ).astype(np.int8)
+
     def __str__(self):
         string = "Handmatig overschreven{}: {}"
         return string.format(
@@ -149,6 +353,8 @@ class FGRCriterium(_BeperkendCriteriumBase):
     overlap_percentage: float = 0.0
     cached_evaluation: Optional[MaybeBoolean] = None
 
+    _bronnen: ClassVar[MitsBron] = MitsBron.FGR
+
     def check(self, row: pd.Series) -> None:
         assert "fgr" in row, "fgr kolom niet aanwezig"
         assert "fgr_percentage" in row, "fgr_percentage kolom niet aanwezig"
@@ -168,6 +374,26 @@ class FGRCriterium(_BeperkendCriteriumBase):
             else MaybeBoolean.FALSE
         )
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        assert "fgr" in kolommen, "fgr kolom niet aanwezig"
+        fgr = kolommen["fgr"]
+        uitkomst = np.where(
+            fgr.isin([self.wanted_fgrtype]).to_numpy(),
+            MaybeBoolean.TRUE.value,
+            MaybeBoolean.FALSE.value,
+        ).astype(np.int8)
+        # Er is een NaN als het vlak niet overlapt met een FGR vlak
+        uitkomst[fgr.isna().to_numpy()] = MaybeBoolean.CANNOT_BE_AUTOMATED.value
+        return uitkomst
+
+    def _ingevulde_velden(self, row: Dict) -> Dict:
+        if pd.isnull(row["fgr"]):
+            return {"actual_fgrtype": None}
+        return {
+            "actual_fgrtype": FGRType(row["fgr"]),
+            "overlap_percentage": float(row["fgr_percentage"]),
+        }
+
     def __str__(self):
         string = f"FGR is {self.wanted_fgrtype.value}"
         if self.cached_evaluation is not None:
@@ -210,6 +436,8 @@ class BodemCriterium(_BeperkendCriteriumBase):
     overlap_percentage: float = 0.0
     cached_evaluation: Optional[MaybeBoolean] = None
 
+    _bronnen: ClassVar[MitsBron] = MitsBron.BODEM
+
     def check(self, row: pd.Series) -> None:
         assert "bodem" in row, "bodem kolom niet aanwezig"
         assert "bodem_percentage" in row, "bodem_percentage kolom niet aanwezig"
@@ -242,6 +470,46 @@ class BodemCriterium(_BeperkendCriteriumBase):
         ):
             self.cached_evaluation = MaybeBoolean.CANNOT_BE_AUTOMATED
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        assert "bodem" in kolommen, "bodem kolom niet aanwezig"
+        codes = set(self.wanted_bodemtype.codes)
+        bodem = kolommen["bodem"].tolist()
+        # Geen list (NaN) als het vlak niet binnen een bodemkaartvlak valt, en met
+        # meerdere bodemtypen kunnen we niet automatiseren
+        onbekend = np.array(
+            [
+                not isinstance(codes_vlak, list) or len(codes_vlak) > 1
+                for codes_vlak in bodem
+            ],
+            dtype=bool,
+        )
+        gewild = np.array(
+            [
+                isinstance(codes_vlak, list) and not codes.isdisjoint(codes_vlak)
+                for codes_vlak in bodem
+            ],
+            dtype=bool,
+        )
+        uitkomst = np.where(
+            gewild,
+            (
+                MaybeBoolean.CANNOT_BE_AUTOMATED.value
+                if self.wanted_bodemtype.enkel_negatieven
+                else MaybeBoolean.TRUE.value
+            ),
+            MaybeBoolean.FALSE.value,
+        ).astype(np.int8)
+        uitkomst[onbekend] = MaybeBoolean.CANNOT_BE_AUTOMATED.value
+        return uitkomst
+
+    def _ingevulde_velden(self, row: Dict) -> Dict:
+        return {
+            "actual_bodemcode": (
+                list(row["bodem"]) if isinstance(row["bodem"], list) else None
+            ),
+            "overlap_percentage": float(row["bodem_percentage"]),
+        }
+
     def __str__(self):
         string = f"Bodem is {self.wanted_bodemtype}"
         if self.cached_evaluation is not None:
@@ -290,6 +558,8 @@ class LBKCriterium(_BeperkendCriteriumBase):
     overlap_percentage: float = 0.0
     cached_evaluation: Optional[MaybeBoolean] = None
 
+    _bronnen: ClassVar[MitsBron] = MitsBron.LBK
+
     def check(self, row: pd.Series) -> None:
         assert "lbk" in row, "lbk kolom niet aanwezig"
         assert "lbk_percentage" in row, "lbk_percentage kolom niet aanwezig"
@@ -318,6 +588,32 @@ class LBKCriterium(_BeperkendCriteriumBase):
             if self.evaluation == MaybeBoolean.FALSE:
                 self.cached_evaluation = MaybeBoolean.CANNOT_BE_AUTOMATED
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        assert "lbk" in kolommen, "lbk kolom niet aanwezig"
+        lbk = kolommen["lbk"]
+        gewild = lbk.isin(self.wanted_lbktype.codes).to_numpy()
+        uitkomst = np.where(
+            gewild, MaybeBoolean.TRUE.value, MaybeBoolean.FALSE.value
+        ).astype(np.int8)
+
+        if self.wanted_lbktype.enkel_negatieven:
+            uitkomst[gewild] = MaybeBoolean.CANNOT_BE_AUTOMATED.value
+
+        if self.wanted_lbktype.enkel_positieven:
+            uitkomst[~gewild] = MaybeBoolean.CANNOT_BE_AUTOMATED.value
+
+        # Er is een NaN als het vlak niet mooi binnen een LBK vak valt
+        uitkomst[lbk.isna().to_numpy()] = MaybeBoolean.CANNOT_BE_AUTOMATED.value
+        return uitkomst
+
+    def _ingevulde_velden(self, row: Dict) -> Dict:
+        if pd.isna(row["lbk"]):
+            return {"actual_lbkcode": None}
+        return {
+            "actual_lbkcode": str(row["lbk"]),
+            "overlap_percentage": float(row["lbk_percentage"]),
+        }
+
     def __str__(self):
         string = f"LBK is {self.wanted_lbktype}"
         if self.cached_evaluation is not None:
@@ -383,6 +679,8 @@ class OudeBossenCriterium(_BeperkendCriteriumBase):
     overlap_percentage: float = 0.0
     cached_evaluation: Optional[MaybeBoolean] = None
 
+    _bronnen: ClassVar[MitsBron] = MitsBron.OBK
+
     def check(self, row: pd.Series) -> None:
         """
         Als de waarde van de obk kolom None is, dan is het vlak niet binnen een oude bossenkaartvlak,
@@ -416,6 +714,28 @@ class OudeBossenCriterium(_BeperkendCriteriumBase):
 
         self.cached_evaluation = MaybeBoolean.CANNOT_BE_AUTOMATED
 
+    def evalueer_kolommen(self, kolommen: pd.DataFrame) -> np.ndarray:
+        assert "obk" in kolommen, "obk kolom niet aanwezig"
+        # Buiten een oude bossenkaartvlak (NaN) of met waarde 0 is het FALSE
+        mogelijk = np.array(
+            [
+                isinstance(obk, OBKWaarden) and getattr(obk, self.for_habtype) != 0
+                for obk in kolommen["obk"]
+            ],
+            dtype=bool,
+        )
+        return np.where(
+            mogelijk, MaybeBoolean.CANNOT_BE_AUTOMATED.value, MaybeBoolean.FALSE.value
+        ).astype(np.int8)
+
+    def _ingevulde_velden(self, row: Dict) -> Dict:
+        if pd.isna(row["obk"]):
+            return {"actual_OBK": None}
+        return {
+            "actual_OBK": row["obk"],
+            "overlap_percentage": float(row["obk_percentage"]),
+        }
+
     def __str__(self):
         string = "Bos ouder dan 1850"
         if self.cached_evaluation is not None:
@@ -462,6 +782,31 @@ class NietCriterium(_BeperkendCriteriumBase):
     def check(self, row: pd.Series) -> None:
         self.sub_criterium.check(row)
 
+    def evaluatie_kopie(self) -> "NietCriterium":
+        return self.model_copy(
+            update={"sub_criterium": self.sub_criterium.evaluatie_kopie()}
+        )
+
+    def evaluaties(self) -> Tuple[Optional[MaybeBoolean], ...]:
+        return self.sub_criterium.evaluaties()
+
+    def compileer(self) -> CriteriumPlan:
+        sub = self.sub_criterium.compileer()
+        return CriteriumPlan(
+            bladeren=sub.bladeren,
+            combineer=lambda bladeren: _NIET_TABEL[sub.combineer(bladeren)],
+        )
+
+    def ingevuld(
+        self, row: Dict, evaluaties: Iterator[MaybeBoolean]
+    ) -> "NietCriterium":
+        return self.model_copy(
+            update={"sub_criterium": self.sub_criterium.ingevuld(row, evaluaties)}
+        )
+
+    def benodigde_bronnen(self) -> MitsBron:
+        return self.sub_criterium.benodigde_bronnen()
+
     def is_criteria_type_present(self, type) -> bool:
         return self.sub_criterium.is_criteria_type_present(type) or isinstance(
             self, type
@@ -493,6 +838,36 @@ class OfCriteria(_BeperkendCriteriumBase):
         for crit in self.sub_criteria:
             crit.check(row)
 
+    def evaluatie_kopie(self) -> "OfCriteria":
+        return self.model_copy(
+            update={
+                "sub_criteria": [crit.evaluatie_kopie() for crit in self.sub_criteria]
+            }
+        )
+
+    def evaluaties(self) -> Tuple[Optional[MaybeBoolean], ...]:
+        return tuple(
+            chain.from_iterable(crit.evaluaties() for crit in self.sub_criteria)
+        )
+
+    def compileer(self) -> CriteriumPlan:
+        assert len(self.sub_criteria) > 0, "OfCriteria zonder subcriteria"
+        return _samengesteld_plan(self.sub_criteria, _OF_TABEL, MaybeBoolean.FALSE)
+
+    def ingevuld(self, row: Dict, evaluaties: Iterator[MaybeBoolean]) -> "OfCriteria":
+        return self.model_copy(
+            update={
+                "sub_criteria": [
+                    crit.ingevuld(row, evaluaties) for crit in self.sub_criteria
+                ]
+            }
+        )
+
+    def benodigde_bronnen(self) -> MitsBron:
+        return reduce(
+            or_, (crit.benodigde_bronnen() for crit in self.sub_criteria), MitsBron(0)
+        )
+
     def is_criteria_type_present(self, type) -> bool:
         return any(
             crit.is_criteria_type_present(type) for crit in self.sub_criteria
@@ -524,6 +899,36 @@ class EnCriteria(_BeperkendCriteriumBase):
         for crit in self.sub_criteria:
             crit.check(row)
 
+    def evaluatie_kopie(self) -> "EnCriteria":
+        return self.model_copy(
+            update={
+                "sub_criteria": [crit.evaluatie_kopie() for crit in self.sub_criteria]
+            }
+        )
+
+    def evaluaties(self) -> Tuple[Optional[MaybeBoolean], ...]:
+        return tuple(
+            chain.from_iterable(crit.evaluaties() for crit in self.sub_criteria)
+        )
+
+    def compileer(self) -> CriteriumPlan:
+        assert len(self.sub_criteria) > 0, "EnCriteria zonder subcriteria"
+        return _samengesteld_plan(self.sub_criteria, _EN_TABEL, MaybeBoolean.TRUE)
+
+    def ingevuld(self, row: Dict, evaluaties: Iterator[MaybeBoolean]) -> "EnCriteria":
+        return self.model_copy(
+            update={
+                "sub_criteria": [
+                    crit.ingevuld(row, evaluaties) for crit in self.sub_criteria
+                ]
+            }
+        )
+
+    def benodigde_bronnen(self) -> MitsBron:
+        return reduce(
+            or_, (crit.benodigde_bronnen() for crit in self.sub_criteria), MitsBron(0)
+        )
+
     def is_criteria_type_present(self, type) -> bool:
         return any(
             crit.is_criteria_type_present(type) for crit in self.sub_criteria
@@ -585,6 +990,9 @@ BeperkendCriterium = Annotated[
 ]
 
 
+# Een keer aanmaken, het opbouwen van een TypeAdapter kost veel meer dan het parsen
+_BEPERKEND_CRITERIUM_ADAPTER = TypeAdapter(BeperkendCriterium)
+
+
 def criteria_from_json(json_str: str) -> BeperkendCriterium:
-    type_adapter = TypeAdapter(BeperkendCriterium)
-    return type_adapter.validate_json(json_str)
+    return _BEPERKEND_CRITERIUM_ADAPTER.validate_json(json_str)
@@ -1,14 +1,25 @@
-import copy
 import json
 import logging
-from functools import lru_cache
+import time
 from pathlib import Path
-from typing import Dict, List, Union
-
+from typing import (
+    Callable,
+    Dict,
+    Iterable,
+    List,
+    Optional,
+    Sequence,
+    Type,
+    TypeVar,
+    Union,
+)
+
+import numpy as np
 import pandas as pd
 
+from veg2hab.cache import load_or_build
 from veg2hab.criteria import BeperkendCriterium, OverrideCriterium, criteria_from_json
-from veg2hab.enums import Kwaliteit
+from veg2hab.enums import Kwaliteit, MatchLevel
 from veg2hab.habitat import HabitatVoorstel
 from veg2hab.io.common import Interface
 from veg2hab.mozaiek import MozaiekRegel, StandaardMozaiekregel, mozaiekregel_from_json
@@ -17,49 +28,120 @@ from veg2hab.vegtypeinfo import VegTypeInfo
 
 _LOGGER = logging.getLogger(__name__)
 
+T = TypeVar("T")
+
+
+def _parse_unieke_json(series: pd.Series, parse: Callable[[str], T]) -> pd.Series:
+    """
+    Parst iedere unieke json string in series maar een keer; rijen met dezelfde json
+    krijgen hetzelfde object. Lege waarden blijven leeg (NaN).
+    """
+    series = series[series.notnull()]
+    geparst = {json_str: parse(json_str) for json_str in series.unique()}
+    return pd.Series(
+        [geparst[json_str] for json_str in series], index=series.index, dtype=object
+    )
+
+
+class _CodeIndex:
+    """
+    Numerieke codering (zie codeer) van de SBB of VvN codes in een kolom van de
+    definitietabel, zodat de match levels van een of meer codes met alle rijen in
+    een keer met NumPy berekend worden, in plaats van met match_up_to per rij.
+    """
+
+    # Maximaal aantal elementen van de tussenresultaten in match_levels, zodat het
+    # geheugengebruik bij veel codes begrensd blijft
+    _MAX_ELEMENTEN = 4_000_000
+
+    def __init__(self, codes: pd.Series, cls: Type[Union[SBB, VvN]]):
+        self._cls = cls
+        self._codering = cls.codeer(
+            code if isinstance(code, cls) else None for code in codes
+        )
+
+    def match_levels(self, codes: Sequence[Union[SBB, VvN]]) -> np.ndarray:
+        """
+        De match levels van iedere code met iedere rij van de definitietabel, als
+        array van (len(codes), aantal rijen)
+        """
+        codering = self._cls.codeer(codes)
+        per_blok = max(1, self._MAX_ELEMENTEN // max(1, self._codering.size))
+        blokken = [
+            self._cls.match_levels(codering[begin : begin + per_blok], self._codering)
+            for begin in range(0, len(codering), per_blok)
+        ]
+        if len(blokken) == 0:
+            return np.zeros((0, len(self._codering)), dtype=np.int64)
+        return np.concatenate(blokken)
+
+    def kandidaten(self, code: Union[SBB, VvN]) -> List[int]:
+        """
+        Posities (in volgorde van de definitietabel) van de rijen die met code matchen
+        """
+        return np.flatnonzero(self.match_levels([code])[0]).tolist()
+
 
 class DefinitieTabel:
     def __init__(self, df: pd.DataFrame):
+        start = time.perf_counter()
+
         # Inladen
         self.df = df
 
         # Een field voor override dict omdat deze anders mee wordt
-        # genomen in de lru_cache van _find_habtypes_for_code
+        # genomen in de cache van _find_habtypes_for_code
         self.override_dict = {}
 
+        # Cache van _find_habtypes_for_code, per instance zodat deze met de
+        # definitietabel opgeruimd wordt (bv bij veg2hab serve/batch)
+        self._voorstellen_cache: Dict[Union[SBB, VvN, None], List[HabitatVoorstel]] = {}
+
         self.df.Kwaliteit = self.df.Kwaliteit.apply(Kwaliteit.from_letter)
-        self.df.SBB = self.df.SBB.apply(SBB.from_string)
-        self.df.VvN = self.df.VvN.apply(VvN.from_string)
+        self.df.SBB = SBB.from_series(self.df.SBB)
+        self.df.VvN = VvN.from_series(self.df.VvN)
 
         assert self.df.mitsjson.notnull().all()
 
-        # Mitsjson parsen
-        self.df["Criteria"] = (
-            self.df["mitsjson"]
-            .loc[self.df["mitsjson"].notnull()]
-            .apply(criteria_from_json)
+        # Mitsjson en mozaiekjson parsen; veel rijen hebben dezelfde json, die delen
+        # een geparst object (dat pas per vlak gekopieerd wordt, zie evaluatie_kopie)
+        self.df["Criteria"] = _parse_unieke_json(
+            self.df["mitsjson"], criteria_from_json
         )
-
-        # Mozaiekjson parsen
-        self.df["Mozaiekregel"] = (
-            self.df["mozaiekjson"]
-            .loc[self.df["mozaiekjson"].notnull()]
-            .apply(mozaiekregel_from_json)
+        self.df["Mozaiekregel"] = _parse_unieke_json(
+            self.df["mozaiekjson"], mozaiekregel_from_json
         )
-        # Aanmaken dict keys die gebruikt gaan worden om de mozaiekregels te checken\
 
-        for regel in self.df["Mozaiekregel"]:
+        # Kwalificerende vegtypen bepalen, een keer per (gedeelde) mozaiekregel en
+        # met een keer de rijen per habitattype
+        per_habtype = {}
+        for regel in {id(regel): regel for regel in self.df["Mozaiekregel"]}.values():
             if isinstance(regel, StandaardMozaiekregel) and regel.ook_mozaiekvegetaties:
-                regel.determine_kwalificerende_vegtypen(
-                    self.df[self.df.Habitattype == regel.kwalificerend_habtype]
-                )
+                habtype = regel.kwalificerend_habtype
+                if habtype not in per_habtype:
+                    per_habtype[habtype] = self.df[self.df.Habitattype == habtype]
+                regel.determine_kwalificerende_vegtypen(per_habtype[habtype])
+
+        self._index = {
+            "SBB": _CodeIndex(self.df.SBB, SBB),
+            "VvN": _CodeIndex(self.df.VvN, VvN),
+        }
+
+        _LOGGER.info(
+            f"Definitietabel ({len(self.df)} rijen) opgebouwd in {time.perf_counter() - start:.2f}s"
+        )
 
     @classmethod
     def from_excel(cls, path: Path) -> "DefinitieTabel":
         """
         Maakt een DefinitieTabel object van een excel file.
         Deze method is bedoeld om om te gaan met de opgeschoonde definitietabel uit opschonen_definitietabel().
+        Het geparste resultaat wordt lokaal gecached, zie veg2hab.cache.load_or_build.
         """
+        return load_or_build("definitietabel", path, lambda: cls._from_excel(path))
+
+    @classmethod
+    def _from_excel(cls, path: Path) -> "DefinitieTabel":
         df = pd.read_excel(
             path,
             engine="openpyxl",
@@ -86,6 +168,7 @@ class DefinitieTabel:
         Voor de zekerheid wordt ook de cache gecleared
 
         Dit is een aparte method/field omdat de override_dict dan niet in de cache van _find_habtypes_for_code komt
+        De override geometrieen worden hier een keer geparst (zie OverrideCriterium.override_index)
         """
         assert isinstance(override_dict, dict), "override_dict moet een dict zijn"
         assert all(
@@ -94,20 +177,94 @@ class DefinitieTabel:
         assert all(
             isinstance(value, OverrideCriterium) for value in override_dict.values()
         ), "Values van override_dict moeten OverrideCriteriums zijn"
+        for crit in override_dict.values():
+            if crit.override_geometry is not None:
+                crit.override_index()
         self.override_dict = override_dict
-        self._find_habtypes_for_code.cache_clear()
+        self._voorstellen_cache.clear()
+
+    def voorstellen_per_code(
+        self, codes: Iterable[Union[SBB, VvN, None]]
+    ) -> Dict[Union[SBB, VvN, None], List[HabitatVoorstel]]:
+        """
+        Zoekt in een keer de habitattype voorstellen op voor alle verschillende codes
+        (bv die van een hele kartering), met een enkele selectie van alle matchende
+        rijen uit de definitietabel.
 
-    def find_habtypes(self, info: VegTypeInfo) -> List[HabitatVoorstel]:
+        Dit zijn templates, die met find_habtypes per VegTypeInfo gekopieerd worden;
+        het aantal opzoekingen hangt zo af van het aantal verschillende codes, niet van
+        het aantal vlakken.
+        """
+        per_code = {code: [] for code in set(codes)}
+
+        # Alle (code, rij, match level) combinaties die matchen, per code kolom
+        paren = []
+        for column, cls in [("SBB", SBB), ("VvN", VvN)]:
+            kolom_codes = [code for code in per_code if isinstance(code, cls)]
+            levels = self._index[column].match_levels(kolom_codes)
+            for i, positie in zip(*np.nonzero(levels)):
+                paren.append((kolom_codes[i], positie, MatchLevel(levels[i, positie])))
+        rijen = self.df.iloc[[positie for _, positie, _ in paren]]
+
+        for (code, _, match_level), row in zip(paren, rijen.itertuples(index=False)):
+            vegtype_in_dt = row.SBB if isinstance(row.SBB, SBB) else row.VvN
+            assert isinstance(vegtype_in_dt, (SBB, VvN))
+
+            if row.mits in self.override_dict.keys():
+                mits = self.override_dict[row.mits]
+            else:
+                mits = row.Criteria
+
+            per_code[code].append(
+                HabitatVoorstel(
+                    onderbouwend_vegtype=code,
+                    vegtype_in_dt=vegtype_in_dt,
+                    habtype=row.Habitattype,
+                    kwaliteit=row.Kwaliteit,
+                    mits=mits,
+                    mozaiek=row.Mozaiekregel,
+                    match_level=match_level,
+                    vegtype_in_dt_naam=row.Vegtype_naam,
+                    habtype_naam=row.Habitattype_naam,
+                )
+            )
+
+        for code, voorstellen in per_code.items():
+            if code is not None and len(voorstellen) == 0:
+                column = "VvN" if isinstance(code, VvN) else "SBB"
+                _LOGGER.debug(
+                    f"Geen matchende habitattype gevonden voor {column}: {code}"
+                )
+
+        return per_code
+
+    def find_habtypes(
+        self,
+        info: VegTypeInfo,
+        voorstellen_per_code: Optional[
+            Dict[Union[SBB, VvN], List[HabitatVoorstel]]
+        ] = None,
+    ) -> List[HabitatVoorstel]:
         """
         Maakt een lijst met habitattype voorstellen voor een gegeven vegtypeinfo
+        Als voorstellen_per_code (van voorstellen_per_code) gegeven is, worden de
+        voorstellen daaruit gehaald in plaats van opgezocht.
         """
         voorstellen = []
 
         for code in info.VvN + info.SBB:
             # We voegen het percentage en VegTypeInfo los to zodat _find_habtypes_for_code gecached kan worden
-            # We moeten een deepcopy maken anders passen we denk ik via referentie de percentages aan in de cache
-            voorstel = copy.deepcopy(self._find_habtypes_for_code(code))
-            voorstellen += voorstel
+            # De mits en mozaiekregel worden gedeeld met de gecachte voorstellen, die worden
+            # pas gekopieerd als ze voor een vlak gecheckt worden (zie evaluatie_kopie)
+            templates = (
+                voorstellen_per_code[code]
+                if voorstellen_per_code is not None
+                else self._find_habtypes_for_code(code)
+            )
+            for template in templates:
+                voorstel = template.model_copy()
+                voorstel._template = template
+                voorstellen.append(voorstel)
 
         if len(voorstellen) == 0:
             niet_geautomatiseerde_sbb = (
@@ -120,50 +277,17 @@ class DefinitieTabel:
 
         return voorstellen
 
-    @lru_cache(maxsize=256)
     def _find_habtypes_for_code(
         self, code: Union[SBB, VvN, None]
     ) -> List[HabitatVoorstel]:
         """
         Maakt een lijst met habitattype voorstellen voor een gegeven code
-        Wordt gecached om snelheid te verhogen
+        Wordt gecached om snelheid te verhogen; het aantal verschillende codes is
+        hooguit enkele duizenden
         """
-        if code is None:
-            return []
-
-        voorstellen = []
-        column = "VvN" if isinstance(code, VvN) else "SBB"
-        match_levels = self.df[column].apply(code.match_up_to)
-        max_level = match_levels.max()
-        if max_level == 0:
-            _LOGGER.debug(f"Geen matchende habitattype gevonden voor {column}: {code}")
-            return []
-
-        match_rows = self.df[match_levels > 0]
-        for idx, row in match_rows.iterrows():
-            vegtype_in_dt = row["SBB"] if isinstance(row["SBB"], SBB) else row["VvN"]
-            assert isinstance(vegtype_in_dt, (SBB, VvN))
-
-            if row.mits in self.override_dict.keys():
-                mits = self.override_dict[row.mits]
-            else:
-                mits = row.Criteria
-
-            voorstellen.append(
-                HabitatVoorstel(
-                    onderbouwend_vegtype=code,
-                    vegtype_in_dt=vegtype_in_dt,
-                    habtype=row["Habitattype"],
-                    kwaliteit=row["Kwaliteit"],
-                    mits=mits,
-                    mozaiek=row["Mozaiekregel"],
-                    match_level=match_levels[idx],
-                    vegtype_in_dt_naam=row["Vegtype_naam"],
-                    habtype_naam=row["Habitattype_naam"],
-                )
-            )
-
-        return voorstellen
+        if code not in self._voorstellen_cache:
+            self._voorstellen_cache[code] = self.voorstellen_per_code([code])[code]
+        return self._voorstellen_cache[code]
 
 
 def opschonen_definitietabel(
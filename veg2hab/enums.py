@@ -1,5 +1,5 @@
 from dataclasses import dataclass
-from enum import Enum, IntEnum, auto
+from enum import Enum, IntEnum, IntFlag, auto
 from typing import List, NamedTuple, Tuple, Union
 
 from pydantic import BaseModel, Field
@@ -71,6 +71,19 @@ class FuncSamenhangID(NamedTuple):
     indices: Tuple[int, ...]
 
 
+class MitsBron(IntFlag):
+    """
+    De informatie die nodig is om een beperkend criterium te checken, als bitmask
+    """
+
+    FGR = auto()
+    BODEM = auto()
+    LBK = auto()
+    OBK = auto()
+    # De geometrie van het vlak zelf (voor OverrideCriterium met override_geometry)
+    GEOMETRIE = auto()
+
+
 class MaybeBoolean(Enum):
     FALSE = 1
 
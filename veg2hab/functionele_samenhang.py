@@ -1,11 +1,15 @@
 import pickle
-from typing import List, Set, Tuple
+from collections import defaultdict
+from typing import Dict, List, Optional, Set, Tuple
 
 import geopandas as gpd
 import pandas as pd
 
+from veg2hab.complexdelen import complexdelen_tabel
 from veg2hab.enums import FuncSamenhangID, KeuzeStatus, Kwaliteit
 from veg2hab.io.common import Interface
+from veg2hab.profiel import meet
+from veg2hab.tegels import per_tegel
 
 
 class UnionFind:
@@ -135,80 +139,137 @@ def _cluster_vlakken(gdf: gpd.GeoDataFrame) -> List[List[FuncSamenhangID]]:
     return clusters
 
 
-def _extract_elmid_perc_habtype(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+def _overlappende_paren(
+    kern: gpd.GeoDataFrame,
+    context: gpd.GeoDataFrame,
+    distance_tuples: List[Tuple[float, float]],
+) -> Set[Tuple[FuncSamenhangID, FuncSamenhangID]]:
     """
-    Trekt uit de vegkartering gdf de benodigde informatie voor het bepalen van clusters
-    Ieder complexdeel/HabitatKeuze krijgt een eigen rij in de output, met de identifier (ElmID, complex-deel-index)
-    Als er meerdere complexdelen met hetzelfde habtype in een vlak zitten, worden deze samengevoegd
+    Bepaalt net als _cluster_vlakken de overlap-paren na het bufferen, maar dan tussen de vlakken
+    in kern en die in context, en voor alle habitattypen tegelijk (paren hebben altijd hetzelfde habtype)
     """
+    intersection_pairs = set()
+    for min_perc, buffer_distance in distance_tuples:
+        kern_subset = kern[kern.percentage >= min_perc].copy()
+        kern_subset["geometry"] = kern_subset.buffer(buffer_distance)
+        context_subset = context[context.percentage >= min_perc].copy()
+        context_subset["geometry"] = context_subset.buffer(buffer_distance)
 
-    def apply_func(row: pd.Series, vegetatiekundig_identiek: dict) -> pd.DataFrame:
-        # identifier (Elmid, [cmplxdeel_n]) | percentage | habitattype | geometry
-        identifier = []
-        percentage = []
-        habtype = []
-        geometry = []
-        for idx, keuze in enumerate(row["HabitatKeuze"]):
-            # Dit stelt ons in staat weer terug te gaan naar de originele habitatkeuze
-            identifier.append(FuncSamenhangID(row["ElmID"], (idx,)))
-            # Nodig voor het bepalen van de buffergrootte
-            percentage.append(row.VegTypeInfo[idx].percentage)
-            # We clusteren binnen ieder habtype
-            habtype.append(
-                keuze.habtype
-                if keuze.habtype not in vegetatiekundig_identiek.keys()
-                else vegetatiekundig_identiek[keuze.habtype]
+        overlaps = gpd.sjoin(
+            kern_subset, context_subset, how="inner", predicate="intersects"
+        )
+        overlaps = overlaps[overlaps["habtype_left"] == overlaps["habtype_right"]]
+        intersection_pairs.update(
+            zip(
+                overlaps["identifier_left"].tolist(),
+                overlaps["identifier_right"].tolist(),
             )
-            # We kunnen niet clusteren zonder geometrie
-            geometry.append(row.geometry)
-
-        gdf = gpd.GeoDataFrame(
-            {
-                "identifier": identifier,
-                "percentage": percentage,
-                "habtype": habtype,
-                "geometry": geometry,
-            }
         )
 
-        # Checken op meerdere complexdelen met hetzelfde habtype binnen het huidige vlak
-        if len(set(habtype)) != len(habtype):
-            non_unique_habtypes = set(
-                habtype[i] for i in range(len(habtype)) if habtype.count(habtype[i]) > 1
-            )
-            # We vervangen alle rijen met hetzelfde habtype door 1 rij met gecombineerde identifier
-            # en de som van de percentages
-            for type in non_unique_habtypes:
-                all_rows_of_type = gdf[gdf.habtype == type].copy()
-                identifiers = all_rows_of_type["identifier"].tolist()
-                new_row = gpd.GeoDataFrame(
-                    {
-                        "identifier": [
-                            (
-                                identifiers[0].ElmID,
-                                tuple(
-                                    identifier.indices[0] for identifier in identifiers
-                                ),
-                            )
-                        ],
-                        "percentage": [sum(all_rows_of_type.percentage)],
-                        "habtype": [type],
-                        "geometry": [all_rows_of_type.geometry.iloc[0]],
-                    }
-                )
-                gdf = gdf[gdf.habtype != type]
-                gdf = pd.concat([gdf, new_row], ignore_index=True)
+    return intersection_pairs
+
 
-        return gdf
+def _cluster_vlakken_per_tegel(
+    gdf: gpd.GeoDataFrame, tegel_grootte: float, processen: Optional[int]
+) -> Dict[str, List[List[FuncSamenhangID]]]:
+    """
+    Geeft hetzelfde resultaat als _cluster_vlakken voor ieder habtype in gdf, maar bepaalt de
+    overlap-paren per ruimtelijke tegel. De halo van de tegels is twee keer de grootste bufferafstand,
+    zodat alle vlakken waarmee een vlak na bufferen kan overlappen in de halo zitten.
+    De paren van alle tegels worden daarna samen geclusterd, zodat clusters over tegelgrenzen heen gaan.
+    """
+    distance_tuples = (
+        Interface.get_instance().get_config().functionele_samenhang_buffer_distances
+    )
+    halo = 2 * max(buffer_distance for _, buffer_distance in distance_tuples)
 
+    intersection_pairs = set()
+    for paren in per_tegel(
+        _overlappende_paren,
+        gdf,
+        gdf,
+        tegel_grootte,
+        halo,
+        distance_tuples,
+        processen=processen,
+    ):
+        intersection_pairs.update(paren)
+
+    # Sorteren zodat de clusters niet afhangen van de volgorde van de tegels
+    clusters = UnionFind.cluster_pairs(sorted(intersection_pairs))
+
+    # Net als in _cluster_vlakken komen vlakken onder het laagste percentage als individuen in de clusters
+    lowest_perc = min(distance_tuples, key=lambda x: x[0])[0]
+    unclusterables = gdf[gdf.percentage < lowest_perc]
+    clusters.extend(
+        [[identifier] for identifier in unclusterables["identifier"].tolist()]
+    )
+
+    habtype_lookup = dict(zip(gdf["identifier"], gdf["habtype"]))
+    clusters_per_habtype = defaultdict(list)
+    for cluster in clusters:
+        clusters_per_habtype[habtype_lookup[cluster[0]]].append(cluster)
+
+    return clusters_per_habtype
+
+
+def _extract_elmid_perc_habtype(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
+    """
+    Trekt uit de vegkartering gdf de benodigde informatie voor het bepalen van clusters
+    Ieder complexdeel/HabitatKeuze krijgt een eigen rij in de output, met de identifier (ElmID, complex-deel-index)
+    Als er meerdere complexdelen met hetzelfde habtype in een vlak zitten, worden deze samengevoegd
+    """
     vegetatiekundig_identiek = (
         Interface.get_instance()
         .get_config()
         .functionele_samenhang_vegetatiekundig_identiek
     )
-    extracted = gdf.apply(apply_func, axis=1, args=(vegetatiekundig_identiek,))
-    extracted = pd.concat(extracted.to_list(), ignore_index=True)
-    return extracted
+
+    # identifier (Elmid, [cmplxdeel_n]) | percentage | habitattype | geometry
+    lang = complexdelen_tabel(gdf, ["VegTypeInfo", "HabitatKeuze"])
+    # We clusteren binnen ieder habtype
+    lang["habtype"] = [
+        vegetatiekundig_identiek.get(habtype, habtype) for habtype in lang["habtype"]
+    ]
+
+    # Meerdere complexdelen met hetzelfde habtype binnen een vlak worden 1 rij met
+    # gecombineerde identifier en de som van de percentages, na de andere complexdelen
+    aantal = lang.groupby(["vlak", "habtype"])["complexdeel"].transform("size")
+    los = lang[aantal == 1]
+    samengevoegd = (
+        lang[aantal > 1]
+        .groupby(["vlak", "habtype"], sort=False)
+        .agg(
+            ElmID=("ElmID", "first"),
+            complexdeel=("complexdeel", tuple),
+            percentage=("percentage", lambda p: sum(p.tolist())),
+        )
+        .reset_index()
+    )
+    extracted = pd.concat(
+        [
+            los.assign(complexdeel=[(deel,) for deel in los["complexdeel"]]),
+            samengevoegd,
+        ],
+        ignore_index=True,
+    ).sort_values("vlak", kind="stable", ignore_index=True)
+
+    return gpd.GeoDataFrame(
+        {
+            # Dit stelt ons in staat weer terug te gaan naar de originele habitatkeuze
+            "identifier": [
+                FuncSamenhangID(ElmID, complexdelen)
+                for ElmID, complexdelen in zip(
+                    extracted["ElmID"], extracted["complexdeel"]
+                )
+            ],
+            # Nodig voor het bepalen van de buffergrootte
+            "percentage": extracted["percentage"].astype(float),
+            "habtype": extracted["habtype"],
+            # We kunnen niet clusteren zonder geometrie
+            "geometry": gdf.geometry.to_numpy()[extracted["vlak"].to_numpy()],
+        }
+    )
 
 
 def _remove_habtypen_due_to_minimum_oppervlak(
@@ -303,25 +364,42 @@ def apply_functionele_samenhang(gdf: gpd.GeoDataFrame) -> gpd.GeoDataFrame:
     )
 
     # Extracten van ElmID + complex-deel-index, percentage en habitattype
-    extracted = _extract_elmid_perc_habtype(gdf)
+    with meet("extract_elmid_perc_habtype"):
+        extracted = _extract_elmid_perc_habtype(gdf)
 
     # Niet heel netjes maar nu is de originele gdf 100% zeker niet aangepast
     edited_gdf = pickle.loads(pickle.dumps(gdf))
+
+    config = Interface.get_instance().get_config()
+    if config.tegel_grootte is not None:
+        with meet("clusters_per_tegel"):
+            clusters_per_habtype = _cluster_vlakken_per_tegel(
+                extracted[~extracted.habtype.isin(["H0000", "HXXXX"])],
+                config.tegel_grootte,
+                config.tegel_processen,
+            )
+
     all_present_habtypen = extracted["habtype"].unique()
     for habtype in all_present_habtypen:
         if habtype in ["H0000", "HXXXX"]:
             # Deze hoeven we niks mee
             continue
-        habtype_vlakken = extracted[extracted.habtype == habtype]
-        clusters = _cluster_vlakken(habtype_vlakken)
-        assert len(habtype_vlakken) == sum(
-            len(cluster) for cluster in clusters
-        ), "Clusters bevatten niet alle vlakken of dubbele vlakken"
-        for cluster in clusters:
-            extracted_subset = extracted[extracted.identifier.isin(cluster)]
-            areas = extracted_subset.area * (extracted_subset.percentage / 100)
-            if areas.sum() > min_opp_lookup_func(habtype):
-                continue
-            edited_gdf = _remove_habtypen_due_to_minimum_oppervlak(edited_gdf, cluster)
+        with meet(f"clusters_{habtype}"):
+            habtype_vlakken = extracted[extracted.habtype == habtype]
+            if config.tegel_grootte is None:
+                clusters = _cluster_vlakken(habtype_vlakken)
+            else:
+                clusters = clusters_per_habtype[habtype]
+            assert len(habtype_vlakken) == sum(
+                len(cluster) for cluster in clusters
+            ), "Clusters bevatten niet alle vlakken of dubbele vlakken"
+            for cluster in clusters:
+                extracted_subset = extracted[extracted.identifier.isin(cluster)]
+                areas = extracted_subset.area * (extracted_subset.percentage / 100)
+                if areas.sum() > min_opp_lookup_func(habtype):
+                    continue
+                edited_gdf = _remove_habtypen_due_to_minimum_oppervlak(
+                    edited_gdf, cluster
+                )
 
     return edited_gdf
@@ -1,6 +1,7 @@
 import json
+import logging
 from collections import defaultdict
-from typing import List, Tuple, Union
+from typing import Dict, List, Optional, Tuple, Union
 
 import pandas as pd
 from pydantic import BaseModel, field_validator, model_validator
@@ -27,6 +28,19 @@ class HabitatVoorstel(BaseModel, extra="forbid", validate_assignment=True):
     vegtype_in_dt_naam: str = ""
     habtype_naam: str = ""
 
+    # Het voorstel uit de definitietabel waar dit voorstel een kopie van is (zie
+    # DefinitieTabel.find_habtypes), voor HabitatKeuzeMemo. Een slot in plaats van
+    # een private attribute, zodat het niet meetelt bij == en niet meegekopieerd of
+    # gepickeld wordt; lees het met template().
+    __slots__ = ("_template",)
+
+    def template(self) -> Optional["HabitatVoorstel"]:
+        return getattr(self, "_template", None)
+
+    @field_validator("onderbouwend_vegtype", "vegtype_in_dt")
+    def intern_vegtype(cls, v):
+        return v.intern() if v is not None else v
+
     @classmethod
     def H0000_vegtype_not_in_dt(cls, info: "VegTypeInfo"):
         return cls(
@@ -465,6 +479,86 @@ def try_to_determine_habkeuze(
     )
 
 
+class HabitatKeuzeMemo:
+    """
+    Onthoudt de uitkomsten van try_to_determine_habkeuze, voor complexdelen met
+    dezelfde voorstellen uit de definitietabel en dezelfde evaluaties van hun mitsen
+    en mozaiekregels (wat in een kartering heel vaak voorkomt).
+
+    De uitkomst hangt alleen af van die templates en evaluaties (de info teksten
+    bevatten alleen de mits/mozaiekregel en de evaluaties), dus iedere volgende keer
+    is een kopie van de eerste keuze genoeg, met de eigen voorstellen erin.
+    Voorstellen die geen kopie van een definitietabel voorstel zijn (bv ingelezen
+    uit een bestand of checkpoint, of H0000 voorstellen) worden altijd bepaald.
+    """
+
+    def __init__(self):
+        # Per sleutel de keuze, de posities van zijn voorstellen in de voorstellen,
+        # en de templates (zodat de id's in de sleutels uniek blijven)
+        self._keuzes: Dict[
+            tuple, Tuple[HabitatKeuze, List[int], List[HabitatVoorstel]]
+        ] = {}
+        self.hits = 0
+        self.misses = 0
+        self.niet_memoiseerbaar = 0
+
+    @staticmethod
+    def _sleutel(voorstellen: List[HabitatVoorstel]) -> Optional[tuple]:
+        sleutel = []
+        for voorstel in voorstellen:
+            template = voorstel.template()
+            if template is None:
+                return None
+            sleutel.append(
+                (
+                    id(template),
+                    voorstel.mits.evaluaties(),
+                    voorstel.mozaiek.evaluation,
+                )
+            )
+        return tuple(sleutel)
+
+    def try_to_determine_habkeuze(
+        self, voorstellen: List[HabitatVoorstel]
+    ) -> Union[HabitatKeuze, None]:
+        """
+        Als try_to_determine_habkeuze, maar uit het geheugen als het kan
+        """
+        sleutel = self._sleutel(voorstellen)
+        if sleutel is None:
+            self.niet_memoiseerbaar += 1
+            return try_to_determine_habkeuze(voorstellen)
+
+        if sleutel in self._keuzes:
+            self.hits += 1
+            keuze, posities, _ = self._keuzes[sleutel]
+            return keuze.model_copy(
+                update={"habitatvoorstellen": [voorstellen[i] for i in posities]}
+            )
+
+        self.misses += 1
+        keuze = try_to_determine_habkeuze(voorstellen)
+        posities = [
+            next(i for i, voorstel in enumerate(voorstellen) if voorstel is gekozen)
+            for gekozen in keuze.habitatvoorstellen
+        ]
+        templates = [voorstel.template() for voorstel in voorstellen]
+        self._keuzes[sleutel] = (keuze.model_copy(), posities, templates)
+        return keuze
+
+    @property
+    def hit_rate(self) -> float:
+        totaal = self.hits + self.misses + self.niet_memoiseerbaar
+        return self.hits / totaal if totaal > 0 else 0.0
+
+    def log_statistieken(self, stap: str) -> None:
+        logging.info(
+            f"{stap}: {self.hits} van de {self.hits + self.misses + self.niet_memoiseerbaar} "
+            f"habitatkeuzes uit het geheugen ({self.hit_rate:.0%}), "
+            f"{len(self._keuzes)} verschillende, {self.niet_memoiseerbaar} niet te onthouden"
+        )
+
+
 def calc_nr_of_unresolved_habitatkeuzes_per_row(gdf):
     """
     Telt het aantal nog niet gemaakte habitatkeuzes. Dit zijn None habkeuzes en
@@ -5,9 +5,8 @@ import string
 import tempfile
 import time
 from pathlib import Path
-from typing import List, Optional
+from typing import TYPE_CHECKING, List, Optional
 
-import geopandas as gpd
 from typing_extensions import Self, override
 
 from .. import enums
@@ -22,6 +21,9 @@ from .common import (
     StackVegKarteringInputs,
 )
 
+if TYPE_CHECKING:
+    import geopandas as gpd
+
 MAX_N_OVERRIDE = 50  # NOTE: we this results in max 49 overrides, since we start at 1
 
 
@@ -66,7 +68,7 @@ class ArcGISInterface(Interface):
 
     @override
     def output_shapefile(
-        self, shapefile_id: Optional[Path], gdf: gpd.GeoDataFrame
+        self, shapefile_id: Optional[Path], gdf: "gpd.GeoDataFrame"
     ) -> None:
         import arcpy
 
@@ -2,15 +2,12 @@ import logging
 from datetime import datetime, timezone
 from functools import wraps
 from pathlib import Path
-from typing import Callable, Dict, Optional
+from typing import TYPE_CHECKING, Callable, Dict, Optional
 
 import click
-from geopandas.geodataframe import GeoDataFrame
 from pydantic import validator
 from typing_extensions import override
 
-from veg2hab.criteria import OverrideCriterium
-
 from .. import enums
 from .common import (
     AccessDBInputs,
@@ -18,18 +15,29 @@ from .common import (
     ApplyFunctioneleSamenhangInputs,
     ApplyMozaiekInputs,
     Interface,
+    PipelineAccessDBInputs,
+    PipelineShapefileInputs,
     ShapefileInputs,
     StackVegKarteringInputs,
 )
 
+if TYPE_CHECKING:
+    from geopandas import GeoDataFrame
+
+
+def default_output_path() -> Path:
+    return Path(
+        f"./kaart_{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H-%M-%S')}.gpkg"
+    )
+
 
 class CLIInterface(Interface):
     @override
-    def output_shapefile(self, shapefile_id: Optional[Path], gdf: GeoDataFrame) -> None:
+    def output_shapefile(
+        self, shapefile_id: Optional[Path], gdf: "GeoDataFrame"
+    ) -> None:
         if shapefile_id is None:
-            shapefile_id = Path(
-                f"./kaart_{datetime.now(timezone.utc).strftime('%Y-%m-%dT%H-%M-%S')}.gpkg"
-            )
+            shapefile_id = default_output_path()
         gdf.to_file(shapefile_id, driver="GPKG", layer="main")
 
     @override
@@ -124,3 +132,11 @@ class CLIApplyMozaiekInputs(ApplyMozaiekInputs, CLIMixin):
 
 class CLIApplyFunctioneleSamenhangInputs(ApplyFunctioneleSamenhangInputs, CLIMixin):
     pass
+
+
+class CLIPipelineAccessDBInputs(PipelineAccessDBInputs, CLIMixin):
+    pass
+
+
+class CLIPipelineShapefileInputs(PipelineShapefileInputs, CLIMixin):
+    pass
@@ -1,18 +1,35 @@
 import json
+import os
 from abc import ABCMeta, abstractmethod
+from contextlib import contextmanager
 from pathlib import Path
-from typing import ClassVar, Dict, List, NamedTuple, Optional, Tuple, Union
+from typing import (
+    TYPE_CHECKING,
+    ClassVar,
+    Dict,
+    Iterator,
+    List,
+    NamedTuple,
+    Optional,
+    Tuple,
+    Union,
+)
 
-import geopandas as gpd
 from pydantic import BaseModel as _BaseModel
 from pydantic import Field, field_validator, validator
 from pydantic_settings import BaseSettings
 from typing_extensions import List, Literal
 
 from veg2hab import enums
-from veg2hab.criteria import OverrideCriterium
 from veg2hab.enums import MaybeBoolean, WelkeTypologie
 
+# NOTE: geopandas en de criteria (en daarmee pandas) worden pas ingeladen als ze nodig zijn,
+#       zodat de CLI en de ArcGIS toolbox snel opstarten (zie tests/test_opstarttijd.py)
+if TYPE_CHECKING:
+    import geopandas as gpd
+
+    from veg2hab.criteria import OverrideCriterium
+
 
 class BaseModel(_BaseModel, extra="forbid"):
     pass
@@ -174,13 +191,17 @@ class OverrideCriteriumIO(BaseModel):
         return mapping[value]
 
     @staticmethod
-    def _read_overrride_geometry(value: Optional[str]) -> Optional[gpd.GeoSeries]:
+    def _read_overrride_geometry(value: Optional[str]) -> Optional["gpd.GeoSeries"]:
+        import geopandas as gpd
+
         if value is None:
             return None
         p = Interface.get_instance().shape_id_to_filename(value)
         return gpd.read_file(p).geometry
 
-    def to_override_criterium(self) -> OverrideCriterium:
+    def to_override_criterium(self) -> "OverrideCriterium":
+        from veg2hab.criteria import OverrideCriterium
+
         if (self.override_geometry is None) != (self.truth_value_outside is None):
             raise ValueError(
                 "Zowel 'Geometrie' als 'Mits uitkomst buiten geometrie' moeten beide gezet zijn of beide niet"
@@ -198,6 +219,19 @@ class OverrideCriteriumIO(BaseModel):
         )
 
 
+def _as_override_dict(
+    override_dict: List[OverrideCriteriumIO],
+) -> Dict[str, "OverrideCriterium"]:
+    crits = [c.to_override_criterium() for c in override_dict]
+
+    if len(crits) != len(set(c.mits for c in crits)):
+        raise ValueError(
+            "Mitsen moeten uniek zijn. Elke mits mag maar 1 keer overschreven worden."
+        )
+
+    return {c.mits: c for c in crits}
+
+
 class ApplyDefTabelInputs(BaseModel):
     label: ClassVar[str] = "3_definitietabel_en_mitsen"
     description: ClassVar[str] = "Pas de definitie tabel toe en check de mitsen"
@@ -214,15 +248,8 @@ class ApplyDefTabelInputs(BaseModel):
         description="Lijst met de mitsen en de OverrideCriteria door welke ze moeten worden vervangen",
     )
 
-    def as_override_dict(self) -> Dict[str, OverrideCriterium]:
-        crits = [c.to_override_criterium() for c in self.override_dict]
-
-        if len(crits) != len(set(c.mits for c in crits)):
-            raise ValueError(
-                "Mitsen moeten uniek zijn. Elke mits mag maar 1 keer overschreven worden."
-            )
-
-        return {c.mits: c for c in crits}
+    def as_override_dict(self) -> Dict[str, "OverrideCriterium"]:
+        return _as_override_dict(self.override_dict)
 
 
 class ApplyMozaiekInputs(BaseModel):
@@ -253,7 +280,100 @@ class ApplyFunctioneleSamenhangInputs(BaseModel):
     )
 
 
-class Veg2HabConfig(BaseSettings, env_prefix="VEG2HAB_"):
+class _PipelineInputs(BaseModel):
+    """
+    Extra parameters voor het in een keer doorlopen van stap 1, 3, 4 en 5,
+    waarbij de kartering tussen de stappen in het geheugen blijft
+    """
+
+    override_dict: List[OverrideCriteriumIO] = Field(
+        default_factory=list,
+        description="Lijst met de mitsen en de OverrideCriteria door welke ze moeten worden vervangen",
+    )
+    tussenresultaten: Optional[Path] = Field(
+        default=None,
+        description="Map waarin de tussenresultaten van stap 1, 3 en 4 worden weggeschreven (optioneel), indien niet gegeven worden er geen tussenresultaten weggeschreven",
+    )
+
+    def as_override_dict(self) -> Dict[str, "OverrideCriterium"]:
+        return _as_override_dict(self.override_dict)
+
+
+class PipelineAccessDBInputs(AccessDBInputs, _PipelineInputs):
+    description: ClassVar[str] = (
+        "Doorloop alle stappen o.b.v. de digitale standaard, de output is de definitieve habitatkaart"
+    )
+
+
+class PipelineShapefileInputs(ShapefileInputs, _PipelineInputs):
+    description: ClassVar[str] = (
+        "Doorloop alle stappen o.b.v. een vector bestand, de output is de definitieve habitatkaart"
+    )
+
+
+# Velden van de input parameters die een bestandslocatie bevatten
+_PAD_VELDEN = ("shapefile", "access_mdb_path", "output", "tussenresultaten")
+
+
+def paden_absoluut_maken(params: Dict, basis: Path) -> Dict:
+    """
+    Maakt de bestandslocaties in een dict met (json) input parameters absoluut ten
+    opzichte van basis, zodat de parameters vanuit een andere working directory
+    gebruikt kunnen worden (veg2hab server, batch manifest).
+    """
+
+    def absoluut(value):
+        if value is None or value == "":
+            return value
+        if isinstance(value, list):
+            return [absoluut(v) for v in value]
+        return str((basis / Path(value)).resolve())
+
+    params = dict(params)
+    for veld in _PAD_VELDEN:
+        if veld in params:
+            params[veld] = absoluut(params[veld])
+    if "override_dict" in params:
+        params["override_dict"] = [
+            {**crit, "override_geometry": absoluut(crit.get("override_geometry"))}
+            for crit in params["override_dict"]
+        ]
+    return params
+
+
+class Veg2HabConfig(BaseSettings, env_prefix="VEG2HAB_", frozen=True):
+    referentie_cache: bool = Field(
+        default=True,
+        description="Bewaar de geparste waswordtlijst en definitietabel, en een getegelde versie van de LBK en bodemkaart, in een lokale cache, zodat deze niet bij iedere stap opnieuw geparst of doorzocht hoeven te worden",
+    )
+
+    profiel: bool = Field(
+        default=False,
+        description="Schrijf per (sub)stap de wandtijd, cpu tijd en het piek geheugengebruik weg naast de output",
+    )
+
+    checkpoints: bool = Field(
+        default=False,
+        description="Bewaar het resultaat van iedere stap bij het in een keer doorlopen van alle stappen, zodat een volgende run met dezelfde input en instellingen verder kan vanaf de eerste stap die veranderd is",
+    )
+    checkpoints_map: Optional[Path] = Field(
+        default=None,
+        description="Map waarin de checkpoints worden bewaard, standaard in de data map van veg2hab",
+    )
+    checkpoints_max_mb: float = Field(
+        default=5000,
+        description="Maximale grootte van alle checkpoints samen in MB; de minst recent gebruikte checkpoints worden als eerste opgeruimd",
+    )
+
+    tegel_grootte: Optional[float] = Field(
+        default=None,
+        description="Grootte in meters van de tegels waarin de kartering wordt opgedeeld voor de mozaiekregels en functionele samenhang. Standaard wordt de kartering niet opgedeeld",
+    )
+    tegel_processen: Optional[int] = Field(
+        default=None,
+        description="Aantal processen waarover de tegels worden verdeeld, standaard het aantal beschikbare cpu's",
+    )
+
     combineer_karteringen_weglaten_threshold: float = Field(
         default=0.0001,
         description="Threshold in m^2 voor het weglaten van vlakken na het combineren van karteringen",
@@ -359,11 +479,27 @@ class Veg2HabConfig(BaseSettings, env_prefix="VEG2HAB_"):
         )
 
 
+def _lees_config_environment() -> Tuple[Tuple[str, str], ...]:
+    """
+    De environment variables waar Veg2HabConfig uit wordt opgebouwd
+    (pydantic-settings kijkt hoofdletterongevoelig naar de prefix)
+    """
+    return tuple(
+        sorted((k, os.environ[k]) for k in os.environ if k[:8].upper() == "VEG2HAB_")
+    )
+
+
 class Interface(metaclass=ABCMeta):
     """Singleton class that defines the interface for the different UI systems."""
 
     _instance = None
 
+    # Het opbouwen van Veg2HabConfig (environment variables parsen en valideren) is
+    # duur, en de config wordt per vegetatietype en mozaiekregel opgevraagd
+    _config: Optional[Veg2HabConfig] = None
+    _config_environment: Optional[Tuple[Tuple[str, str], ...]] = None
+    _vaste_config: Optional[Veg2HabConfig] = None
+
     # make the constructor private
     def __new__(cls):
         raise TypeError(
@@ -382,7 +518,7 @@ class Interface(metaclass=ABCMeta):
 
     @abstractmethod
     def output_shapefile(
-        self, shapefile_id: Optional[Path], gdf: gpd.GeoDataFrame
+        self, shapefile_id: Optional[Path], gdf: "gpd.GeoDataFrame"
     ) -> None:
         """Output the shapefile with the given id.
         ID would either be a path to a shapefile or an identifier to a shapefile in ArcGIS or QGIS.
@@ -393,4 +529,45 @@ class Interface(metaclass=ABCMeta):
         """Instantiate the loggers for the module."""
 
     def get_config(self) -> Veg2HabConfig:
-        return Veg2HabConfig()
+        """
+        Geeft de (onveranderlijke) config. Binnen vaste_config is dit steeds dezelfde
+        snapshot; daarbuiten wordt de config alleen opnieuw opgebouwd als de
+        VEG2HAB_ environment variables veranderd zijn.
+        """
+        if self._vaste_config is not None:
+            return self._vaste_config
+        if (
+            self._config is None
+            or self._config_environment != _lees_config_environment()
+        ):
+            return self.reload_config()
+        return self._config
+
+    def reload_config(self) -> Veg2HabConfig:
+        """
+        Bouwt de config opnieuw op uit de environment variables
+        """
+        self._config_environment = _lees_config_environment()
+        self._config = Veg2HabConfig()
+        return self._config
+
+    @contextmanager
+    def vaste_config(self, **overrides) -> Iterator[Veg2HabConfig]:
+        """
+        Zet de config vast voor alles binnen de with, zodat er tijdens een run niet steeds
+        naar de environment variables gekeken hoeft te worden. Met overrides kunnen
+        instellingen voor alleen deze run aangepast worden, bijvoorbeeld
+        vaste_config(mozaiek_threshold=90.0).
+
+        NOTE: processen die niet geforkt worden (zoals op Windows) zien de overrides niet
+        """
+        vorige = self._vaste_config
+        config = vorige if vorige is not None else self.get_config()
+        if overrides:
+            config = Veg2HabConfig(**(config.model_dump() | overrides))
+
+        self._vaste_config = config
+        try:
+            yield config
+        finally:
+            self._vaste_config = vorige
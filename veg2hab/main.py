@@ -1,14 +1,15 @@
 import logging
 from pathlib import Path
 from textwrap import dedent
-from typing import Union
+from typing import Any, Dict, Optional, Union
 
 import geopandas as gpd
 import pandas as pd
 
 import veg2hab
-from veg2hab import constants
+from veg2hab import checkpoint, constants
 from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart, get_datadir
+from veg2hab.criteria import OverrideCriterium
 from veg2hab.definitietabel import DefinitieTabel
 from veg2hab.io.common import (
     AccessDBInputs,
@@ -16,9 +17,13 @@ from veg2hab.io.common import (
     ApplyFunctioneleSamenhangInputs,
     ApplyMozaiekInputs,
     Interface,
+    PipelineAccessDBInputs,
+    PipelineShapefileInputs,
     ShapefileInputs,
     StackVegKarteringInputs,
 )
+from veg2hab.profiel import meet, profiel_pad, profileren
+from veg2hab.referentiedata import Referentiedata
 from veg2hab.vegkartering import Kartering
 from veg2hab.waswordtlijst import WasWordtLijst
 
@@ -61,26 +66,57 @@ def run(
         ApplyDefTabelInputs,
         ApplyMozaiekInputs,
         ApplyFunctioneleSamenhangInputs,
+        PipelineAccessDBInputs,
+        PipelineShapefileInputs,
     ],
+    referentiedata: Optional[Referentiedata] = None,
+    profiel: bool = False,
+    config: Optional[Dict[str, Any]] = None,
 ):
+    """
+    Draait de stap die bij de input parameters hoort.
+    Als referentiedata wordt meegegeven, worden de waswordtlijst, definitietabel en
+    bronnen daaruit gehaald in plaats van opnieuw ingeladen.
+    Met profiel (of de profiel instelling in de config) wordt per (sub)stap de tijd en
+    het geheugengebruik weggeschreven naast de output.
+    De config wordt voor de hele run vastgezet; met config kunnen instellingen voor
+    alleen deze run aangepast worden, bijvoorbeeld {"mozaiek_threshold": 90.0}.
+    """
     logging.info(f"Huidige veg2hab versie: {veg2hab.__version__}")
     logging.info(f"Starting veg2hab met input parameters: {params.model_dump_json()}")
 
-    if isinstance(params, (AccessDBInputs, ShapefileInputs)):
-        return run_1_inladen_vegkartering(params)
-    elif isinstance(params, StackVegKarteringInputs):
-        return run_2_stack_vegkartering(params)
-    elif isinstance(params, ApplyDefTabelInputs):
-        return run_3_definitietabel_en_mitsen(params)
-    elif isinstance(params, ApplyMozaiekInputs):
-        return run_4_mozaiekregels(params)
-    elif isinstance(params, ApplyFunctioneleSamenhangInputs):
-        return run_5_functionele_samenhang_en_min_opp(params)
-    else:
-        raise TypeError("INvalid input parameter")
-
-
-def run_1_inladen_vegkartering(params: Union[AccessDBInputs, ShapefileInputs]):
+    with Interface.get_instance().vaste_config(**(config or {})) as vaste_config:
+        if not (profiel or vaste_config.profiel):
+            return _run_stap(params, referentiedata)
+
+        with profileren(profiel_pad(params.output)):
+            return _run_stap(params, referentiedata)
+
+
+def _run_stap(params, referentiedata: Optional[Referentiedata]):
+    # NOTE: de pipeline inputs zijn subclasses van de stap 1 inputs, dus deze eerst
+    if isinstance(params, (PipelineAccessDBInputs, PipelineShapefileInputs)):
+        return run_pipeline(params, referentiedata)
+
+    with meet(params.label):
+        if isinstance(params, (AccessDBInputs, ShapefileInputs)):
+            return run_1_inladen_vegkartering(params, referentiedata)
+        elif isinstance(params, StackVegKarteringInputs):
+            return run_2_stack_vegkartering(params)
+        elif isinstance(params, ApplyDefTabelInputs):
+            return run_3_definitietabel_en_mitsen(params, referentiedata)
+        elif isinstance(params, ApplyMozaiekInputs):
+            return run_4_mozaiekregels(params)
+        elif isinstance(params, ApplyFunctioneleSamenhangInputs):
+            return run_5_functionele_samenhang_en_min_opp(params)
+        else:
+            raise TypeError("INvalid input parameter")
+
+
+def _inladen_vegkartering(
+    params: Union[AccessDBInputs, ShapefileInputs],
+    referentiedata: Optional[Referentiedata] = None,
+) -> Kartering:
     filename = Interface.get_instance().shape_id_to_filename(params.shapefile)
 
     if filename != params.shapefile:
@@ -117,16 +153,30 @@ def run_1_inladen_vegkartering(params: Union[AccessDBInputs, ShapefileInputs]):
 
     logging.info(f"Vegetatie kartering is succesvol ingelezen")
 
-    wwl = WasWordtLijst.from_excel(Path(constants.WWL_PATH))
+    if referentiedata is not None:
+        wwl = referentiedata.wwl
+    else:
+        with meet("waswordtlijst_inladen"):
+            wwl = WasWordtLijst.from_excel(Path(constants.WWL_PATH))
 
-    logging.info(f"WasWordtLijst is ingelezen van {constants.WWL_PATH}")
+        logging.info(f"WasWordtLijst is ingelezen van {constants.WWL_PATH}")
 
     kartering.apply_wwl(wwl)
 
     logging.info(f"Was wordt lijst is toegepast op de vegetatie kartering")
 
+    return kartering
+
+
+def run_1_inladen_vegkartering(
+    params: Union[AccessDBInputs, ShapefileInputs],
+    referentiedata: Optional[Referentiedata] = None,
+):
+    kartering = _inladen_vegkartering(params, referentiedata)
+
     gdf_vegkart = kartering.to_editable_vegtypes()
-    Interface.get_instance().output_shapefile(params.output, gdf_vegkart)
+    with meet("output_wegschrijven"):
+        Interface.get_instance().output_shapefile(params.output, gdf_vegkart)
 
 
 def run_2_stack_vegkartering(params: StackVegKarteringInputs):
@@ -155,23 +205,24 @@ def run_2_stack_vegkartering(params: StackVegKarteringInputs):
 
     logging.info("Karteringen zijn succesvol gestacked")
 
-    Interface.get_instance().output_shapefile(params.output, gdf_vegkart)
+    with meet("output_wegschrijven"):
+        Interface.get_instance().output_shapefile(params.output, gdf_vegkart)
 
 
-def run_3_definitietabel_en_mitsen(params: ApplyDefTabelInputs):
-    filename = Interface.get_instance().shape_id_to_filename(params.shapefile)
-
-    if filename != params.shapefile:
-        logging.info(
-            f"Tijdelijke versie van {params.shapefile} is opgeslagen in {filename}"
+def _definitietabel_en_mitsen(
+    kartering: Kartering,
+    override_dict: Dict[str, OverrideCriterium],
+    referentiedata: Optional[Referentiedata] = None,
+) -> None:
+    if referentiedata is not None:
+        _definitietabel_en_mitsen_met_referentiedata(
+            kartering, override_dict, referentiedata
         )
+        return
 
-    kartering = Kartering.from_editable_vegtypes(gpd.read_file(filename))
-
-    logging.info("Kartering is succesvol ingelezen")
-
-    deftabel = DefinitieTabel.from_excel(Path(constants.DEFTABEL_PATH))
-    deftabel.set_override_dict(params.as_override_dict())
+    with meet("definitietabel_inladen"):
+        deftabel = DefinitieTabel.from_excel(Path(constants.DEFTABEL_PATH))
+    deftabel.set_override_dict(override_dict)
 
     logging.info(f"Definitietabel is ingelezen van {constants.DEFTABEL_PATH}")
 
@@ -179,21 +230,25 @@ def run_3_definitietabel_en_mitsen(params: ApplyDefTabelInputs):
 
     logging.info(f"Definitietabel is toegepast op de vegetatie kartering")
 
-    fgr = FGR(Path(constants.FGR_PATH))
+    with meet("fgr_inladen"):
+        fgr = FGR(Path(constants.FGR_PATH))
 
     logging.info(f"FGR is ingelezen van {constants.FGR_PATH}")
 
     mask = kartering.get_geometry_mask()
 
-    bodemkaart = Bodemkaart.from_github(mask=mask)
+    with meet("bodemkaart_inladen"):
+        bodemkaart = Bodemkaart.from_github(mask=mask)
 
     logging.info(f"Bodemkaart is ingelezen")
 
-    lbk = LBK.from_github(mask=mask)
+    with meet("lbk_inladen"):
+        lbk = LBK.from_github(mask=mask)
 
     logging.info(f"LBK is ingelezen")
 
-    obk = OudeBossenkaart(Path(constants.OUDE_BOSSENKAART_PATH))
+    with meet("obk_inladen"):
+        obk = OudeBossenkaart(Path(constants.OUDE_BOSSENKAART_PATH))
 
     logging.info(f"Oude bossenkaart is ingelezen van {constants.OUDE_BOSSENKAART_PATH}")
 
@@ -206,8 +261,55 @@ def run_3_definitietabel_en_mitsen(params: ApplyDefTabelInputs):
 
     logging.info(f"Mitsen zijn gecheckt")
 
+
+def _definitietabel_en_mitsen_met_referentiedata(
+    kartering: Kartering,
+    override_dict: Dict[str, OverrideCriterium],
+    referentiedata: Referentiedata,
+) -> None:
+    deftabel = referentiedata.deftabel
+    deftabel.set_override_dict(override_dict)
+
+    try:
+        kartering.apply_deftabel(deftabel)
+    finally:
+        # De definitietabel wordt gedeeld tussen runs, dus de overrides niet laten staan
+        deftabel.set_override_dict({})
+
+    logging.info(f"Definitietabel is toegepast op de vegetatie kartering")
+
+    mask = kartering.get_geometry_mask()
+
+    kartering.bepaal_mits_habitatkeuzes(
+        referentiedata.fgr,
+        referentiedata.bodemkaart_for_mask(mask),
+        referentiedata.lbk_for_mask(mask),
+        referentiedata.obk,
+    )
+
+    logging.info(f"Mitsen zijn gecheckt")
+
+
+def run_3_definitietabel_en_mitsen(
+    params: ApplyDefTabelInputs, referentiedata: Optional[Referentiedata] = None
+):
+    filename = Interface.get_instance().shape_id_to_filename(params.shapefile)
+
+    if filename != params.shapefile:
+        logging.info(
+            f"Tijdelijke versie van {params.shapefile} is opgeslagen in {filename}"
+        )
+
+    with meet("inlezen"):
+        kartering = Kartering.from_editable_vegtypes(gpd.read_file(filename))
+
+    logging.info("Kartering is succesvol ingelezen")
+
+    _definitietabel_en_mitsen(kartering, params.as_override_dict(), referentiedata)
+
     gdf_habkart = kartering.to_editable_habtypes()
-    Interface.get_instance().output_shapefile(params.output, gdf_habkart)
+    with meet("output_wegschrijven"):
+        Interface.get_instance().output_shapefile(params.output, gdf_habkart)
 
 
 def run_4_mozaiekregels(params: ApplyMozaiekInputs):
@@ -218,7 +320,8 @@ def run_4_mozaiekregels(params: ApplyMozaiekInputs):
             f"Tijdelijke versie van {params.shapefile} is opgeslagen in {filename}"
         )
 
-    kartering = Kartering.from_editable_habtypes(gpd.read_file(filename))
+    with meet("inlezen"):
+        kartering = Kartering.from_editable_habtypes(gpd.read_file(filename))
 
     logging.info("Kartering is succesvol ingelezen")
 
@@ -227,7 +330,8 @@ def run_4_mozaiekregels(params: ApplyMozaiekInputs):
     logging.info(f"Mozaiekregels zijn gecheckt")
 
     gdf_habkart = kartering.to_editable_habtypes()
-    Interface.get_instance().output_shapefile(params.output, gdf_habkart)
+    with meet("output_wegschrijven"):
+        Interface.get_instance().output_shapefile(params.output, gdf_habkart)
 
 
 def run_5_functionele_samenhang_en_min_opp(params: ApplyFunctioneleSamenhangInputs):
@@ -238,7 +342,8 @@ def run_5_functionele_samenhang_en_min_opp(params: ApplyFunctioneleSamenhangInpu
             f"Tijdelijke versie van {params.shapefile} is opgeslagen in {filename}"
         )
 
-    kartering = Kartering.from_editable_habtypes(gpd.read_file(filename))
+    with meet("inlezen"):
+        kartering = Kartering.from_editable_habtypes(gpd.read_file(filename))
 
     logging.info("Kartering is succesvol ingelezen")
 
@@ -250,4 +355,110 @@ def run_5_functionele_samenhang_en_min_opp(params: ApplyFunctioneleSamenhangInpu
 
     logging.info("Omzetting is successvol, wordt nu weggeschreven naar een geopackage")
 
-    Interface.get_instance().output_shapefile(params.output, final_format)
+    with meet("output_wegschrijven"):
+        Interface.get_instance().output_shapefile(params.output, final_format)
+
+
+def run_pipeline(
+    params: Union[PipelineAccessDBInputs, PipelineShapefileInputs],
+    referentiedata: Optional[Referentiedata] = None,
+) -> gpd.GeoDataFrame:
+    """
+    Doorloopt stap 1, 3, 4 en 5 achter elkaar met een enkele Kartering in het geheugen.
+    Tussenresultaten worden alleen weggeschreven als er een map voor is opgegeven.
+    Geeft de definitieve habitatkaart terug.
+
+    Met checkpoints aan in de config wordt de kartering na iedere stap bewaard onder een
+    sleutel van alles wat de uitkomst bepaalt (zie veg2hab.checkpoint), en gaat een
+    volgende run verder na de laatste stap waarvan de sleutel niet veranderd is.
+    """
+    interface = Interface.get_instance()
+
+    if params.tussenresultaten is not None:
+        params.tussenresultaten.mkdir(parents=True, exist_ok=True)
+
+    def output_tussenresultaat(label: str, gdf: gpd.GeoDataFrame) -> None:
+        if params.tussenresultaten is None:
+            return
+        path = params.tussenresultaten / f"{label}.gpkg"
+        with meet("tussenresultaat_wegschrijven"):
+            interface.output_shapefile(path, gdf)
+        logging.info(f"Tussenresultaat is weggeschreven naar {path}")
+
+    def stap_1(_) -> Kartering:
+        return _inladen_vegkartering(params, referentiedata)
+
+    def stap_3(kartering: Kartering) -> Kartering:
+        _definitietabel_en_mitsen(kartering, params.as_override_dict(), referentiedata)
+        return kartering
+
+    def stap_4(kartering: Kartering) -> Kartering:
+        kartering.bepaal_mozaiek_habitatkeuzes()
+        logging.info(f"Mozaiekregels zijn gecheckt")
+        return kartering
+
+    def stap_5(kartering: Kartering) -> Kartering:
+        kartering.functionele_samenhang()
+        logging.info(f"Functionele samenhang en minimum oppervlakken zijn gecheckt")
+        return kartering
+
+    # (label, stap, tussenresultaat)
+    stappen = [
+        (params.label, stap_1, Kartering.to_editable_vegtypes),
+        (ApplyDefTabelInputs.label, stap_3, Kartering.to_editable_habtypes),
+        (ApplyMozaiekInputs.label, stap_4, Kartering.to_editable_habtypes),
+        (ApplyFunctioneleSamenhangInputs.label, stap_5, None),
+    ]
+
+    sleutels = None
+    if interface.get_config().checkpoints:
+        sleutels = checkpoint.pipeline_sleutels(params)
+
+    # Verder gaan na de laatste stap waarvan er een checkpoint is
+    kartering = None
+    hervatten_na = -1
+    if sleutels is not None:
+        for i in reversed(range(len(stappen))):
+            with meet("checkpoint_inladen"):
+                kartering = checkpoint.laad_checkpoint(sleutels[i])
+            if kartering is not None:
+                hervatten_na = i
+                logging.warning(
+                    f"Stappen tot en met {stappen[i][0]} worden overgeslagen, het resultaat komt uit een checkpoint"
+                )
+                break
+
+    for i, (label, stap, tussenresultaat) in enumerate(stappen):
+        if i < hervatten_na:
+            # De kartering van deze stap is alleen nodig voor het tussenresultaat
+            if params.tussenresultaten is not None and tussenresultaat is not None:
+                eerder = checkpoint.laad_checkpoint(sleutels[i])
+                if eerder is None:
+                    logging.warning(
+                        f"Tussenresultaat van {label} is niet weggeschreven, want het checkpoint is er niet meer"
+                    )
+                else:
+                    output_tussenresultaat(label, tussenresultaat(eerder))
+            continue
+
+        with meet(label):
+            if i > hervatten_na:
+                kartering = stap(kartering)
+                if sleutels is not None:
+                    with meet("checkpoint_wegschrijven"):
+                        checkpoint.bewaar_checkpoint(sleutels[i], kartering)
+
+            if tussenresultaat is not None:
+                output_tussenresultaat(label, tussenresultaat(kartering))
+                continue
+
+            final_format = kartering.as_final_format()
+
+            logging.info(
+                "Omzetting is successvol, wordt nu weggeschreven naar een geopackage"
+            )
+
+            with meet("output_wegschrijven"):
+                interface.output_shapefile(params.output, final_format)
+
+    return final_format
@@ -13,11 +13,14 @@ from typing import (
 )
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
-from pydantic import BaseModel, Field, TypeAdapter
+from pydantic import BaseModel, Field, TypeAdapter, field_validator
 
+from veg2hab.complexdelen import uitklappen
 from veg2hab.enums import Kwaliteit, MaybeBoolean, NumberType
 from veg2hab.io.common import Interface
+from veg2hab.tegels import per_tegel
 from veg2hab.vegetatietypen import SBB, VvN
 
 
@@ -52,6 +55,14 @@ class _MozaiekRegelBase(BaseModel, extra="forbid"):
     def check(self, omringd_door: pd.DataFrame) -> None:
         raise NotImplementedError()
 
+    def evaluatie_kopie(self) -> "MozaiekRegel":
+        """
+        Kopie om voor een enkel vlak te checken. De mozaiekregels uit de definitietabel
+        worden door alle vlakken gedeeld, en check vervangt alleen velden, dus een
+        ondiepe kopie is genoeg (de kwalificerende vegtypen blijven gedeeld).
+        """
+        return self.model_copy()
+
     def get_mozk_perc_str(self) -> str:
         return ""
 
@@ -104,6 +115,15 @@ class StandaardMozaiekregel(_MozaiekRegelBase):
 
     cached_evaluation: MaybeBoolean = MaybeBoolean.POSTPONE
 
+    @field_validator(
+        "kwalificerende_SBB",
+        "kwalificerende_VvN",
+        "tegengekomen_kwal_SBB",
+        "tegengekomen_kwal_VvN",
+    )
+    def intern_vegtypen(cls, v):
+        return [vegtype.intern() for vegtype in v]
+
     def determine_kwalificerende_vegtypen(self, deftabel_section: pd.DataFrame) -> None:
         # assert columns Habitattype, SBB and VvN are present
         assert all(
@@ -438,22 +458,34 @@ def make_buffered_boundary_overlay_gdf(
     if not mozaiek_present.any():
         return None
 
-    # Eerst trekken we een lijn om alle shapes met mozaiekregels
-    buffered_boundary = (
-        gdf[mozaiek_present].buffer(buffer).boundary.to_frame(name="geometry")
-    )
-    assert buffered_boundary.crs == gdf.crs
-
-    buffered_boundary["buffered_ElmID"] = gdf["ElmID"]
-    buffered_boundary["full_line_length"] = buffered_boundary.length
+    config = Interface.get_instance().get_config()
+    if config.tegel_grootte is None:
+        overlayed = _overlay_buffered_boundary(gdf[mozaiek_present], gdf, buffer)
+    else:
+        # Alle vlakken die een gebufferde lijn kunnen raken liggen binnen "buffer" van het mozaiekvlak
+        overlayed = pd.concat(
+            per_tegel(
+                _overlay_buffered_boundary,
+                gdf[mozaiek_present],
+                gdf,
+                config.tegel_grootte,
+                buffer,
+                buffer,
+                processen=config.tegel_processen,
+            ),
+            ignore_index=True,
+        )
+        # Zelfde volgorde als zonder tegels: per mozaiekvlak, en daarbinnen per omringend vlak
+        volgorde = pd.Series(np.arange(len(gdf)), index=gdf["ElmID"])
+        overlayed = overlayed.iloc[
+            np.lexsort(
+                (
+                    volgorde[overlayed["ElmID"]].to_numpy(),
+                    volgorde[overlayed["buffered_ElmID"]].to_numpy(),
+                )
+            )
+        ].reset_index(drop=True)
 
-    # Dan leggen we alle lijnen over de originele gdf
-    only_needed_cols = gdf[["ElmID", "geometry"]]
-    overlayed = gpd.overlay(
-        buffered_boundary, only_needed_cols, how="union", keep_geom_type=True
-    )
-    # We droppen alle lijnen die niet over een vlak liggen
-    overlayed = overlayed.dropna(subset=["ElmID"])
     overlayed["omringing_percentage"] = (
         overlayed.length / overlayed.full_line_length
     ) * 100
@@ -462,6 +494,32 @@ def make_buffered_boundary_overlay_gdf(
     return overlayed.drop(columns=["geometry"])
 
 
+def _overlay_buffered_boundary(
+    mozaiek_vlakken: gpd.GeoDataFrame,
+    vlakken: gpd.GeoDataFrame,
+    buffer: Number,
+) -> gpd.GeoDataFrame:
+    """
+    Trekt om elk van de mozaiek_vlakken een lijn met afstand "buffer" tot het vlak,
+    en knipt deze op per vlak uit vlakken waar ze over heen liggen.
+    Lijnstukken die niet over een vlak liggen worden niet teruggegeven.
+    """
+    buffered_boundary = mozaiek_vlakken.buffer(buffer).boundary.to_frame(
+        name="geometry"
+    )
+    assert buffered_boundary.crs == vlakken.crs
+
+    buffered_boundary["buffered_ElmID"] = mozaiek_vlakken["ElmID"]
+    buffered_boundary["full_line_length"] = buffered_boundary.length
+
+    return gpd.overlay(
+        buffered_boundary,
+        vlakken[["ElmID", "geometry"]],
+        how="intersection",
+        keep_geom_type=True,
+    )
+
+
 def construct_elmid_omringd_door_gdf(
     augmented_overlayed: pd.DataFrame,
 ) -> Optional[pd.DataFrame]:
@@ -492,45 +550,39 @@ def construct_elmid_omringd_door_gdf(
         col in augmented_overlayed.columns for col in expected_cols
     ), f"Niet alle kolommen {expected_cols} gevonden in augmented_overlayed bij construct_elmid_omringd_door_gdf"
 
-    def expand_habkeuze_vegtypeinfo_columns(
-        row: pd.Series,
-    ) -> pd.DataFrame:
-        """
-        ### Ontvangt steeds een rij met
-            buffered_ElmID | full_line_length | ElmID | omringing_percentage | VegTypeInfo | HabitatKeuze
-
-        ### En trekt uit ieder VegTypeInfo/HabitatKeuze-paar de info om te krijgen
-            buffered_ElmID | ElmID | habtype | kwaliteit | vegtypen | complexdeel_percentage | omringing_percentage
-        """
-        assert len(row.HabitatKeuze) == len(
-            row.VegTypeInfo
-        ), "HabitatKeuze en VegTypeInfo moeten even lang zijn"
-
-        return pd.DataFrame(
-            {
-                "buffered_ElmID": row.buffered_ElmID,
-                "ElmID": row.ElmID,
-                "habtype": [
-                    keuze.habtype if keuze is not None else "HXXXX"
-                    for keuze in row.HabitatKeuze
-                ],
-                "kwaliteit": [
-                    keuze.kwaliteit if keuze is not None else Kwaliteit.NVT
-                    for keuze in row.HabitatKeuze
-                ],
-                "vegtypen": [info.VvN + info.SBB for info in row.VegTypeInfo],
-                "complexdeel_percentage": [info.percentage for info in row.VegTypeInfo],
-                "omringing_percentage": [row.omringing_percentage]
-                * len(row.HabitatKeuze),
-            }
+    assert all(
+        len(keuzes) == len(infos)
+        for keuzes, infos in zip(
+            augmented_overlayed.HabitatKeuze, augmented_overlayed.VegTypeInfo
         )
+    ), "HabitatKeuze en VegTypeInfo moeten even lang zijn"
 
-    result = augmented_overlayed.apply(expand_habkeuze_vegtypeinfo_columns, axis=1)
-
-    if len(result) == 0:
+    if len(augmented_overlayed) == 0:
         return None
 
-    return pd.concat(result.values).reset_index(drop=True)
+    # Ieder VegTypeInfo/HabitatKeuze-paar in een eigen rij
+    lang = uitklappen(augmented_overlayed, ["HabitatKeuze", "VegTypeInfo"])
+
+    vlak = lang["vlak"].to_numpy()
+    return pd.DataFrame(
+        {
+            "buffered_ElmID": augmented_overlayed.buffered_ElmID.to_numpy()[vlak],
+            "ElmID": augmented_overlayed.ElmID.to_numpy()[vlak],
+            "habtype": [
+                keuze.habtype if keuze is not None else "HXXXX"
+                for keuze in lang.HabitatKeuze
+            ],
+            "kwaliteit": [
+                keuze.kwaliteit if keuze is not None else Kwaliteit.NVT
+                for keuze in lang.HabitatKeuze
+            ],
+            "vegtypen": [info.VvN + info.SBB for info in lang.VegTypeInfo],
+            "complexdeel_percentage": [info.percentage for info in lang.VegTypeInfo],
+            "omringing_percentage": augmented_overlayed.omringing_percentage.to_numpy()[
+                vlak
+            ],
+        }
+    )
 
 
 def is_mozaiek_type_present(
@@ -563,6 +615,9 @@ MozaiekRegel = Annotated[
 ]
 
 
+# Een keer aanmaken, het opbouwen van een TypeAdapter kost veel meer dan het parsen
+_MOZAIEKREGEL_ADAPTER = TypeAdapter(MozaiekRegel)
+
+
 def mozaiekregel_from_json(json_str: str) -> MozaiekRegel:
-    type_adapter = TypeAdapter(MozaiekRegel)
-    return type_adapter.validate_json(json_str)
+    return _MOZAIEKREGEL_ADAPTER.validate_json(json_str)
@@ -0,0 +1,231 @@
+import functools
+import json
+import logging
+import re
+import sys
+import time
+from contextlib import contextmanager
+from datetime import datetime
+from pathlib import Path
+from typing import Callable, Iterator, List, NamedTuple, Optional
+
+import pandas as pd
+
+import veg2hab
+
+# Het profiel dat op dit moment metingen verzamelt, of None als er niet geprofileerd wordt
+_actief: Optional["Profiel"] = None
+
+
+class Meting(NamedTuple):
+    stap: str
+    niveau: int
+    wandtijd_s: float
+    cpu_tijd_s: float
+    piek_rss_mb: Optional[float]
+
+
+def _lees_piek_working_set_windows() -> Optional[int]:
+    import ctypes
+    from ctypes import wintypes
+
+    class PROCESS_MEMORY_COUNTERS(ctypes.Structure):
+        _fields_ = [
+            ("cb", wintypes.DWORD),
+            ("PageFaultCount", wintypes.DWORD),
+            ("PeakWorkingSetSize", ctypes.c_size_t),
+            ("WorkingSetSize", ctypes.c_size_t),
+            ("QuotaPeakPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaPeakNonPagedPoolUsage", ctypes.c_size_t),
+            ("QuotaNonPagedPoolUsage", ctypes.c_size_t),
+            ("PagefileUsage", ctypes.c_size_t),
+            ("PeakPagefileUsage", ctypes.c_size_t),
+        ]
+
+    counters = PROCESS_MEMORY_COUNTERS()
+    counters.cb = ctypes.sizeof(counters)
+    kernel32 = ctypes.windll.kernel32
+    kernel32.GetCurrentProcess.restype = wintypes.HANDLE
+    if not kernel32.K32GetProcessMemoryInfo(
+        kernel32.GetCurrentProcess(), ctypes.byref(counters), counters.cb
+    ):
+        return None
+    return counters.PeakWorkingSetSize
+
+
+def _lees_piek_rss() -> Optional[int]:
+    """
+    Piek RSS van dit proces in bytes, sinds de laatste _reset_piek_rss (linux)
+    of sinds de start van het proces (andere systemen)
+    """
+    try:
+        with open("/proc/self/status") as f:
+            match = re.search(r"VmHWM:\s+(\d+) kB", f.read())
+        if match is not None:
+            return int(match.group(1)) * 1024
+    except OSError:
+        pass
+
+    if sys.platform == "win32":
+        try:
+            return _lees_piek_working_set_windows()
+        except (AttributeError, OSError):
+            return None
+
+    try:
+        import resource
+    except ImportError:
+        return None
+
+    maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # ru_maxrss is in bytes op macOS en in kilobytes op linux
+    return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def _reset_piek_rss() -> None:
+    """
+    Zet de piek RSS terug naar het huidige geheugengebruik, zodat de piek per stap gemeten
+    kan worden. Kan alleen op linux, op andere systemen is de piek die van het hele proces.
+    """
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+class _Frame:
+    def __init__(self, stap: str):
+        self.stap = stap
+        self.start_wandtijd = time.perf_counter()
+        self.start_cpu_tijd = time.process_time()
+        self.piek_rss: Optional[int] = None
+
+    def update_piek_rss(self, piek_rss: Optional[int]) -> None:
+        if piek_rss is not None:
+            self.piek_rss = max(self.piek_rss or 0, piek_rss)
+
+
+class Profiel:
+    """
+    Verzamelt wandtijd, cpu tijd en piek geheugengebruik (RSS) per (sub)stap.
+    Stappen kunnen genest worden; de naam van een substap is dan "stap/substap".
+    """
+
+    def __init__(self):
+        self.metingen: List[Optional[Meting]] = []
+        self._stack: List[_Frame] = []
+
+    @contextmanager
+    def meet(self, naam: str) -> Iterator[None]:
+        # De piek tot nu toe hoort bij de omliggende stap, voordat we deze resetten
+        if self._stack:
+            self._stack[-1].update_piek_rss(_lees_piek_rss())
+        _reset_piek_rss()
+
+        stap = "/".join([frame.stap for frame in self._stack[-1:]] + [naam])
+        frame = _Frame(stap)
+        self._stack.append(frame)
+        # Plek reserveren, zodat de metingen op volgorde van starten staan
+        index = len(self.metingen)
+        self.metingen.append(None)
+
+        try:
+            yield
+        finally:
+            frame.update_piek_rss(_lees_piek_rss())
+            self._stack.pop()
+            if self._stack:
+                self._stack[-1].update_piek_rss(frame.piek_rss)
+
+            self.metingen[index] = Meting(
+                stap=stap,
+                niveau=len(self._stack),
+                wandtijd_s=time.perf_counter() - frame.start_wandtijd,
+                cpu_tijd_s=time.process_time() - frame.start_cpu_tijd,
+                piek_rss_mb=(
+                    None if frame.piek_rss is None else frame.piek_rss / 1024**2
+                ),
+            )
+
+    def as_dataframe(self) -> pd.DataFrame:
+        return pd.DataFrame(
+            [meting for meting in self.metingen if meting is not None],
+            columns=Meting._fields,
+        )
+
+    def schrijf(self, path: Path) -> None:
+        """
+        Schrijft het profiel weg als JSON en als CSV; path is zonder extensie
+        """
+        df = self.as_dataframe()
+        df.to_csv(path.with_name(path.name + ".csv"), index=False)
+        with open(path.with_name(path.name + ".json"), "w", encoding="utf-8") as f:
+            json.dump(
+                {
+                    "versie": veg2hab.__version__,
+                    "datum": datetime.now().isoformat(timespec="seconds"),
+                    "metingen": [
+                        meting._asdict()
+                        for meting in self.metingen
+                        if meting is not None
+                    ],
+                },
+                f,
+                indent=2,
+            )
+
+
+def profiel_pad(output: Optional[Path]) -> Path:
+    """
+    Locatie (zonder extensie) van het profiel: naast de output, of in de huidige map als er geen output is opgegeven
+    """
+    if output is None:
+        return Path.cwd() / f"veg2hab_profiel_{datetime.now():%Y%m%d_%H%M%S}"
+    output = Path(output)
+    return output.with_name(output.stem + "_profiel")
+
+
+@contextmanager
+def profileren(path: Path) -> Iterator[Profiel]:
+    """
+    Zet het profileren aan voor alles binnen de with, en schrijft daarna het profiel weg
+    (ook als er een fout optreedt, zodat te zien is waar de tijd tot dan toe in zat)
+    """
+    global _actief
+    profiel = Profiel()
+    _actief = profiel
+    try:
+        with profiel.meet("totaal"):
+            yield profiel
+    finally:
+        _actief = None
+        profiel.schrijf(path)
+        logging.warning(f"Profiel is weggeschreven naar {path}.json en {path}.csv")
+
+
+@contextmanager
+def meet(naam: str) -> Iterator[None]:
+    """
+    Meet de (sub)stap binnen de with, als er op dit moment geprofileerd wordt
+    """
+    if _actief is None:
+        yield
+        return
+
+    with _actief.meet(naam):
+        yield
+
+
+def gemeten(func: Callable) -> Callable:
+    """
+    Decorator die iedere aanroep van func meet onder de naam van de functie
+    """
+
+    @functools.wraps(func)
+    def wrapper(*args, **kwargs):
+        with meet(func.__name__):
+            return func(*args, **kwargs)
+
+    return wrapper
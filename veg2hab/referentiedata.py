@@ -0,0 +1,113 @@
+import logging
+from pathlib import Path
+from typing import List, Optional, Tuple
+
+import geopandas as gpd
+import numpy as np
+
+from veg2hab import constants
+from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart
+from veg2hab.definitietabel import DefinitieTabel
+from veg2hab.waswordtlijst import WasWordtLijst
+
+
+def _subset_for_mask(
+    gdf: gpd.GeoDataFrame, mask: gpd.GeoDataFrame, columns: List[str]
+) -> gpd.GeoDataFrame:
+    """
+    Geeft de vlakken uit gdf die de mask snijden, in de originele volgorde.
+    Komt overeen met het inladen van een bestand met gpd.read_file(path, mask=mask),
+    dat de mask ook naar de CRS van het bestand omzet.
+    """
+    if mask.crs is not None and gdf.crs is not None:
+        mask = mask.to_crs(gdf.crs)
+    _, bron_idx = gdf.sindex.query(mask.geometry, predicate="intersects")
+    return gdf.iloc[np.unique(bron_idx)][columns].reset_index(drop=True)
+
+
+class Referentiedata:
+    """
+    Houdt de waswordtlijst, definitietabel en bronnen in het geheugen, zodat deze bij
+    meerdere runs in hetzelfde proces (zoals bij veg2hab serve) niet iedere keer
+    opnieuw ingeladen hoeven te worden.
+
+    LBK en Bodemkaart worden landelijk ingeladen en per kartering met de ruimtelijke
+    index uitgesneden.
+    """
+
+    def __init__(
+        self,
+        wwl: WasWordtLijst,
+        deftabel: DefinitieTabel,
+        fgr: FGR,
+        obk: OudeBossenkaart,
+        lbk: LBK,
+        bodemkaart: Bodemkaart,
+    ):
+        self.wwl = wwl
+        self.deftabel = deftabel
+        self.fgr = fgr
+        self.obk = obk
+        self.lbk = lbk
+        self.bodemkaart = bodemkaart
+
+        # Ruimtelijke indexen direct opbouwen, anders gebeurt dit bij de eerste kartering
+        for gdf in (fgr.gdf, obk.gdf, lbk.gdf, bodemkaart.gdf):
+            gdf.sindex
+
+    @staticmethod
+    def _tabellen_inladen() -> Tuple[WasWordtLijst, DefinitieTabel]:
+        """
+        Waswordtlijst en definitietabel; bij het parsen hiervan wordt de config
+        gebruikt (o.a. de thresholds van de mozaiekregels)
+        """
+        wwl = WasWordtLijst.from_excel(Path(constants.WWL_PATH))
+        logging.info(f"WasWordtLijst is ingelezen van {constants.WWL_PATH}")
+
+        deftabel = DefinitieTabel.from_excel(Path(constants.DEFTABEL_PATH))
+        logging.info(f"Definitietabel is ingelezen van {constants.DEFTABEL_PATH}")
+
+        return wwl, deftabel
+
+    @classmethod
+    def inladen(cls) -> "Referentiedata":
+        wwl, deftabel = cls._tabellen_inladen()
+
+        fgr = FGR(Path(constants.FGR_PATH))
+        logging.info(f"FGR is ingelezen van {constants.FGR_PATH}")
+
+        obk = OudeBossenkaart(Path(constants.OUDE_BOSSENKAART_PATH))
+        logging.info(
+            f"Oude bossenkaart is ingelezen van {constants.OUDE_BOSSENKAART_PATH}"
+        )
+
+        lbk = LBK.from_github()
+        logging.info(f"Landelijke LBK is ingelezen")
+
+        bodemkaart = Bodemkaart.from_github()
+        logging.info(f"Landelijke bodemkaart is ingelezen")
+
+        return cls(wwl, deftabel, fgr, obk, lbk, bodemkaart)
+
+    def voor_config(self) -> "Referentiedata":
+        """
+        Referentiedata met de waswordtlijst en definitietabel opnieuw ingeladen met de
+        huidige config (bijvoorbeeld binnen Interface.vaste_config). De bronkaarten
+        hangen niet af van de config en worden gedeeld.
+        """
+        wwl, deftabel = self._tabellen_inladen()
+        return Referentiedata(
+            wwl, deftabel, self.fgr, self.obk, self.lbk, self.bodemkaart
+        )
+
+    def lbk_for_mask(self, mask: Optional[gpd.GeoDataFrame]) -> LBK:
+        if mask is None:
+            return self.lbk
+        return LBK(_subset_for_mask(self.lbk.gdf, mask, ["geometry", "lbk"]))
+
+    def bodemkaart_for_mask(self, mask: Optional[gpd.GeoDataFrame]) -> Bodemkaart:
+        if mask is None:
+            return self.bodemkaart
+        return Bodemkaart(
+            _subset_for_mask(self.bodemkaart.gdf, mask, ["geometry", "bodem"])
+        )
@@ -0,0 +1,177 @@
+import json
+import logging
+import time
+import urllib.error
+import urllib.request
+from http.server import BaseHTTPRequestHandler, HTTPServer
+from pathlib import Path
+from typing import Dict, Optional, Type
+
+import veg2hab
+from veg2hab import main
+from veg2hab.io.cli import default_output_path
+from veg2hab.io.common import (
+    AccessDBInputs,
+    ApplyDefTabelInputs,
+    ApplyFunctioneleSamenhangInputs,
+    ApplyMozaiekInputs,
+    BaseModel,
+    PipelineAccessDBInputs,
+    PipelineShapefileInputs,
+    ShapefileInputs,
+    StackVegKarteringInputs,
+    paden_absoluut_maken,
+)
+from veg2hab.referentiedata import Referentiedata
+
+DEFAULT_HOST = "127.0.0.1"
+DEFAULT_PORT = 8765
+
+_INPUT_TYPES: Dict[str, Type[BaseModel]] = {
+    cls.__name__: cls
+    for cls in (
+        AccessDBInputs,
+        ShapefileInputs,
+        StackVegKarteringInputs,
+        ApplyDefTabelInputs,
+        ApplyMozaiekInputs,
+        ApplyFunctioneleSamenhangInputs,
+        PipelineAccessDBInputs,
+        PipelineShapefileInputs,
+    )
+}
+
+
+class _Veg2HabRequestHandler(BaseHTTPRequestHandler):
+    server: "Veg2HabServer"
+
+    def _send_json(self, status: int, body: Dict) -> None:
+        data = json.dumps(body).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def do_GET(self) -> None:
+        if self.path != "/status":
+            self._send_json(404, {"fout": f"Onbekend pad {self.path}"})
+            return
+        self._send_json(
+            200,
+            {"versie": veg2hab.__version__, "aantal_jobs": self.server.aantal_jobs},
+        )
+
+    def do_POST(self) -> None:
+        if self.path != "/run":
+            self._send_json(404, {"fout": f"Onbekend pad {self.path}"})
+            return
+
+        try:
+            length = int(self.headers.get("Content-Length", 0))
+            payload = json.loads(self.rfile.read(length))
+
+            if payload.get("versie") != veg2hab.__version__:
+                raise ValueError(
+                    f"Versie van de client ({payload.get('versie')}) komt niet overeen met die van de server ({veg2hab.__version__})"
+                )
+            if payload.get("type") not in _INPUT_TYPES:
+                raise ValueError(
+                    f"Onbekend type input parameters: {payload.get('type')}"
+                )
+
+            params = _INPUT_TYPES[payload["type"]].model_validate(payload["params"])
+        except Exception as e:
+            self._send_json(400, {"fout": f"{type(e).__name__}: {e}"})
+            return
+
+        start = time.perf_counter()
+        try:
+            main.run(params, self.server.referentiedata)
+        except Exception as e:
+            logging.exception("Fout tijdens het uitvoeren van een job")
+            self._send_json(500, {"fout": f"{type(e).__name__}: {e}"})
+            return
+        finally:
+            self.server.aantal_jobs += 1
+
+        self._send_json(200, {"duur": time.perf_counter() - start})
+
+    def log_message(self, format: str, *args) -> None:
+        logging.debug(f"{self.address_string()} - {format % args}")
+
+
+class Veg2HabServer(HTTPServer):
+    """
+    HTTP server die jobs een voor een uitvoert met referentiedata die in het geheugen blijft.
+    Jobs worden bewust niet parallel uitgevoerd, omdat de definitietabel en de
+    Interface gedeeld worden tussen de jobs.
+    """
+
+    def __init__(
+        self,
+        referentiedata: Optional[Referentiedata],
+        host: str = DEFAULT_HOST,
+        port: int = DEFAULT_PORT,
+    ):
+        super().__init__((host, port), _Veg2HabRequestHandler)
+        self.referentiedata = referentiedata
+        self.aantal_jobs = 0
+
+
+def serve(host: str = DEFAULT_HOST, port: int = DEFAULT_PORT) -> None:
+    """
+    Laadt de referentiedata in en start de server, totdat deze wordt onderbroken
+    """
+    referentiedata = Referentiedata.inladen()
+
+    with Veg2HabServer(referentiedata, host, port) as server:
+        logging.warning(f"veg2hab server luistert op http://{host}:{port}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            logging.warning("veg2hab server wordt gestopt")
+
+
+def submit(server_url: str, params: BaseModel) -> Dict:
+    """
+    Stuurt een job naar een draaiende veg2hab server en wacht tot deze klaar is.
+    """
+    type_name = next(
+        (
+            cls.__name__
+            for cls in type(params).__mro__
+            if _INPUT_TYPES.get(cls.__name__) is cls
+        ),
+        None,
+    )
+    if type_name is None:
+        raise TypeError("Invalide input parameters voor de veg2hab server")
+
+    dumped = params.model_dump(mode="json")
+    if dumped.get("output") is None:
+        dumped["output"] = str(default_output_path())
+    # Paden absoluut maken, zodat de server ze vanuit een andere working directory kan vinden
+    dumped = paden_absoluut_maken(dumped, Path.cwd())
+
+    request = urllib.request.Request(
+        f"{server_url.rstrip('/')}/run",
+        data=json.dumps(
+            {"versie": veg2hab.__version__, "type": type_name, "params": dumped}
+        ).encode(),
+        headers={"Content-Type": "application/json"},
+        method="POST",
+    )
+
+    try:
+        with urllib.request.urlopen(request) as response:
+            result = json.loads(response.read())
+    except urllib.error.HTTPError as e:
+        raise RuntimeError(
+            f"veg2hab server gaf een fout: {json.loads(e.read()).get('fout')}"
+        ) from e
+
+    logging.info(
+        f"Job is uitgevoerd door de veg2hab server in {result['duur']:.1f} seconden, output: {dumped['output']}"
+    )
+    return result
@@ -0,0 +1,115 @@
+import logging
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from itertools import repeat
+from typing import Any, Callable, List, Optional
+
+import geopandas as gpd
+import numpy as np
+import pandas as pd
+import shapely
+
+# Kleine extra marge rond de halo, zodat afrondingsverschillen in bijvoorbeeld
+# gebufferde geometrieen nooit een buur buiten de halo laten vallen
+_HALO_MARGE = 1e-6
+
+
+def aantal_processen() -> int:
+    """
+    Aantal cpu's dat dit proces mag gebruiken
+    """
+    if hasattr(os, "sched_getaffinity"):
+        return len(os.sched_getaffinity(0))
+    return os.cpu_count() or 1
+
+
+def deel_in_tegels(gdf: gpd.GeoDataFrame, tegel_grootte: float) -> List[np.ndarray]:
+    """
+    Deelt de vlakken in vierkante tegels van tegel_grootte bij tegel_grootte meter in,
+    op basis van het midden van de bounding box van ieder vlak.
+    Ieder vlak valt dus in precies een tegel, ook als het over de tegelgrens heen ligt.
+
+    Geeft per niet-lege tegel de posities (iloc) van de vlakken terug, in oplopende volgorde.
+    De tegels zelf zijn gesorteerd op (kolom, rij), zodat de indeling deterministisch is.
+    """
+    if tegel_grootte <= 0:
+        raise ValueError(f"Tegelgrootte moet positief zijn, maar is {tegel_grootte}")
+
+    bounds = gdf.geometry.bounds
+    kolom = np.floor((bounds.minx + bounds.maxx) / 2 / tegel_grootte)
+    rij = np.floor((bounds.miny + bounds.maxy) / 2 / tegel_grootte)
+
+    groepen = pd.Series(np.arange(len(gdf))).groupby(
+        [kolom.to_numpy(), rij.to_numpy()], sort=True, dropna=False
+    )
+    return [posities.to_numpy() for _, posities in groepen]
+
+
+def halo_posities(
+    kern: gpd.GeoDataFrame, context: gpd.GeoDataFrame, halo: float
+) -> np.ndarray:
+    """
+    Posities (iloc) van alle vlakken in context waarvan de bounding box binnen halo meter
+    van de bounding box van een van de vlakken in kern ligt, in oplopende volgorde.
+
+    Alles wat in kern binnen halo meter van een vlak ligt zit hier dus zeker in.
+    """
+    bounds = kern.geometry.bounds.to_numpy()
+    marge = halo + _HALO_MARGE
+    boxes = shapely.box(
+        bounds[:, 0] - marge,
+        bounds[:, 1] - marge,
+        bounds[:, 2] + marge,
+        bounds[:, 3] + marge,
+    )
+    _, posities = context.sindex.query(boxes)
+    return np.unique(posities)
+
+
+def per_tegel(
+    func: Callable[..., Any],
+    kern: gpd.GeoDataFrame,
+    context: gpd.GeoDataFrame,
+    tegel_grootte: float,
+    halo: float,
+    *args,
+    processen: Optional[int] = None,
+) -> List[Any]:
+    """
+    Roept func(kern_tegel, context_tegel, *args) aan voor iedere tegel van kern.
+
+    kern_tegel zijn de vlakken uit kern die in de tegel vallen, context_tegel zijn de vlakken
+    uit context binnen halo meter daarvan (in de originele volgorde van context).
+    func moet een functie op moduleniveau zijn, zodat deze naar andere processen kan.
+
+    De tegels worden verdeeld over processen; de resultaten worden altijd in de
+    volgorde van de tegels teruggegeven.
+    """
+    tegels = deel_in_tegels(kern, tegel_grootte)
+
+    if processen is None:
+        processen = aantal_processen()
+    processen = max(1, min(processen, len(tegels)))
+
+    logging.debug(
+        f"{len(kern)} vlakken zijn verdeeld over {len(tegels)} tegels van {tegel_grootte}m met een halo van {halo}m, verwerkt met {processen} processen"
+    )
+
+    kern_tegels = (kern.iloc[posities] for posities in tegels)
+    context_tegels = (
+        context.iloc[halo_posities(kern.iloc[posities], context, halo)]
+        for posities in tegels
+    )
+    args_per_tegel = [repeat(arg) for arg in args]
+
+    if processen == 1:
+        return list(map(func, kern_tegels, context_tegels, *args_per_tegel))
+
+    if "fork" in multiprocessing.get_all_start_methods():
+        context_mp = multiprocessing.get_context("fork")
+    else:
+        context_mp = multiprocessing.get_context("spawn")
+
+    with ProcessPoolExecutor(max_workers=processen, mp_context=context_mp) as executor:
+        return list(executor.map(func, kern_tegels, context_tegels, *args_per_tegel))
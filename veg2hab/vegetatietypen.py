@@ -1,9 +1,13 @@
 from __future__ import annotations
 
+import hashlib
 import logging
 import re
-from typing import Any, ClassVar, Optional, Union
+from abc import abstractmethod
+from functools import lru_cache
+from typing import Any, ClassVar, Collection, Dict, Iterable, Optional, Tuple, Union
 
+import numpy as np
 import pandas as pd
 from pydantic import BaseModel as PydanticBaseModel
 from typing_extensions import Self
@@ -16,7 +20,286 @@ class BaseModel(PydanticBaseModel, extra="forbid"):
     pass
 
 
-class SBB(BaseModel):
+# Alle geinterneerde vegetatietypen, per type en velden
+_POOL: Dict[Tuple[type, tuple], "_Vegetatietype"] = {}
+
+
+class _Vegetatietype(BaseModel, frozen=True):
+    """
+    Superclass van SBB, VvN en rVvN.
+
+    Vegetatietypen zijn onveranderlijk en worden geinterneerd: iedere code bestaat
+    (via from_code, pickle en de field validators van de modellen waar ze in zitten)
+    maar een keer. De hash en de velden als tuple worden vooraf berekend, dus
+    vergelijken en opzoeken in sets en dicts (wat o.a. in match_up_to en de
+    mozaiekregels heel vaak gebeurt) is meestal alleen een identiteitscheck.
+    """
+
+    # Slots in plaats van private attributes, omdat die via een (trage) __getattr__ gaan
+    __slots__ = ("_velden", "_hash")
+
+    def model_post_init(self, __context: Any) -> None:
+        object.__setattr__(self, "_velden", tuple(self.__dict__.values()))
+        object.__setattr__(self, "_hash", hash(self._velden))
+
+    def intern(self) -> Self:
+        """
+        Geeft de enige instantie van dit vegetatietype
+        """
+        return _POOL.setdefault((type(self), self._velden), self)
+
+    def __hash__(self):
+        return self._hash
+
+    def __eq__(self, other):
+        if self is other:
+            return True
+        if type(other) is not type(self):
+            return False
+        return self._velden == other._velden
+
+    def __reduce__(self):
+        # Zodat ook vegetatietypen uit de cache, checkpoints en andere processen
+        # geinterneerd zijn
+        return (_uit_pool, (type(self), self._velden))
+
+    def __copy__(self) -> Self:
+        return self
+
+    def __deepcopy__(self, memo) -> Self:
+        return self
+
+    def model_copy(self, *, update: Optional[Dict[str, Any]] = None, deep=False):
+        if not update:
+            return self
+        return type(self)(**(self.model_dump() | update)).intern()
+
+    # Naar welk veld de gemeenschap gaat, per type gemeenschap in de code
+    gemeenschap_typen: ClassVar[Dict[str, str]] = {}
+
+    # De taxonomiegroepen, van algemeen naar specifiek
+    hierarchie: ClassVar[Tuple[str, ...]] = ()
+    # Het MatchLevel per aantal overeenkomende taxonomiegroepen
+    match_level_per_groep: ClassVar[Tuple[MatchLevel, ...]] = ()
+    # Het MatchLevel van twee gelijke derivaat- of rompgemeenschappen
+    match_level_gemeenschap: ClassVar[MatchLevel] = MatchLevel.NO_MATCH
+
+    @classmethod
+    def codeer(cls, codes: Iterable[Optional[Self]]) -> np.ndarray:
+        """
+        Numerieke codering van de hierarchie van codes, voor match_levels: een int64
+        array met een rij per code, een kolom per taxonomiegroep (0 als die niet is
+        ingevuld) en een laatste kolom voor de gemeenschap (0 als het geen derivaat-
+        of rompgemeenschap is). None wordt een rij met alleen nullen.
+        """
+        leeg = (0,) * (len(cls.hierarchie) + 1)
+        return np.array(
+            [leeg if code is None else _codering(code) for code in codes],
+            dtype=np.int64,
+        ).reshape(-1, len(leeg))
+
+    @classmethod
+    def match_levels(cls, codes: np.ndarray, andere: np.ndarray) -> np.ndarray:
+        """
+        Het MatchLevel (als int) van iedere code met iedere andere code, in een keer
+        met NumPy, met dezelfde uitkomst als codes[i].match_up_to(andere[j]).
+        codes en andere zijn coderingen van codeer; de uitkomst heeft de vorm
+        (len(codes), len(andere)).
+        """
+        n_groepen = len(cls.hierarchie)
+        a = codes[:, None, :]
+        b = andere[None, :, :]
+        gelijk = a == b
+
+        # Het aantal groepen vanaf de klasse die bij beide ingevuld en gelijk zijn;
+        # dat telt alleen als de andere code daarna ophoudt (of net zo lang is)
+        doorlopend = gelijk[..., :n_groepen] & (a[..., :n_groepen] != 0)
+        aantal = np.where(
+            doorlopend.all(axis=-1), n_groepen, doorlopend.argmin(axis=-1)
+        )
+        andere_houdt_op = np.take_along_axis(
+            np.broadcast_to(b[..., :n_groepen] == 0, doorlopend.shape),
+            np.minimum(aantal, n_groepen - 1)[..., None],
+            axis=-1,
+        )[..., 0]
+        levels = np.where(
+            (aantal == n_groepen) | andere_houdt_op,
+            np.array(cls.match_level_per_groep, dtype=np.int64)[aantal],
+            MatchLevel.NO_MATCH,
+        )
+
+        # Derivaat- en rompgemeenschappen matchen alleen met precies dezelfde code
+        gemeenschap = (a[..., n_groepen] != 0) | (b[..., n_groepen] != 0)
+        return np.where(
+            gemeenschap,
+            np.where(
+                gelijk.all(axis=-1), cls.match_level_gemeenschap, MatchLevel.NO_MATCH
+            ),
+            levels,
+        )
+
+    @classmethod
+    def _niet_geautomatiseerd(cls) -> Collection[str]:
+        """
+        Codes die niet geparset worden, maar in hun geheel als klasse bewaard worden
+        """
+        return ()
+
+    @classmethod
+    def _componenten(cls, series: pd.Series, *patronen: str) -> pd.DataFrame:
+        """
+        Splitst een series van codes met str.extract op in de velden van dit
+        vegetatietype, via het eerste patroon dat de hele code matcht.
+        Codes die niet valide zijn (en NA) hebben in alle velden NA.
+        """
+        series = series.astype(object)
+        velden = pd.DataFrame(
+            pd.NA, index=series.index, columns=list(cls.model_fields), dtype=object
+        )
+        gevonden = pd.Series(False, index=series.index)
+        for patroon in patronen:
+            delen = series[~gevonden].str.extract(rf"\A(?:{patroon})\Z")
+            delen = delen[delen["klasse"].notna()]
+            for veld in velden.columns.intersection(delen.columns):
+                velden.loc[delen.index, veld] = delen[veld]
+            for type_, veld in cls.gemeenschap_typen.items():
+                if "type" in delen.columns:
+                    is_type = delen["type"] == type_
+                    velden.loc[delen.index[is_type], veld] = delen.loc[
+                        is_type, "gemeenschap"
+                    ]
+            gevonden[delen.index] = True
+        return velden.where(velden.notna(), pd.NA)
+
+    @classmethod
+    @abstractmethod
+    def componenten(cls, series: pd.Series) -> pd.DataFrame:
+        """
+        Splitst een series van (opgeschoonde) codes op in een kolom per veld
+        """
+
+    @classmethod
+    def valide_codes(cls, series: pd.Series) -> pd.Series:
+        """
+        Geeft per code of hij voldoet aan de opmaak; NATypes worden als valide beschouwd.
+        Iedere unieke code wordt maar een keer gecheckt.
+        """
+        codes = pd.Series(series.dropna().unique(), dtype=object)
+        valide = dict(zip(codes, cls.componenten(codes)["klasse"].notna()))
+        return pd.Series(
+            [valide.get(code, True) for code in series], index=series.index, dtype=bool
+        )
+
+    @classmethod
+    def validate_pandas_series(
+        cls, series: pd.Series, print_invalid: bool = False
+    ) -> bool:
+        """
+        Valideert een pandas series van codes
+        NATypes worden als valide beschouwd
+        """
+        series = series.astype("string")
+        valid_mask = cls.valide_codes(series)
+
+        if print_invalid:
+            if valid_mask.all():
+                logging.info(f"Alle {cls.__name__} codes zijn valide")
+            else:
+                invalid = series[~valid_mask]
+                logging.warning(
+                    f"De volgende {cls.__name__} codes zijn niet valide: \n{invalid}"
+                )
+
+        return valid_mask.all()
+
+    @classmethod
+    def from_series(cls, series: pd.Series) -> pd.Series:
+        """
+        Zet een series van (opgeschoonde) codes om naar geinterneerde vegetatietypen,
+        met None voor lege codes. Iedere unieke code wordt maar een keer geparset.
+        """
+        leeg = series.isna() | (series.astype(object) == "")
+        codes = pd.Series(series[~leeg].unique(), dtype=object)
+
+        niet_geautomatiseerd = codes.isin(cls._niet_geautomatiseerd())
+        vegtypen = {
+            code: cls(klasse=code).intern() for code in codes[niet_geautomatiseerd]
+        }
+
+        codes = codes[~niet_geautomatiseerd]
+        velden = cls.componenten(codes)
+        ongeldig = codes[velden["klasse"].isna()]
+        if len(ongeldig) > 0:
+            raise ValueError(f"Invalid {cls.__name__} code: '{ongeldig.iloc[0]}'")
+
+        velden = velden.astype(object).where(velden.notna(), None)
+        for code, rij in zip(codes, velden.to_dict("records")):
+            vegtypen[code] = cls(**rij).intern()
+
+        return pd.Series(
+            [
+                None if is_leeg else vegtypen[code]
+                for code, is_leeg in zip(series, leeg)
+            ],
+            index=series.index,
+            dtype=object,
+        )
+
+
+def _uit_pool(cls: type, velden: tuple) -> _Vegetatietype:
+    vegtype = _POOL.get((cls, velden))
+    if vegtype is None:
+        vegtype = cls(**dict(zip(cls.model_fields, velden))).intern()
+    return vegtype
+
+
+def _codeer_veld(waarde: Optional[str]) -> int:
+    """
+    Een waarde van een veld als (positieve) int, 0 voor None. Korte waarden (zoals
+    alle geparste taxonomiegroepen) worden letterlijk ingepakt, langere (zoals niet
+    geautomatiseerde codes) via een hash, zodat de codering in ieder proces, en dus
+    ook na pickelen, hetzelfde is.
+    """
+    if waarde is None:
+        return 0
+    bytes_ = waarde.encode()
+    if len(bytes_) <= 7:
+        return int.from_bytes(bytes_, "big")
+    return (1 << 62) | int.from_bytes(
+        hashlib.blake2b(bytes_, digest_size=7).digest(), "big"
+    )
+
+
+@lru_cache(maxsize=None)
+def _codering(vegtype: _Vegetatietype) -> Tuple[int, ...]:
+    groepen = tuple(_codeer_veld(getattr(vegtype, veld)) for veld in vegtype.hierarchie)
+    gemeenschap = 0
+    for type_, veld in vegtype.gemeenschap_typen.items():
+        if getattr(vegtype, veld) is not None:
+            gemeenschap = _codeer_veld(type_ + getattr(vegtype, veld))
+    return groepen + (gemeenschap,)
+
+
+def _lege_codes_naar_none(series: pd.Series) -> pd.Series:
+    """
+    Vervangt lege codes, en codes die alleen "-" of "x" zijn, door None
+    """
+    leeg = series.isna() | series.isin(["", "-", "x"])
+    return series.astype(object).where(~leeg, None)
+
+
+@lru_cache(maxsize=None)
+def _from_code(cls: type, code: str, niet_geautomatiseerd: bool) -> _Vegetatietype:
+    """
+    Parset een code een keer per (type, code); ongeldige codes geven een ValueError
+    (en worden niet gecached)
+    """
+    if niet_geautomatiseerd:
+        return cls(klasse=code).intern()
+    return cls._parse_code(code).intern()
+
+
+class SBB(_Vegetatietype):
     """
     Format van SBB codes:
     ## is cijfer ('1', '5', '10', '32', zonder voorloopnul, dus geen '01' of '04')
@@ -42,15 +325,37 @@ class SBB(BaseModel):
     derivaatgemeenschap: Optional[str] = None
     rompgemeenschap: Optional[str] = None
 
+    gemeenschap_typen: ClassVar[Dict[str, str]] = {
+        "/": "derivaatgemeenschap",
+        "-": "rompgemeenschap",
+    }
+
+    hierarchie: ClassVar[Tuple[str, ...]] = (
+        "klasse",
+        "verbond",
+        "associatie",
+        "subassociatie",
+    )
+    match_level_per_groep: ClassVar[Tuple[MatchLevel, ...]] = (
+        MatchLevel.NO_MATCH,
+        MatchLevel.KLASSE_SBB,
+        MatchLevel.VERBOND_SBB,
+        MatchLevel.ASSOCIATIE_SBB,
+        MatchLevel.SUBASSOCIATIE_SBB,
+    )
+    match_level_gemeenschap: ClassVar[MatchLevel] = MatchLevel.GEMEENSCHAP_SBB
+
+    @classmethod
+    def _niet_geautomatiseerd(cls) -> Collection[str]:
+        return Interface.get_instance().get_config().niet_geautomatiseerde_sbb
+
     @classmethod
     def from_code(cls, code: str) -> Self:
         assert isinstance(code, str), "Code is not a string"
-        niet_geautomatiseerde_sbb = (
-            Interface.get_instance().get_config().niet_geautomatiseerde_sbb
-        )
-        if code in niet_geautomatiseerde_sbb:
-            return cls(klasse=code)
+        return _from_code(cls, code, code in cls._niet_geautomatiseerd())
 
+    @classmethod
+    def _parse_code(cls, code: str) -> Self:
         kwargs = {}
         match = cls.gemeenschap.search(code)
         if match:
@@ -79,7 +384,7 @@ class SBB(BaseModel):
         """
         Returns the base part of the SBB code as a tuple
         """
-        return (self.klasse, self.verbond, self.associatie, self.subassociatie)
+        return self._velden[:4]
 
     @classmethod
     def from_string(cls, code: Union[str, None]) -> Union[SBB, None]:
@@ -91,13 +396,7 @@ class SBB(BaseModel):
         """
         Geeft het aantal subgroepen terug waarin deze SBB overeenkomt met de andere
         """
-        match_levels = [
-            MatchLevel.NO_MATCH,
-            MatchLevel.KLASSE_SBB,
-            MatchLevel.VERBOND_SBB,
-            MatchLevel.ASSOCIATIE_SBB,
-            MatchLevel.SUBASSOCIATIE_SBB,
-        ]
+        match_levels = self.match_level_per_groep
 
         if other is None:
             return match_levels[0]
@@ -138,28 +437,10 @@ class SBB(BaseModel):
         )
 
     @classmethod
-    def validate_pandas_series(
-        cls, series: pd.Series, print_invalid: bool = False
-    ) -> bool:
-        """
-        Valideert een pandas series van SBB codes
-        NATypes worden als valide beschouwd
-        """
-        series = series.astype("string")
-
-        # NATypes op true zetten, deze zijn in principe valid maar validate verwacht str
-        valid_mask = series.apply(
-            lambda x: cls.validate_code(x) if pd.notna(x) else True
-        )
-
-        if print_invalid:
-            if valid_mask.all():
-                logging.info("Alle SBB codes zijn valide")
-            else:
-                invalid = series[~valid_mask]
-                logging.warning(f"De volgende SBB codes zijn niet valide: \n{invalid}")
-
-        return valid_mask.all()
+    def componenten(cls, series: pd.Series) -> pd.DataFrame:
+        # Net als in _parse_code mag de gemeenschap alleen aan het eind staan
+        gemeenschap = cls.gemeenschap.pattern.removesuffix("$")
+        return cls._componenten(series, f"{cls.basis_sbb.pattern}(?:{gemeenschap})?")
 
     def __str__(self):
         classification = [x for x in self.base_SBB_as_tuple() if x is not None]
@@ -171,18 +452,6 @@ class SBB(BaseModel):
             classification.append(self.rompgemeenschap)
         return "".join(classification)
 
-    def __hash__(self):
-        return hash(
-            (
-                self.klasse,
-                self.verbond,
-                self.associatie,
-                self.subassociatie,
-                self.derivaatgemeenschap,
-                self.rompgemeenschap,
-            )
-        )
-
     @staticmethod
     def opschonen_series(series: pd.Series) -> pd.Series:
         """
@@ -190,8 +459,6 @@ class SBB(BaseModel):
         Hierna zijn ze nog niet per se valide, dus check dat nog
         """
         series = series.astype("string")
-        # Van alle smaken NA gewoon None maken
-        series = series.apply(lambda x: None if pd.isna(x) else x)
         # Verwijderen prefix (voor deftabel)
         series = series.str.replace("SBB-", "")
         # Verwijderen xxx suffix (voor deftabel)
@@ -203,17 +470,12 @@ class SBB(BaseModel):
         series = series.str.strip()
         # Vervangen 0[1-9] door [1-9]
         series = series.str.replace(r"0([1-9])", r"\1", regex=True)
-        # Vervangen enkel "-" of "x" vegtypen door None
-        series = series.apply(
-            lambda x: None if (pd.notna(x) and x in ["-", "x"]) else x
-        )
-        # Vervang lege of door opschoningen hierboven leeg gemaakte strings door None
-        series = series.apply(lambda x: None if pd.isnull(x) or x == "" else x)
+        # Vervangen enkel "-" of "x" vegtypen en lege of door opschoningen hierboven
+        # leeg gemaakte strings door None
+        return _lege_codes_naar_none(series)
 
-        return series
 
-
-class VvN(BaseModel):
+class VvN(_Vegetatietype):
     """
     Format van VvN codes:
     ## is cijfer ('1', '5', '10', '32', niet '01' of '04'), x is letter ('a', 'b', 'c' etc)
@@ -241,9 +503,35 @@ class VvN(BaseModel):
     derivaatgemeenschap: Optional[str] = None
     rompgemeenschap: Optional[str] = None
 
+    gemeenschap_typen: ClassVar[Dict[str, str]] = {
+        "dg": "derivaatgemeenschap",
+        "rg": "rompgemeenschap",
+    }
+
+    hierarchie: ClassVar[Tuple[str, ...]] = (
+        "klasse",
+        "orde",
+        "verbond",
+        "associatie",
+        "subassociatie",
+    )
+    match_level_per_groep: ClassVar[Tuple[MatchLevel, ...]] = (
+        MatchLevel.NO_MATCH,
+        MatchLevel.KLASSE_VVN,
+        MatchLevel.ORDE_VVN,
+        MatchLevel.VERBOND_VVN,
+        MatchLevel.ASSOCIATIE_VVN,
+        MatchLevel.SUBASSOCIATIE_VVN,
+    )
+    match_level_gemeenschap: ClassVar[MatchLevel] = MatchLevel.GEMEENSCHAP_VVN
+
     @classmethod
-    def from_code(cls, code: str):
+    def from_code(cls, code: str) -> Self:
         assert isinstance(code, str), "Code is not a string"
+        return _from_code(cls, code, False)
+
+    @classmethod
+    def _parse_code(cls, code: str) -> Self:
         match = cls.gemeenschap.fullmatch(code)
         if match:
             kwargs = {"klasse": match.group("klasse")}
@@ -281,26 +569,13 @@ class VvN(BaseModel):
     ]:
         if self.derivaatgemeenschap or self.rompgemeenschap:
             raise ValueError("Dit is geen normale (niet derivaat-/rompgemeenschap) VvN")
-        return (
-            self.klasse,
-            self.orde,
-            self.verbond,
-            self.associatie,
-            self.subassociatie,
-        )
+        return self._velden[:5]
 
     def match_up_to(self, other: Optional[VvN]) -> MatchLevel:
         """
         Geeft het aantal subgroepen terug waarin deze VvN overeenkomt met de andere
         """
-        match_levels = [
-            MatchLevel.NO_MATCH,
-            MatchLevel.KLASSE_VVN,
-            MatchLevel.ORDE_VVN,
-            MatchLevel.VERBOND_VVN,
-            MatchLevel.ASSOCIATIE_VVN,
-            MatchLevel.SUBASSOCIATIE_VVN,
-        ]
+        match_levels = self.match_level_per_groep
 
         if other is None:
             return match_levels[0]
@@ -336,29 +611,12 @@ class VvN(BaseModel):
         return cls.normale_vvn.fullmatch(code) or cls.gemeenschap.fullmatch(code)
 
     @classmethod
-    def validate_pandas_series(
-        cls, series: pd.Series, print_invalid: bool = False
-    ) -> bool:
-        """
-        Valideert een pandas series van VvN codes
-        NATypes worden als valide beschouwd
-        """
-        series = series.astype("string")
-
-        # NATypes op true zetten, deze zijn in principe valid maar validate verwacht str
-        valid_mask = series.apply(
-            lambda x: cls.validate_code(x) if pd.notna(x) else True
+    def componenten(cls, series: pd.Series) -> pd.DataFrame:
+        # Net als in _parse_code eerst de gemeenschappen, 37rg2 is ook een normale VvN
+        return cls._componenten(
+            series, cls.gemeenschap.pattern, cls.normale_vvn.pattern
         )
 
-        if print_invalid:
-            if valid_mask.any():
-                logging.info("Alle VvN codes zijn valide")
-            else:
-                invalid = series[~valid_mask]
-                logging.warning(f"De volgende VvN codes zijn niet valide: \n{invalid}")
-
-        return valid_mask.all()
-
     def __str__(self):
         if self.derivaatgemeenschap:
             return f"{self.klasse}dg{self.derivaatgemeenschap}"
@@ -367,19 +625,6 @@ class VvN(BaseModel):
         classification = [x for x in self.normal_VvN_as_tuple() if x is not None]
         return "".join(classification)
 
-    def __hash__(self):
-        return hash(
-            (
-                self.klasse,
-                self.orde,
-                self.verbond,
-                self.associatie,
-                self.subassociatie,
-                self.derivaatgemeenschap,
-                self.rompgemeenschap,
-            )
-        )
-
     @staticmethod
     def opschonen_series(series: pd.Series) -> pd.Series:
         """
@@ -402,17 +647,12 @@ class VvN(BaseModel):
         series = series.str.replace("p.p.", "", regex=False)
         # Vervangen 0[1-9] door [1-9]
         series = series.str.replace("0([1-9])", r"\1", regex=True)
-        # Vervangen enkel "-" of "x" vegtypen door None
-        series = series.apply(
-            lambda x: None if (pd.notna(x) and x in ["-", "x"]) else x
-        )
-        # Vervang lege of door opschoningen hierboven leeg gemaakte strings door None
-        series = series.apply(lambda x: None if pd.isnull(x) or x == "" else x)
-
-        return series
+        # Vervangen enkel "-" of "x" vegtypen en lege of door opschoningen hierboven
+        # leeg gemaakte strings door None
+        return _lege_codes_naar_none(series)
 
 
-class rVvN(BaseModel):
+class rVvN(_Vegetatietype):
     """
     Format van VvN codes:
     ## is cijfer ('1', '5', '10', '32', niet '01' of '04'), x is letter ('a', 'b', 'c' etc)
@@ -440,16 +680,22 @@ class rVvN(BaseModel):
     derivaatgemeenschap: Optional[str] = None
     rompgemeenschap: Optional[str] = None
 
+    gemeenschap_typen: ClassVar[Dict[str, str]] = {
+        "dg": "derivaatgemeenschap",
+        "rg": "rompgemeenschap",
+    }
+
     @classmethod
-    def from_code(cls, code: str):
-        assert isinstance(code, str), "Code is not a string"
+    def _niet_geautomatiseerd(cls) -> Collection[str]:
+        return Interface.get_instance().get_config().niet_geautomatiseerde_rvvn
 
-        niet_geautomatiseerde_rvvn = (
-            Interface.get_instance().get_config().niet_geautomatiseerde_rvvn
-        )
-        if code in niet_geautomatiseerde_rvvn:
-            return cls(klasse=code)
+    @classmethod
+    def from_code(cls, code: str) -> Self:
+        assert isinstance(code, str), "Code is not a string"
+        return _from_code(cls, code, code in cls._niet_geautomatiseerd())
 
+    @classmethod
+    def _parse_code(cls, code: str) -> Self:
         match = cls.gemeenschap.fullmatch(code)
         if match:
             kwargs = {"klasse": match.group("klasse")}
@@ -487,13 +733,7 @@ class rVvN(BaseModel):
     ]:
         if self.derivaatgemeenschap or self.rompgemeenschap:
             raise ValueError("Dit is geen normale (niet derivaat-/rompgemeenschap) VvN")
-        return (
-            self.klasse,
-            self.orde,
-            self.verbond,
-            self.associatie,
-            self.subassociatie,
-        )
+        return self._velden[:5]
 
     def match_up_to(self, other: Optional[VvN]) -> MatchLevel:
         raise NotImplementedError("Match up to is not implemented for rVvN")
@@ -506,29 +746,12 @@ class rVvN(BaseModel):
         return cls.normale_rvvn.fullmatch(code) or cls.gemeenschap.fullmatch(code)
 
     @classmethod
-    def validate_pandas_series(
-        cls, series: pd.Series, print_invalid: bool = False
-    ) -> bool:
-        """
-        Valideert een pandas series van rVvN codes
-        NATypes worden als valide beschouwd
-        """
-        series = series.astype("string")
-
-        # NATypes op true zetten, deze zijn in principe valid maar validate verwacht str
-        valid_mask = series.apply(
-            lambda x: cls.validate_code(x) if pd.notna(x) else True
+    def componenten(cls, series: pd.Series) -> pd.DataFrame:
+        # Net als in _parse_code eerst de gemeenschappen, r37rg2 is ook een normale rVvN
+        return cls._componenten(
+            series, cls.gemeenschap.pattern, cls.normale_rvvn.pattern
         )
 
-        if print_invalid:
-            if valid_mask.any():
-                logging.info("Alle rVvN codes zijn valide")
-            else:
-                invalid = series[~valid_mask]
-                logging.warning(f"De volgende rVvN codes zijn niet valide: \n{invalid}")
-
-        return valid_mask.all()
-
     def __str__(self):
         if self.derivaatgemeenschap:
             return f"r{self.klasse}dg{self.derivaatgemeenschap}"
@@ -537,19 +760,6 @@ class rVvN(BaseModel):
         classification = [x for x in self.normal_rVvN_as_tuple() if x is not None]
         return "r" + "".join(classification)
 
-    def __hash__(self):
-        return hash(
-            (
-                self.klasse,
-                self.orde,
-                self.verbond,
-                self.associatie,
-                self.subassociatie,
-                self.derivaatgemeenschap,
-                self.rompgemeenschap,
-            )
-        )
-
     @staticmethod
     def opschonen_series(series: pd.Series) -> pd.Series:
         """
@@ -575,11 +785,6 @@ class rVvN(BaseModel):
         series = series.str.replace("p.p.", "", regex=False)
         # Vervangen 0[1-9] door [1-9]
         series = series.str.replace("0([1-9])", r"\1", regex=True)
-        # Vervangen enkel "-" of "x" vegtypen door None
-        series = series.apply(
-            lambda x: None if (pd.notna(x) and x in ["-", "x"]) else x
-        )
-        # Vervang lege of door opschoningen hierboven leeg gemaakte strings door None
-        series = series.apply(lambda x: None if pd.isnull(x) or x == "" else x)
-
-        return series
+        # Vervangen enkel "-" of "x" vegtypen en lege of door opschoningen hierboven
+        # leeg gemaakte strings door None
+        return _lege_codes_naar_none(series)
@@ -1,36 +1,45 @@
 import logging
 from collections import defaultdict
+from functools import lru_cache
 from pathlib import Path
-from typing import ClassVar, List, Optional, Tuple, Union
+from typing import Any, ClassVar, Dict, List, Optional, Tuple, Union
 
 import geopandas as gpd
+import numpy as np
 import pandas as pd
+from pydantic import BaseModel
 from typing_extensions import Literal, Self
 
 from veg2hab import vegetatietypen
 from veg2hab.access_db import read_access_tables
 from veg2hab.bronnen import FGR, LBK, Bodemkaart, OudeBossenkaart
-from veg2hab.criteria import (
-    BodemCriterium,
-    FGRCriterium,
-    LBKCriterium,
-    OudeBossenCriterium,
-    is_criteria_type_present,
+from veg2hab.complexdelen import (
+    complexdelen_tabel,
+    samenvatting_per_vlak,
+    sorteer_complexdelen,
+)
+from veg2hab.enums import (
+    KarteringState,
+    KeuzeStatus,
+    Kwaliteit,
+    MaybeBoolean,
+    MitsBron,
+    WelkeTypologie,
 )
-from veg2hab.enums import KarteringState, KeuzeStatus, Kwaliteit, WelkeTypologie
 from veg2hab.functionele_samenhang import apply_functionele_samenhang
 from veg2hab.habitat import (
     HabitatKeuze,
+    HabitatKeuzeMemo,
     HabitatVoorstel,
     calc_nr_of_unresolved_habitatkeuzes_per_row,
     rank_habitatkeuzes,
-    try_to_determine_habkeuze,
 )
 from veg2hab.io.common import Interface
 from veg2hab.mozaiek import (
     construct_elmid_omringd_door_gdf,
     make_buffered_boundary_overlay_gdf,
 )
+from veg2hab.profiel import gemeten, meet
 from veg2hab.vegtypeinfo import VegTypeInfo
 
 
@@ -56,38 +65,38 @@ def ingest_vegtype(
         len(SBB_cols) + len(VvN_cols) + len(rVvN_cols) > 0
     ), "Er moet een SBB, VvN of rVvN kolom zijn"
 
-    # Inlezen
-    if len(SBB_cols) == 0:
-        SBB_cols = [None] * len(perc_cols)
-    if len(VvN_cols) == 0:
-        VvN_cols = [None] * len(perc_cols)
-    if len(rVvN_cols) == 0:
-        rVvN_cols = [None] * len(perc_cols)
+    # Inlezen, iedere unieke code wordt per kolom maar een keer geparset
+    def _vegtypen(vegtype_class, cols: List[str]) -> List[List]:
+        if len(cols) == 0:
+            return [[None] * len(gdf)] * len(perc_cols)
+        return [vegtype_class.from_series(gdf[col]).tolist() for col in cols]
+
+    # Per deel (kolomgroep) een (percentage, SBB, VvN, rVvN) tuple per vlak
+    delen = [
+        zip(gdf[perc_col].tolist(), sbbs, vvns, rvvns)
+        for perc_col, sbbs, vvns, rvvns in zip(
+            perc_cols,
+            _vegtypen(vegetatietypen.SBB, SBB_cols),
+            _vegtypen(vegetatietypen.VvN, VvN_cols),
+            _vegtypen(vegetatietypen.rVvN, rVvN_cols),
+        )
+    ]
 
-    def _row_to_vegtypeinfo_list(row: gpd.GeoSeries) -> List[VegTypeInfo]:
+    def _rij_to_vegtypeinfo_list(vlak) -> List[VegTypeInfo]:
         vegtype_list = []
-        for sbb_col, vvn_col, rVvN_col, perc_col in zip(
-            SBB_cols, VvN_cols, rVvN_cols, perc_cols
-        ):
+        for perc, sbb, vvn, rvvn in vlak:
             # Als er geen percentage is, willen we ook geen VegTypeInfo,
             # dus slaan we deze over
-            if pd.isnull(row[perc_col]) or row[perc_col] == 0:
+            if pd.isnull(perc) or perc == 0:
                 continue
 
             # Als er geen vegtypen zijn, willen we ook geen VegTypeInfo,
             # dus slaan we deze over
-            if (
-                (pd.isnull(row[sbb_col]) if sbb_col else True)
-                and (pd.isnull(row[vvn_col]) if vvn_col else True)
-                and (pd.isnull(row[rVvN_col]) if rVvN_col else True)
-            ):
+            if sbb is None and vvn is None and rvvn is None:
                 continue
 
-            vegtypeinfo = VegTypeInfo.from_str_vegtypes(
-                row[perc_col],
-                VvN_strings=[row[vvn_col]] if vvn_col else [],
-                SBB_strings=[row[sbb_col]] if sbb_col else [],
-                rVvN_strings=[row[rVvN_col]] if rVvN_col else [],
+            vegtypeinfo = VegTypeInfo.from_vegtypen(
+                perc, VvN=[vvn], SBB=[sbb], rVvN=[rvvn]
             )
 
             vegtype_list.append(vegtypeinfo)
@@ -95,7 +104,11 @@ def ingest_vegtype(
             return [VegTypeInfo(percentage=100, SBB=[], VvN=[], rVvN=[])]
         return vegtype_list
 
-    return gdf.apply(_row_to_vegtypeinfo_list, axis=1)
+    return pd.Series(
+        [_rij_to_vegtypeinfo_list(vlak) for vlak in zip(*delen)],
+        index=gdf.index,
+        dtype=object,
+    )
 
 
 def fill_in_percentages(
@@ -178,7 +191,7 @@ def sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen(
 
 def hab_as_final_format(
     print_info: Tuple[HabitatKeuze, VegTypeInfo], idx: int, opp: float
-) -> pd.Series:
+) -> Dict[str, Any]:
     """
     Herformatteert een habitatkeuze en bijbehorende vegtypeinfo naar de kolommen zoals in het Gegevens Leverings Protocol
     """
@@ -216,7 +229,7 @@ def hab_as_final_format(
                 f"_SBBdftbl{idx}": voorstel.get_SBBdftbl_str(),
             }
 
-            return pd.Series(series_dict)
+            return series_dict
 
         assert (
             False
@@ -258,7 +271,7 @@ def hab_as_final_format(
             ),
         }
 
-        return pd.Series(series_dict)
+        return series_dict
 
     assert (
         False
@@ -525,6 +538,55 @@ def _single_to_multi(
     return gdf, SBB_out, VvN_out, rVvN_out, perc_out
 
 
+# De kolommen van de verrijkte mits_info_df die check per bron gebruikt
+_MITS_KOLOMMEN = {
+    MitsBron.FGR: ("fgr", "fgr_percentage"),
+    MitsBron.BODEM: ("bodem", "bodem_percentage"),
+    MitsBron.LBK: ("lbk", "lbk_percentage"),
+    MitsBron.OBK: ("obk", "obk_percentage"),
+    MitsBron.GEOMETRIE: ("geometry",),
+}
+
+
+@lru_cache(maxsize=None)
+def _kolommen_voor_bronnen(bronnen: MitsBron) -> Tuple[str, ...]:
+    return tuple(
+        kolom
+        for bron, kolommen in _MITS_KOLOMMEN.items()
+        if bron & bronnen
+        for kolom in kolommen
+    )
+
+
+def _hashbare_waarde(waarde: Any) -> Any:
+    """
+    Een waarde uit de verrijkte mits_info_df als sleutel: lijsten (bodem) als tuple,
+    modellen (obk) als tuple van hun velden, en alle NaN's als None
+    """
+    if isinstance(waarde, list):
+        return tuple(waarde)
+    if isinstance(waarde, BaseModel):
+        return (type(waarde),) + tuple(waarde.model_dump().values())
+    if pd.isna(waarde):
+        return None
+    return waarde
+
+
+def _codeer_kolom(waarden: pd.Series) -> np.ndarray:
+    """
+    Nummert de verschillende waarden van een kolom van de verrijkte mits_info_df,
+    met -1 voor alle NaN's
+    """
+    try:
+        codes, _ = pd.factorize(waarden)
+    except TypeError:
+        # Lijsten (bodem) en modellen (obk) zijn niet hashbaar
+        codes, _ = pd.factorize(
+            pd.Series([_hashbare_waarde(waarde) for waarde in waarden], dtype=object)
+        )
+    return codes
+
+
 class Kartering:
     PREFIX_COLS: ClassVar[List[str]] = [
         # Met deze kolommen begint de dataframe
@@ -617,6 +679,7 @@ class Kartering:
         self.gdf["_state"] = state
 
     @classmethod
+    @gemeten
     def from_access_db(
         cls,
         shape_path: Path,
@@ -726,6 +789,7 @@ class Kartering:
         return cls(gdf)
 
     @classmethod
+    @gemeten
     def from_shapefile(
         cls,
         shape_path: Path,
@@ -953,6 +1017,7 @@ class Kartering:
 
         return cls(gdf)
 
+    @gemeten
     def apply_wwl(
         self, wwl: "WasWordtLijst", override_existing_VvN: bool = False
     ) -> None:
@@ -985,9 +1050,7 @@ class Kartering:
             )
             return
 
-        self.gdf["VegTypeInfo"] = self.gdf["VegTypeInfo"].apply(
-            wwl.toevoegen_VvN_aan_List_VegTypeInfo
-        )
+        self.gdf["VegTypeInfo"] = wwl.toevoegen_VvN(self.gdf["VegTypeInfo"])
 
     @staticmethod
     def _vegtypeinfo_to_multi_col(vegtypeinfos: List[VegTypeInfo]) -> pd.Series:
@@ -1000,6 +1063,7 @@ class Kartering:
             result[f"EDIT_perc{idx}"] = info.percentage
         return result
 
+    @gemeten
     def to_editable_vegtypes(self) -> gpd.GeoDataFrame:
         self.check_state(KarteringState.POST_WWL)
 
@@ -1161,6 +1225,15 @@ class Kartering:
 
         return Kartering(result)
 
+    def complexdelen(self) -> pd.DataFrame:
+        """
+        De complexdelen van de kartering als lange tabel, met een rij per
+        (ElmID, complexdeel); zie veg2hab.complexdelen.complexdelen_tabel.
+        De geometrie staat alleen (per vlak) in self.gdf.
+        """
+        return complexdelen_tabel(self.gdf).set_index(["ElmID", "complexdeel"])
+
+    @gemeten
     def apply_deftabel(self, dt: "DefinitieTabel") -> None:
         """
         Past de definitietabel toe op de kartering om habitatvoorstellen toe te voegen
@@ -1168,9 +1241,17 @@ class Kartering:
         self.check_state(KarteringState.POST_WWL)
         self.set_state(KarteringState.POST_DEFTABEL)
 
+        # Alle verschillende codes in de kartering worden een keer opgezocht
+        voorstellen_per_code = dt.voorstellen_per_code(
+            code
+            for infos in self.gdf["VegTypeInfo"]
+            for info in infos
+            for code in info.VvN + info.SBB
+        )
+
         self.gdf["HabitatVoorstel"] = self.gdf["VegTypeInfo"].apply(
             lambda infos: (
-                [dt.find_habtypes(info) for info in infos]
+                [dt.find_habtypes(info, voorstellen_per_code) for info in infos]
                 if len(infos) > 0
                 else [[HabitatVoorstel.H0000_no_vegtype_present()]]
             )
@@ -1188,47 +1269,113 @@ class Kartering:
         mits_info_df = gpd.GeoDataFrame(self.gdf.geometry)
 
         ### Bepaal waar meer informatie nodig is
-        fgr_needed = self.gdf["HabitatVoorstel"].apply(
-            is_criteria_type_present, args=(FGRCriterium,)
-        )
-        bodem_needed = self.gdf["HabitatVoorstel"].apply(
-            is_criteria_type_present, args=(BodemCriterium,)
-        )
-        lbk_needed = self.gdf["HabitatVoorstel"].apply(
-            is_criteria_type_present, args=(LBKCriterium,)
-        )
-        obk_needed = self.gdf["HabitatVoorstel"].apply(
-            is_criteria_type_present, args=(OudeBossenCriterium,)
-        )
+        # De voorstellen delen de criteria uit de definitietabel, dus de benodigde
+        # bronnen worden maar een keer per criterium uit de definitietabel bepaald
+        bronnen_per_mits = {}
+
+        def benodigde_bronnen(voorstellen_per_deel) -> MitsBron:
+            bronnen = MitsBron(0)
+            for voorstellen in voorstellen_per_deel:
+                for voorstel in voorstellen:
+                    if voorstel.mits is None:
+                        raise ValueError("Er is een habitatvoorstel zonder mits")
+                    if id(voorstel.mits) not in bronnen_per_mits:
+                        bronnen_per_mits[id(voorstel.mits)] = (
+                            voorstel.mits.benodigde_bronnen()
+                        )
+                    bronnen |= bronnen_per_mits[id(voorstel.mits)]
+            return bronnen
+
+        bronnen = self.gdf["HabitatVoorstel"].apply(benodigde_bronnen)
+
+        def nodig(bron: MitsBron) -> pd.Series:
+            return bronnen.apply(lambda b: bool(b & bron))
+
         # mits_info_df heeft al een geometry, dus die hoeft niet toegevoegd (voor OverrideCriterium)
 
         ### Verrijken met de benodigde informatie (joins zijn op index)
-        if fgr_needed.any():
-            mits_info_df = mits_info_df.join(
-                fgr.for_geometry(mits_info_df.loc[fgr_needed])
-            )
-        if lbk_needed.any():
-            mits_info_df = mits_info_df.join(
-                lbk.for_geometry(mits_info_df.loc[lbk_needed])
-            )
-        if bodem_needed.any():
-            mits_info_df = mits_info_df.join(
-                bodemkaart.for_geometry(mits_info_df.loc[bodem_needed])
-            )
-        if obk_needed.any():
-            mits_info_df = mits_info_df.join(
-                obk.for_geometry(mits_info_df.loc[obk_needed])
-            )
+        for bron, naam, kaart in [
+            (MitsBron.FGR, "fgr", fgr),
+            (MitsBron.LBK, "lbk", lbk),
+            (MitsBron.BODEM, "bodemkaart", bodemkaart),
+            (MitsBron.OBK, "obk", obk),
+        ]:
+            bron_nodig = nodig(bron)
+            if bron_nodig.any():
+                with meet(naam):
+                    mits_info_df = mits_info_df.join(
+                        kaart.for_geometry(mits_info_df.loc[bron_nodig])
+                    )
 
         ### Mitsen checken
-        for idx, row in self.gdf.iterrows():
-            mits_info_row = mits_info_df.loc[idx]
-            for voorstellen in row.HabitatVoorstel:
-                for voorstel in voorstellen:
-                    if voorstel.mits is None:
-                        raise ValueError("Er is een habitatvoorstel zonder mits")
-                    voorstel.mits.check(mits_info_row)
+        # De uitkomst van check hangt alleen af van het criterium en de kolommen van
+        # zijn bronnen. Ieder criterium uit de definitietabel wordt daarom gecompileerd
+        # (zie compileer in criteria.py) en in een keer geevalueerd voor alle
+        # verschillende combinaties van waarden in die kolommen waar het bij voorkomt.
+        # Het ingevulde criterium wordt gedeeld door alle voorstellen met dezelfde
+        # combinatie.
+        with meet("mitsen_checken"):
+            voorstellen_per_mits = defaultdict(list)
+            posities_per_mits = defaultdict(list)
+            for positie, voorstellen_per_deel in enumerate(self.gdf["HabitatVoorstel"]):
+                for voorstellen in voorstellen_per_deel:
+                    for voorstel in voorstellen:
+                        voorstellen_per_mits[id(voorstel.mits)].append(voorstel)
+                        posities_per_mits[id(voorstel.mits)].append(positie)
+
+            # Iedere kolom als nummers, zodat combinaties met np.unique te vinden zijn;
+            # de geometrie is voor ieder vlak anders
+            codes = {
+                kolom: _codeer_kolom(mits_info_df[kolom])
+                for kolom in mits_info_df.columns
+                if kolom != "geometry"
+            }
+            codes["geometry"] = np.arange(len(mits_info_df))
+            kolommen = {
+                kolom: mits_info_df[kolom].tolist() for kolom in mits_info_df.columns
+            }
 
+            aantal_ingevuld = 0
+            for mits_id, voorstellen in voorstellen_per_mits.items():
+                origineel = voorstellen[0].mits
+                posities = np.array(posities_per_mits[mits_id])
+                combinaties = np.column_stack(
+                    [
+                        codes[kolom][posities]
+                        for kolom in _kolommen_voor_bronnen(bronnen_per_mits[mits_id])
+                    ]
+                    or [np.zeros(len(posities), dtype=int)]
+                )
+                _, eerste, combinatie_per_voorstel = np.unique(
+                    combinaties, axis=0, return_index=True, return_inverse=True
+                )
+                unieke_posities = posities[eerste]
+
+                evaluaties = origineel.compileer().evalueer_bladeren(
+                    mits_info_df.iloc[unieke_posities]
+                )
+                ingevuld = [
+                    origineel.ingevuld(
+                        {
+                            kolom: waarden[positie]
+                            for kolom, waarden in kolommen.items()
+                        },
+                        map(MaybeBoolean, evaluaties_rij.tolist()),
+                    )
+                    for positie, evaluaties_rij in zip(unieke_posities, evaluaties)
+                ]
+
+                for voorstel, combinatie in zip(
+                    voorstellen, combinatie_per_voorstel.reshape(-1)
+                ):
+                    voorstel.mits = ingevuld[combinatie]
+                aantal_ingevuld += len(ingevuld)
+
+            logging.debug(
+                f"{aantal_ingevuld} verschillende criteria ingevuld voor {len(self.gdf)} vlakken"
+            )
+
+    @gemeten
     def bepaal_mits_habitatkeuzes(
         self, fgr: FGR, bodemkaart: Bodemkaart, lbk: LBK, obk: OudeBossenkaart
     ) -> None:
@@ -1247,17 +1394,18 @@ class Kartering:
 
         self._check_mitsen(fgr, bodemkaart, lbk, obk)
 
+        memo = HabitatKeuzeMemo()
         self.gdf["HabitatKeuze"] = self.gdf["HabitatVoorstel"].apply(
             lambda voorstellen: [
-                try_to_determine_habkeuze(voorstel) for voorstel in voorstellen
+                memo.try_to_determine_habkeuze(voorstel) for voorstel in voorstellen
             ]
         )
+        memo.log_statistieken("Mits habitatkeuzes")
 
         # Vegtypeinfos en Habkeuzes sorteren op correcte outputvolgorde
-        self.gdf = self.gdf.apply(
-            sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen, axis=1
-        )
+        self.gdf = sorteer_complexdelen(self.gdf)
 
+    @gemeten
     def bepaal_mozaiek_habitatkeuzes(self, max_iter: int = 20) -> None:
         """
         Reviseert de habitatkeuzes op basis van mozaiekregels.
@@ -1284,80 +1432,90 @@ class Kartering:
         ### Verkrijgen overlay gdf
         # Hier staat in welke vlakken er voor hoeveel procent aan welke andere vlakken grenzen
         # Als er geen vlakken met mozaiekregels zijn of als deze vlakken allemaal nergens aan grenzen is overlayed None
-        overlayed = make_buffered_boundary_overlay_gdf(self.gdf)
+        with meet("buffered_boundary_overlay"):
+            overlayed = make_buffered_boundary_overlay_gdf(self.gdf)
 
+        # Gedeeld over de iteraties, de mozaiekevaluaties zitten in de sleutel
+        memo = HabitatKeuzeMemo()
         for i in range(max_iter):
-            keuzes_still_to_determine_pre = calc_nr_of_unresolved_habitatkeuzes_per_row(
-                self.gdf
-            )
-            n_keuzes_still_to_determine_pre = keuzes_still_to_determine_pre.sum()
-
-            #####
-            # Mozaiekregels checken
-            #####
-            # We hoeven geen mozaiekdingen te doen als we geen vlakken met mozaiekregels hebben
-            if overlayed is not None:
-                # Vlakken waar alle HabitatKeuzes al bepaald zijn kunnen uit de mozaiekregel overlayed gdf
-                finished_ElmID = self.gdf[
-                    keuzes_still_to_determine_pre == 0
-                ].ElmID.to_list()
-                overlayed = overlayed[~overlayed.buffered_ElmID.isin(finished_ElmID)]
-
-                # Mergen HabitatVoorstel met overlayed
-                # Nu hebben we dus per mozaiekregelvlak voor hoeveel procent het aan
-                # welke HabitatKeuzes en vegtypeinfos grenst
-                augmented_overlayed = overlayed.merge(
-                    self.gdf[["ElmID", "VegTypeInfo", "HabitatKeuze"]],
-                    on="ElmID",
-                    how="left",
+            with meet(f"mozaiek_iteratie_{i}"):
+                keuzes_still_to_determine_pre = (
+                    calc_nr_of_unresolved_habitatkeuzes_per_row(self.gdf)
                 )
+                n_keuzes_still_to_determine_pre = keuzes_still_to_determine_pre.sum()
+
+                #####
+                # Mozaiekregels checken
+                #####
+                # We hoeven geen mozaiekdingen te doen als we geen vlakken met mozaiekregels hebben
+                if overlayed is not None:
+                    # Vlakken waar alle HabitatKeuzes al bepaald zijn kunnen uit de mozaiekregel overlayed gdf
+                    finished_ElmID = self.gdf[
+                        keuzes_still_to_determine_pre == 0
+                    ].ElmID.to_list()
+                    overlayed = overlayed[
+                        ~overlayed.buffered_ElmID.isin(finished_ElmID)
+                    ]
 
-                # Dit pakken we verder uit zodat ieder complexdeel in ieder omringend vlak
-                # een eigen regel heeft met daarin het habitattype, de vegtypen en het complexdeelpercentage
-                elmid_omringd_door = construct_elmid_omringd_door_gdf(
-                    augmented_overlayed
-                )
-                self._check_mozaiekregels(elmid_omringd_door)
-
-            #####
-            # Habitatkeuze proberen te bepalen
-            #####
-
-            self.gdf["HabitatKeuze"] = self.gdf[
-                ["HabitatVoorstel", "HabitatKeuze"]
-            ].apply(
-                lambda row: [
-                    (
-                        keuze
-                        if (
-                            keuze is not None
-                            and keuze.status == KeuzeStatus.HANDMATIG_TOEGEKEND
-                        )
-                        else try_to_determine_habkeuze(voorstel)
+                    # Mergen HabitatVoorstel met overlayed
+                    # Nu hebben we dus per mozaiekregelvlak voor hoeveel procent het aan
+                    # welke HabitatKeuzes en vegtypeinfos grenst
+                    augmented_overlayed = overlayed.merge(
+                        self.gdf[["ElmID", "VegTypeInfo", "HabitatKeuze"]],
+                        on="ElmID",
+                        how="left",
                     )
-                    for keuze, voorstel in zip(row.HabitatKeuze, row.HabitatVoorstel)
-                ],
-                axis=1,
-            )
 
-            n_keuzes_still_to_determine_post = (
-                calc_nr_of_unresolved_habitatkeuzes_per_row(self.gdf).sum()
-            )
+                    # Dit pakken we verder uit zodat ieder complexdeel in ieder omringend vlak
+                    # een eigen regel heeft met daarin het habitattype, de vegtypen en het complexdeelpercentage
+                    elmid_omringd_door = construct_elmid_omringd_door_gdf(
+                        augmented_overlayed
+                    )
+                    self._check_mozaiekregels(elmid_omringd_door)
+
+                #####
+                # Habitatkeuze proberen te bepalen
+                #####
+
+                self.gdf["HabitatKeuze"] = self.gdf[
+                    ["HabitatVoorstel", "HabitatKeuze"]
+                ].apply(
+                    lambda row: [
+                        (
+                            keuze
+                            if (
+                                keuze is not None
+                                and keuze.status == KeuzeStatus.HANDMATIG_TOEGEKEND
+                            )
+                            else memo.try_to_determine_habkeuze(voorstel)
+                        )
+                        for keuze, voorstel in zip(
+                            row.HabitatKeuze, row.HabitatVoorstel
+                        )
+                    ],
+                    axis=1,
+                )
 
-            logging.debug(
-                f"Iteratie {i}: van {n_keuzes_still_to_determine_pre} naar {n_keuzes_still_to_determine_post} habitattypen nog te bepalen"
-            )
+                n_keuzes_still_to_determine_post = (
+                    calc_nr_of_unresolved_habitatkeuzes_per_row(self.gdf).sum()
+                )
 
-            if (
-                n_keuzes_still_to_determine_pre == n_keuzes_still_to_determine_post
-                or n_keuzes_still_to_determine_post == 0
-            ):
-                break
+                logging.debug(
+                    f"Iteratie {i}: van {n_keuzes_still_to_determine_pre} naar {n_keuzes_still_to_determine_post} habitattypen nog te bepalen"
+                )
+
+                if (
+                    n_keuzes_still_to_determine_pre == n_keuzes_still_to_determine_post
+                    or n_keuzes_still_to_determine_post == 0
+                ):
+                    break
         else:
             logging.warning(
                 f"Maximaal aantal iteraties ({max_iter}) bereikt in de mozaiekregel loop."
             )
 
+        memo.log_statistieken("Mozaiek habitatkeuzes")
+
         # Of we hebben overal een keuze, of we komen niet verder met nog meer iteraties,
         # of we hebben max_iter bereikt
 
@@ -1374,14 +1532,18 @@ class Kartering:
         ), "Er zijn nog habitatkeuzes die niet behandeld zijn en nog None zijn na bepaal_habitatkeuzes"
 
         # Vegtypeinfos en Habkeuzes sorteren op correcte outputvolgorde
-        self.gdf = self.gdf.apply(
-            sorteer_vegtypeinfos_en_habkeuzes_en_voorstellen, axis=1
-        )
+        self.gdf = sorteer_complexdelen(self.gdf)
 
     def _check_mozaiekregels(self, elmid_omringd_door: Optional[pd.DataFrame]) -> None:
         if elmid_omringd_door is None:
             return
 
+        # Per vlak de complexdelen waardoor het omringd wordt
+        omringd_door_per_vlak = dict(
+            tuple(elmid_omringd_door.groupby("buffered_ElmID", sort=False))
+        )
+        niet_omringd = elmid_omringd_door.iloc[0:0]
+
         for row in self.gdf.itertuples():
             for idx, voorstel_list in enumerate(row.HabitatVoorstel):
                 # Als er geen habitatkeuzes zijn (want geen vegtypen opgegeven),
@@ -1400,13 +1562,13 @@ class Kartering:
                 ):
                     continue
 
-                relevant_subset = elmid_omringd_door[
-                    elmid_omringd_door["buffered_ElmID"] == row.ElmID
-                ]
+                relevant_subset = omringd_door_per_vlak.get(row.ElmID, niet_omringd)
 
                 for voorstel in voorstel_list:
+                    voorstel.mozaiek = voorstel.mozaiek.evaluatie_kopie()
                     voorstel.mozaiek.check(relevant_subset)
 
+    @gemeten
     def functionele_samenhang(self) -> pd.DataFrame:
         """
         Past de habitatkeuzes aan volgens de regels van minimumoppervlak en functionele samenhang
@@ -1429,6 +1591,7 @@ class Kartering:
             )
         return pd.Series(result)
 
+    @gemeten
     def to_editable_habtypes(self) -> gpd.GeoDataFrame:
         self.check_state(
             KarteringState.MITS_HABKEUZES,
@@ -1559,6 +1722,7 @@ class Kartering:
 
         return kartering
 
+    @gemeten
     def as_final_format(self) -> gpd.GeoDataFrame:
         """
         Output de kartering conform het format voor habitattypekarteringen zoals beschreven
@@ -1586,8 +1750,24 @@ class Kartering:
             ]
         ]
 
-        final = pd.concat([base, base.apply(self.row_to_final_format, axis=1)], axis=1)
-        final["_Samnvttng"] = final.apply(build_aggregate_habtype_field, axis=1)
+        # Per complexdeel een blok kolommen, die per vlak naast elkaar komen
+        lang = complexdelen_tabel(base, ["HabitatKeuze", "VegTypeInfo"])
+        lang["VegTypeInfo"] = self._vegtypeinfos_met_padding(lang)
+        opp = base["Area"].to_numpy()[lang["vlak"].to_numpy()]
+        per_vlak = [{} for _ in range(len(base))]
+        for vlak, deel, keuze, info, opp_vlak in zip(
+            lang["vlak"],
+            lang["complexdeel"],
+            lang["HabitatKeuze"],
+            lang["VegTypeInfo"],
+            opp,
+        ):
+            per_vlak[vlak].update(
+                hab_as_final_format((keuze, info), deel + 1, opp_vlak)
+            )
+
+        final = pd.concat([base, pd.DataFrame(per_vlak, index=base.index)], axis=1)
+        final["_Samnvttng"] = samenvatting_per_vlak(lang, len(base))
         final["_state"] = final["_state"].apply(lambda x: x.value)
         final = finalize_final_format(final)
 
@@ -1599,6 +1779,25 @@ class Kartering:
 
         return final
 
+    @staticmethod
+    def _vegtypeinfos_met_padding(lang: pd.DataFrame) -> List[VegTypeInfo]:
+        """
+        De VegTypeInfos van de complexdelen tabel (met HabitatKeuze en VegTypeInfo),
+        met een dummy VegTypeInfo voor vlakken zonder vegtypen, zie row_to_final_format
+        """
+        assert lang["HabitatKeuze"].notna().all(), "Er zijn vlakken zonder habitatkeuze"
+
+        vegtypeinfos = lang["VegTypeInfo"].tolist()
+        for i, (keuze, info, deel) in enumerate(
+            zip(lang["HabitatKeuze"], vegtypeinfos, lang["complexdeel"])
+        ):
+            if info is None:
+                assert (
+                    deel == 0 and keuze.status == KeuzeStatus.GEEN_OPGEGEVEN_VEGTYPEN
+                ), "Geen opgegeven vegtypen maar status is niet GEEN_OPGEGEVEN_VEGTYPEN"
+                vegtypeinfos[i] = VegTypeInfo(percentage=0, SBB=[], VvN=[])
+        return vegtypeinfos
+
     def row_to_final_format(self, row) -> pd.Series:
         """
         Maakt van een rij een dataseries met blokken kolommen volgens het Gegevens Leverings Protocol (Bijlage 3a)
@@ -1630,12 +1829,10 @@ class Kartering:
                 )
             ]
 
-        return pd.concat(
-            [
-                hab_as_final_format(print_info, i + 1, row["Area"])
-                for i, print_info in enumerate(zip(keuzes, vegtypeinfos))
-            ]
-        )
+        series_dict = {}
+        for i, print_info in enumerate(zip(keuzes, vegtypeinfos)):
+            series_dict.update(hab_as_final_format(print_info, i + 1, row["Area"]))
+        return pd.Series(series_dict)
 
     def final_format_to_file(self, path: Path) -> None:
         """
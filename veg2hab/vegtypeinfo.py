@@ -29,6 +29,10 @@ class VegTypeInfo(BaseModel, extra="forbid", validate_assignment=True):
             raise ValueError("Er kan niet meer dan 1 rVvN type zijn")
         return v
 
+    @field_validator("SBB", "VvN", "rVvN")
+    def intern_vegtypen(cls, v):
+        return [vegtype.intern() for vegtype in v]
+
     @classmethod
     def from_str_vegtypes(
         cls,
@@ -40,6 +44,29 @@ class VegTypeInfo(BaseModel, extra="forbid", validate_assignment=True):
         """
         Aanmaken vanuit string vegetatietypen
         """
+        assert (
+            len(VvN_strings + SBB_strings + rVvN_strings) > 0
+        ), "Er moet minstens 1 vegetatietype zijn"
+
+        return cls.from_vegtypen(
+            percentage,
+            VvN=[vegetatietypen.VvN.from_string(i) for i in VvN_strings],
+            SBB=[vegetatietypen.SBB.from_string(i) for i in SBB_strings],
+            rVvN=[vegetatietypen.rVvN.from_string(i) for i in rVvN_strings],
+        )
+
+    @classmethod
+    def from_vegtypen(
+        cls,
+        percentage: Union[None, str, Number],
+        VvN: List[Optional[vegetatietypen.VvN]] = [],
+        SBB: List[Optional[vegetatietypen.SBB]] = [],
+        rVvN: List[Optional[vegetatietypen.rVvN]] = [],
+    ) -> Self:
+        """
+        Aanmaken vanuit al geparste vegetatietypen (bv van from_series), lege
+        vegetatietypen (None) worden weggelaten
+        """
         if isinstance(percentage, str):
             percentage = float(percentage.replace(",", "."))
 
@@ -47,19 +74,11 @@ class VegTypeInfo(BaseModel, extra="forbid", validate_assignment=True):
             percentage, Number
         ), f"Percentage moet een getal zijn, nu is het {percentage} {type(percentage)}"
 
-        assert (
-            len(VvN_strings + SBB_strings + rVvN_strings) > 0
-        ), "Er moet minstens 1 vegetatietype zijn"
-
-        vvn = [vegetatietypen.VvN.from_string(i) for i in VvN_strings]
-        sbb = [vegetatietypen.SBB.from_string(i) for i in SBB_strings]
-        rvvn = [vegetatietypen.rVvN.from_string(i) for i in rVvN_strings]
-
         return VegTypeInfo(
             percentage=percentage,
-            VvN=[v for v in vvn if v is not None],
-            SBB=[s for s in sbb if s is not None],
-            rVvN=[r for r in rvvn if r is not None],
+            VvN=[v for v in VvN if v is not None],
+            SBB=[s for s in SBB if s is not None],
+            rVvN=[r for r in rVvN if r is not None],
         )
 
     @classmethod
@@ -1,9 +1,10 @@
-from functools import lru_cache
 from pathlib import Path
 from typing import List, Tuple
 
 import pandas as pd
 
+from veg2hab.cache import load_or_build
+from veg2hab.complexdelen import inklappen, uitklappen
 from veg2hab.vegetatietypen import SBB, VvN, rVvN
 from veg2hab.vegtypeinfo import VegTypeInfo
 
@@ -21,15 +22,63 @@ class WasWordtLijst:
         self.check_validity_vegtypen()
 
         # Omvormen naar SBB en VvN klasses
-        self.df["SBB"] = self.df["SBB"].apply(SBB.from_string)
-        self.df["VvN"] = self.df["VvN"].apply(VvN.from_string)
-        self.df["rVvN"] = self.df["rVvN"].apply(rVvN.from_string)
+        self.df["SBB"] = SBB.from_series(self.df["SBB"])
+        self.df["VvN"] = VvN.from_series(self.df["VvN"])
+        self.df["rVvN"] = rVvN.from_series(self.df["rVvN"])
 
         # Replace pd.NA with None
         self.df = self.df.where(self.df.notnull(), None)
 
+        self._maak_vertaaltabellen()
+
+    def _maak_vertaaltabellen(self) -> None:
+        """
+        Maakt eenmalig de volledige vertaaltabellen SBB -> VvN en rVvN -> (VvN, SBB),
+        met een rij per code en de codes waarnaar vertaald wordt als lijst
+        (in de volgorde van de wwl, zonder lege cellen)
+        """
+        SBB_naar_VvN = {}
+        rVvN_naar_VvN = {}
+        rVvN_naar_SBB = {}
+        for sbb, vvn, rvvn in zip(self.df.SBB, self.df.VvN, self.df.rVvN):
+            if sbb is not None:
+                SBB_naar_VvN.setdefault(sbb, [])
+                if vvn is not None:
+                    SBB_naar_VvN[sbb].append(vvn)
+            if rvvn is not None:
+                rVvN_naar_VvN.setdefault(rvvn, [])
+                rVvN_naar_SBB.setdefault(rvvn, [])
+                if vvn is not None:
+                    rVvN_naar_VvN[rvvn].append(vvn)
+                if sbb is not None:
+                    rVvN_naar_SBB[rvvn].append(sbb)
+
+        self._SBB_vertaling = pd.DataFrame(
+            {
+                "SBB": pd.Series(list(SBB_naar_VvN.keys()), dtype="object"),
+                "nieuw_VvN": pd.Series(list(SBB_naar_VvN.values()), dtype="object"),
+            }
+        )
+        self._rVvN_vertaling = pd.DataFrame(
+            {
+                "rVvN": pd.Series(list(rVvN_naar_VvN.keys()), dtype="object"),
+                "nieuw_VvN": pd.Series(list(rVvN_naar_VvN.values()), dtype="object"),
+                "nieuw_SBB": pd.Series(
+                    [rVvN_naar_SBB[code] for code in rVvN_naar_VvN], dtype="object"
+                ),
+            }
+        )
+
     @classmethod
     def from_excel(cls, path: Path) -> "WasWordtLijst":
+        """
+        Maakt een WasWordtLijst object van een excel file.
+        Het geparste resultaat wordt lokaal gecached, zie veg2hab.cache.load_or_build.
+        """
+        return load_or_build("waswordtlijst", path, lambda: cls._from_excel(path))
+
+    @classmethod
+    def _from_excel(cls, path: Path) -> "WasWordtLijst":
         df = pd.read_excel(
             path, engine="openpyxl", usecols=["VvN", "SBB", "rVvN"], dtype="string"
         )
@@ -53,51 +102,31 @@ class WasWordtLijst:
             wwl_rVvN, print_invalid=print_invalid
         ), "Niet alle rVvN codes zijn valid"
 
-    @lru_cache(maxsize=256)
     def match_SBB_to_VvN(self, code: SBB) -> List[VvN]:
         """
         Zoekt de VvN codes die bij een SBB code horen
         """
         assert isinstance(code, SBB), "Code is geen SBB object"
 
-        matching_VvN = self.df[self.df.SBB == code].VvN
-        # dropna om niet None uit lege VvN cellen in de wwl als VvN te krijgen
-        return matching_VvN.dropna().to_list()
+        matching = self._SBB_vertaling.nieuw_VvN[self._SBB_vertaling.SBB == code]
+        return matching.iloc[0] if len(matching) > 0 else []
 
-    @lru_cache(maxsize=256)
     def match_rVvN_to_VvN_SBB(self, code: rVvN) -> Tuple[List[VvN], List[SBB]]:
         """
         Zoekt de VvN en SBB codes die bij een rVvN code horen
         """
         assert isinstance(code, rVvN), "Code is geen rVvN object"
 
-        matching_VvN = self.df[self.df.rVvN == code].VvN
-        matching_SBB = self.df[self.df.rVvN == code].SBB
-        # dropna om niet None uit lege VvN cellen in de wwl als VvN/SBB te krijgen
-        return matching_VvN.dropna().to_list(), matching_SBB.dropna().to_list()
+        matching = self._rVvN_vertaling[self._rVvN_vertaling.rVvN == code]
+        if len(matching) == 0:
+            return [], []
+        return matching.nieuw_VvN.iloc[0], matching.nieuw_SBB.iloc[0]
 
     def toevoegen_VvN_aan_VegTypeInfo(self, info: VegTypeInfo) -> VegTypeInfo:
         """
         Zoekt adhv SBB codes de bijbehorende VvN codes in de WWL en voegt deze toe aan de VegTypeInfo
         """
-        if info is None:
-            raise ValueError("VegTypeInfo is None")
-
-        # Als er geen SBB code is
-        if len(info.SBB) == 0:
-            return info
-
-        assert all(
-            [isinstance(x, SBB) for x in info.SBB]
-        ), "SBB is geen lijst van SBB objecten"
-
-        new_VvN = self.match_SBB_to_VvN(info.SBB[0])
-
-        return VegTypeInfo(
-            percentage=info.percentage,
-            SBB=info.SBB,
-            VvN=new_VvN,
-        )
+        return self.toevoegen_VvN_aan_List_VegTypeInfo([info])[0]
 
     def toevoegen_VvN_aan_List_VegTypeInfo(
         self, infos: List[VegTypeInfo]
@@ -105,12 +134,53 @@ class WasWordtLijst:
         """
         Voert alle elementen in een lijst door toevoegen_VvN_aan_VegTypeInfo en returned het geheel
         """
-        return [self.toevoegen_VvN_aan_VegTypeInfo(info) for info in infos]
+        return self.toevoegen_VvN(pd.Series([infos], dtype="object")).iloc[0]
+
+    def toevoegen_VvN(self, vegtypeinfo: pd.Series) -> pd.Series:
+        """
+        Zoekt voor een series met lijsten van VegTypeInfos adhv de (eerste) SBB code de
+        bijbehorende VvN codes in de WWL en voegt deze toe aan de VegTypeInfos.
+
+        De complexdelen worden uitgeklapt tot een lange tabel met een rij per VegTypeInfo,
+        die in een keer met de vertaaltabel wordt gemerged.
+        """
+        if vegtypeinfo.apply(lambda infos: None in infos).any():
+            raise ValueError("VegTypeInfo is None")
 
-    def van_rVvN_naar_SBB_en_VvN(self, vegtypeinfo: pd.Series) -> None:
+        lang = _uitklappen(vegtypeinfo)
+        lang["SBB"] = [
+            info.SBB[0] if len(info.SBB) > 0 else None for info in lang["info"]
+        ]
+        assert all(
+            isinstance(x, SBB) for info in lang["info"] for x in info.SBB
+        ), "SBB is geen lijst van SBB objecten"
+
+        lang = lang.merge(self._SBB_vertaling, on="SBB", how="left")
+
+        lang["info"] = [
+            (
+                # Als er geen SBB code is blijft de VegTypeInfo hetzelfde
+                info
+                if sbb is None
+                else VegTypeInfo(
+                    percentage=info.percentage,
+                    SBB=info.SBB,
+                    VvN=nieuw_VvN if isinstance(nieuw_VvN, list) else [],
+                )
+            )
+            for info, sbb, nieuw_VvN in zip(
+                lang["info"], lang["SBB"], lang["nieuw_VvN"]
+            )
+        ]
+        return _inklappen(lang, vegtypeinfo)
+
+    def van_rVvN_naar_SBB_en_VvN(self, vegtypeinfo: pd.Series) -> pd.Series:
         """
         Zet een series met lijsten van VegTypeInfos met enkel rVvN om naar een
         series met lijsten van VegTypeInfos met SBB en VvN, zonder rVvN
+
+        Net als bij toevoegen_VvN wordt dit gedaan met een merge van de uitgeklapte
+        complexdelen met de vertaaltabel.
         """
         assert vegtypeinfo.apply(
             lambda infos: all(
@@ -118,35 +188,44 @@ class WasWordtLijst:
             )
         ).all(), "VegTypeInfo in de Series mag geen VvN of SBB bevatten"
 
-        def _rVvN_info_to_SBB_VvN(info: VegTypeInfo) -> VegTypeInfo:
-            """
-            Zet een VegTypeInfo met alleen rVvN om naar een VegTypeInfo met SBB en VvN
-            """
-            assert len(info.SBB) == 0, "SBB is niet leeg"
-            assert len(info.VvN) == 0, "VvN is niet leeg"
-            assert len(info.rVvN) <= 1, "Er zijn meerdere rVvN codes"
-
-            if len(info.rVvN) == 0:
-                return VegTypeInfo(
-                    percentage=info.percentage,
-                    SBB=[],
-                    VvN=[],
-                    rVvN=[],
-                )
+        lang = _uitklappen(vegtypeinfo)
+        assert all(
+            len(info.rVvN) <= 1 for info in lang["info"]
+        ), "Er zijn meerdere rVvN codes"
+        lang["rVvN"] = [
+            info.rVvN[0] if len(info.rVvN) > 0 else None for info in lang["info"]
+        ]
 
-            new_VvN, new_SBB = self.match_rVvN_to_VvN_SBB(info.rVvN[0])
+        lang = lang.merge(self._rVvN_vertaling, on="rVvN", how="left")
 
-            # Cast naar set om dubbelingen te verwijderen
-            return VegTypeInfo(
+        lang["info"] = [
+            VegTypeInfo(
                 percentage=info.percentage,
-                SBB=list(set(new_SBB)),
-                VvN=list(set(new_VvN)),
+                # Cast naar set om dubbelingen te verwijderen
+                SBB=list(set(nieuw_SBB)) if isinstance(nieuw_SBB, list) else [],
+                VvN=list(set(nieuw_VvN)) if isinstance(nieuw_VvN, list) else [],
                 rVvN=[],
             )
+            for info, nieuw_VvN, nieuw_SBB in zip(
+                lang["info"], lang["nieuw_VvN"], lang["nieuw_SBB"]
+            )
+        ]
+        return _inklappen(lang, vegtypeinfo)
 
-        return vegtypeinfo.apply(
-            lambda infos: [_rVvN_info_to_SBB_VvN(info) for info in infos]
-        )
+
+def _uitklappen(vegtypeinfo: pd.Series) -> pd.DataFrame:
+    """
+    Klapt een series met lijsten van VegTypeInfos uit tot een lange tabel
+    met een rij per complexdeel, met de positie van het vlak in de series
+    """
+    return uitklappen(vegtypeinfo.to_frame("info"), ["info"])
+
+
+def _inklappen(lang: pd.DataFrame, vegtypeinfo: pd.Series) -> pd.Series:
+    """
+    Zet een lange tabel van _uitklappen weer om naar een series met lijsten van VegTypeInfos
+    """
+    return inklappen(lang, "info", vegtypeinfo.index)
 
 
 def opschonen_waswordtlijst(path_in: Path, path_out: Path) -> None: